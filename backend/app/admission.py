@@ -0,0 +1,172 @@
+# backend/app/admission.py
+import math
+import time
+import asyncio
+import logging
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Optional
+from .config import (
+    ASK_MAX_CONCURRENCY,
+    ASK_MAX_QUEUE,
+    ASK_QUEUE_TIMEOUT_SECONDS,
+    ASK_USER_MAX_ACTIVE,
+    ASK_USER_MAX_QUEUED
+)
+from .fair_scheduler import FairQueue
+
+# Set up logger
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+# Create console handler with higher level
+ch = logging.StreamHandler()
+ch.setLevel(logging.INFO)
+
+# Create formatter and add it to the handlers
+formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+ch.setFormatter(formatter)
+logger.addHandler(ch)
+
+# -----------------------------------------------------------------------------
+# Admission control for the agent path. At most `max_concurrency` requests run,
+# at most `max_queue` wait behind them, and anything beyond that, or anything that
+# waits longer than `queue_timeout`, is turned away at once with a retry hint
+# instead of piling up behind the agent locks. Waiting requests are released in
+# weighted fair order per user (see fair_scheduler), with a per-user cap on
+# running and queued requests. All state lives on the worker's event loop, so no
+# locking is needed.
+# -----------------------------------------------------------------------------
+
+# Recent samples kept for the wait / service time percentiles
+SAMPLE_SIZE = 1024
+
+
+class AdmissionRejected(Exception):
+    def __init__(self, reason: str, retry_after: int):
+        super().__init__(reason)
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+def _percentile(samples: list, fraction: float):
+    if not samples:
+        return None
+    ordered = sorted(samples)
+    return round(ordered[min(int(len(ordered) * fraction), len(ordered) - 1)] * 1000, 1)
+
+
+class AdmissionController:
+    def __init__(
+        self,
+        max_concurrency: int,
+        max_queue: int,
+        queue_timeout: float,
+        user_max_active: int,
+        user_max_queued: int
+    ):
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.user_max_queued = user_max_queued
+        self.active = 0
+        self._queue = FairQueue(user_max_active=user_max_active)
+        self._wait_times = deque(maxlen=SAMPLE_SIZE)
+        self._service_times = deque(maxlen=SAMPLE_SIZE)
+        self.admitted = 0
+        self.rejected_queue_full = 0
+        self.rejected_timeout = 0
+        self.rejected_user_limit = 0
+        self.max_queue_depth_seen = 0
+
+    def retry_after(self) -> int:
+        """Seconds until a slot is likely free, from the recent service time and the backlog"""
+        service = sum(self._service_times) / len(self._service_times) if self._service_times else 1.0
+        backlog = len(self._queue) + 1
+        return max(1, math.ceil(service * backlog / self.max_concurrency))
+
+    async def _acquire(self, user: str, priority: Optional[str]):
+        if self.active < self.max_concurrency and self._queue.can_start(user):
+            self.active += 1
+            self._queue.started(user)
+            return
+        if len(self._queue) >= self.max_queue:
+            self.rejected_queue_full += 1
+            raise AdmissionRejected("queue full", self.retry_after())
+        if self._queue.queued_for(user) >= self.user_max_queued:
+            self.rejected_user_limit += 1
+            raise AdmissionRejected("too many queued requests for this user", self.retry_after())
+
+        waiter = asyncio.get_running_loop().create_future()
+        entry = self._queue.push(user, priority, item=waiter)
+        self.max_queue_depth_seen = max(self.max_queue_depth_seen, len(self._queue))
+        try:
+            await asyncio.wait_for(asyncio.shield(waiter), timeout=self.queue_timeout)
+        except (asyncio.TimeoutError, asyncio.CancelledError) as e:
+            if waiter.done() and not waiter.cancelled():
+                # The slot was handed over just as we gave up; pass it on
+                self._release(user)
+            else:
+                waiter.cancel()
+                self._queue.remove(entry)
+            if isinstance(e, asyncio.CancelledError):
+                raise
+            self.rejected_timeout += 1
+            raise AdmissionRejected("queue wait timed out", self.retry_after())
+
+    def _release(self, user: str):
+        self._queue.finished(user)
+        # Hand the slot straight to the next request in fair order so it cannot be overtaken
+        while True:
+            entry = self._queue.pop_next()
+            if entry is None:
+                self.active -= 1
+                return
+            if not entry.item.done():
+                self._queue.started(entry.user)
+                entry.item.set_result(None)
+                return
+
+    @asynccontextmanager
+    async def admit(self, user: str = "anonymous", priority: Optional[str] = None):
+        """Hold a run slot for `user`; priority is a fair_scheduler class ("interactive" or "bulk")"""
+        queued_at = time.perf_counter()
+        await self._acquire(user, priority)
+        started = time.perf_counter()
+        self._wait_times.append(started - queued_at)
+        self.admitted += 1
+        try:
+            yield
+        finally:
+            self._service_times.append(time.perf_counter() - started)
+            self._release(user)
+
+    def stats(self) -> dict:
+        waits = list(self._wait_times)
+        services = list(self._service_times)
+        return {
+            "max_concurrency": self.max_concurrency,
+            "max_queue": self.max_queue,
+            "active": self.active,
+            "queue_depth": len(self._queue),
+            "max_queue_depth_seen": self.max_queue_depth_seen,
+            "admitted": self.admitted,
+            "rejected_queue_full": self.rejected_queue_full,
+            "rejected_timeout": self.rejected_timeout,
+            "rejected_user_limit": self.rejected_user_limit,
+            "wait_ms_p50": _percentile(waits, 0.5),
+            "wait_ms_p95": _percentile(waits, 0.95),
+            "wait_ms_p99": _percentile(waits, 0.99),
+            "service_ms_p50": _percentile(services, 0.5),
+            "service_ms_p95": _percentile(services, 0.95),
+            **self._queue.stats(),
+        }
+
+
+ask_admission = AdmissionController(
+    ASK_MAX_CONCURRENCY,
+    ASK_MAX_QUEUE,
+    ASK_QUEUE_TIMEOUT_SECONDS,
+    ASK_USER_MAX_ACTIVE,
+    ASK_USER_MAX_QUEUED
+)
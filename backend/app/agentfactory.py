@@ -2,18 +2,46 @@
 from dataclasses import dataclass
 import threading
 import logging
+from contextlib import nullcontext
 import json
+from collections import deque
 from datetime import datetime, timedelta
-from azure.identity import DefaultAzureCredential
-from azure.ai.agents import AgentsClient
-from azure.ai.agents.models import FunctionTool, ToolSet, ListSortOrder, MessageRole
+from azure.ai.agents.models import FunctionTool, ToolSet, ListSortOrder, MessageRole, SubmitToolOutputsAction
 from .config import (
-    PROJECT_ENDPOINT,
     MODEL_DEPLOYMENT_NAME,
     orchestrator_agent_name,
     orchestrator_instruction,
     agent_behavior_instructions,
+    AGENT_RUN_TIMEOUT_SECONDS,
+    FILE_INLINE_MAX_TOKENS,
+    THREAD_MAX_RUNS,
+    THREAD_MAX_TOKENS,
+    THREAD_MAX_AGE_MINUTES,
+    THREAD_ROLLOVER_PREPARE_RATIO,
+    ROLLOVER_KEEP_TURNS,
+    ROLLOVER_SUMMARY_TOKENS,
+    THREAD_IDLE_TTL_MINUTES,
 )
+from .azure_client_provider import get_credential, get_agents_client
+from .fast_path_router import try_fast_path
+from .prompt_parser import parse_prompt
+from .tool_dispatcher import ToolDispatcher
+from .file_ingestion import analyze_text, render_insights
+from .few_shot_store import current_sql_request, SqlRequest, record_request_example
+from .token_budget import (
+    plan_request,
+    record_usage,
+    count_tokens,
+    summarize_messages,
+    truncate_to_tokens
+)
+from azure.core.exceptions import ResourceNotFoundError
+from app.utility.ttl_cache import TTLCache
+from app.utility.cancellation import OperationCancelled, current_token
+from app.utility import resilience
+from app.utility.resilience import CircuitOpenError, azure_call
+from app.utility import metrics
+from app.utility.metrics import span
 from .tools import (
     execute_databricks_query,
     get_insights_from_text,
@@ -27,6 +55,8 @@ import zlib
 import base64
 from typing import Optional, Any, Dict
 from app.utility.thread_cleanup_scheduler import register_agent_instance
+from app.utility.thread_registry import record_thread, touch_thread
+from app.utility.agent_bootstrap import resolve_agent, agent_config_hash
 from datetime import datetime, timedelta, timezone
 
 # Set up logger
@@ -68,24 +98,45 @@ class AgentFactory:
     MAX_OUTPUT_SIZE = 900000  # 900KB to leave buffer room under 1MB limit
     MAX_RUN_WAIT_TIME = 30  # Maximum seconds to wait for a run to complete
     RUN_CHECK_INTERVAL = 1  # Seconds between run status checks
+    REGISTRY_NAME = "OrchestratorAgent"
+
+    RUN_POLL_INTERVAL = 0.25  # Initial seconds between status polls of our own runs
+    RUN_POLL_MAX_INTERVAL = 1.0
+
+    # Reply for a run that ended without completing
+    RUN_STATUS_MESSAGES = {
+        "cancelling": "The request took too long and was stopped. Please try again or narrow it down.",
+        "cancelled": "The request took too long and was stopped. Please try again or narrow it down.",
+        "expired": "The request expired before the agent finished. Please try again.",
+        "failed": "The agent could not complete the request. Please try again.",
+    }
+
+    _toolset = None
+    _dispatcher = None
+    _toolset_lock = threading.Lock()
     
-    def __init__(self):
+    def __init__(self, registry_name: str = REGISTRY_NAME):
         logger.info("🚀Initializing AgentFactory")
+        self.registry_name = registry_name
         self.agent = None
-        self.agent_client = AgentsClient(
-            endpoint=PROJECT_ENDPOINT,
-            credential=DefaultAzureCredential(
-                exclude_environment_credential=True,
-                exclude_managed_identity_credential=True
-            )
-        )
+        self.credential = get_credential()
+        self.agent_client = get_agents_client()
         self.current_thread = None
+        self.spare_threads = deque()
         self.active_runs = {}
         self.last_request_time = {}
         self.last_cleanup = datetime.now()
         self.cleanup_interval = timedelta(minutes=30)
         self.thread_lock = threading.Lock()
-        register_agent_instance("OrchestratorAgent", self)
+        # Locally tracked size/age of our threads, so limits are checked without round trips
+        self.thread_stats = {}
+        # Old thread id -> (successor thread, snapshot message id, context tokens), prepared in the background
+        self.next_threads = {}
+        self._rollover_lock = threading.Lock()
+        self._preparing_rollover = set()
+        # Conversation id -> the Azure thread holding that conversation
+        self.conversation_threads = TTLCache(maxsize=1024, ttl_seconds=THREAD_IDLE_TTL_MINUTES * 60)
+        register_agent_instance(self.registry_name, self)
         logger.info("🚀AgentFactory initialized successfully")
 
     def mark_run_active(self, thread_id: str):
@@ -104,9 +155,30 @@ class AgentFactory:
             tid for tid, start_time in self.active_runs.items()
             if now - start_time < self.STALE_RUN_THRESHOLD
         ]
+        # Pre-created threads are idle by design but must survive cleanup
+        active_ids.extend(t.id for t in list(self.spare_threads))
+        active_ids.extend(prepared[0].id for prepared in list(self.next_threads.values()))
         logger.info(f"🚀Active thread IDs: {active_ids}")
         return active_ids
 
+    def precreate_threads(self, count: int):
+        """Create idle threads ahead of time so new conversations skip the threads.create round trip"""
+        logger.info(f"🚀Pre-creating {count} threads")
+        for _ in range(count):
+            thread = azure_call(self.agent_client.threads.create, idempotent=False)
+            record_thread(thread.id, self.registry_name)
+            self.spare_threads.append(thread)
+
+    def _create_thread(self):
+        try:
+            thread = self.spare_threads.popleft()
+            logger.info(f"🚀Using pre-created thread {thread.id}")
+            return thread
+        except IndexError:
+            thread = azure_call(self.agent_client.threads.create, idempotent=False)
+            record_thread(thread.id, self.registry_name)
+            return thread
+
     def cleanup_stale_runs(self):
         logger.info(f"🚀Inside cleanup_stale_runs")
         now = datetime.now()
@@ -116,43 +188,113 @@ class AgentFactory:
             for tid in stale:
                 del self.active_runs[tid]
 
+    @classmethod
+    def _get_toolset(cls) -> ToolSet:
+        """Build the orchestrator ToolSet once per process and share it between instances"""
+        if cls._toolset is None:
+            with cls._toolset_lock:
+                if cls._toolset is None:
+                    registered_tools = [
+                        execute_databricks_query,
+                        get_insights_from_text,
+                        generate_graph_from_prompt
+                    ]
+                    logger.info(f"🚀Registered tools: {[t.__name__ for t in registered_tools]}")
+                    toolset = ToolSet()
+                    toolset.add(FunctionTool(registered_tools))
+                    cls._dispatcher = ToolDispatcher(registered_tools)
+                    cls._toolset = toolset
+        return cls._toolset
+
+    def _run_with_tool_dispatch(self, thread_id: str, agent_id: str):
+        """
+        Create a run and drive it to a terminal state. Function calls requested in one
+        step are executed concurrently by the ToolDispatcher and submitted together.
+        """
+        self._get_toolset()
+        token = current_token()
+        run = azure_call(self.agent_client.runs.create, thread_id=thread_id, agent_id=agent_id, idempotent=False)
+        started = time.time()
+        interval = self.RUN_POLL_INTERVAL
+        while run.status in ("queued", "in_progress", "requires_action"):
+            if time.time() - started > AGENT_RUN_TIMEOUT_SECONDS:
+                logger.error(f"🚀Run {run.id} exceeded {AGENT_RUN_TIMEOUT_SECONDS}s, cancelling")
+                run = self.agent_client.runs.cancel(thread_id=thread_id, run_id=run.id)
+                break
+            if token is not None and token.cancelled:
+                # Nobody is waiting for the answer any more; free the model capacity
+                logger.info(f"🚀Cancelling run {run.id}: {token.reason}")
+                self.agent_client.runs.cancel(thread_id=thread_id, run_id=run.id)
+                raise OperationCancelled(token.reason)
+
+            if run.status == "requires_action" and isinstance(run.required_action, SubmitToolOutputsAction):
+                tool_calls = run.required_action.submit_tool_outputs.tool_calls
+                logger.info(f"🚀Run requires {len(tool_calls)} tool calls")
+                try:
+                    with span("agent.tool_calls"):
+                        tool_outputs = self._dispatcher.execute(tool_calls)
+                except OperationCancelled:
+                    logger.info(f"🚀Cancelling run {run.id}: {token.reason if token else 'cancelled'}")
+                    self.agent_client.runs.cancel(thread_id=thread_id, run_id=run.id)
+                    raise
+                run = azure_call(
+                    self.agent_client.runs.submit_tool_outputs,
+                    thread_id=thread_id,
+                    run_id=run.id,
+                    tool_outputs=tool_outputs,
+                    idempotent=False
+                )
+                interval = self.RUN_POLL_INTERVAL
+                continue
+
+            if token is not None:
+                token.wait(interval)
+            else:
+                time.sleep(interval)
+            interval = min(interval * 2, self.RUN_POLL_MAX_INTERVAL)
+            run = azure_call(self.agent_client.runs.get, thread_id=thread_id, run_id=run.id)
+
+        logger.info(f"🚀Run {run.id} finished with status {run.status}")
+        return run
+
     def get_or_create_agent(self) -> str:
         logger.info("🚀Inside get_or_create_agent Getting or creating agent")
         if self.agent is not None:
             logger.info("🚀Using existing agent instance")
             return self.agent.id
 
-        registered_tools = [
-            execute_databricks_query,
-            get_insights_from_text,
-            generate_graph_from_prompt
-        ]
-        logger.info(f"🚀Registered tools: {[t.__name__ for t in registered_tools]}")
-
-        existing_agents = list(self.agent_client.list_agents())
-        for agent in existing_agents:
-            if agent.name == orchestrator_agent_name:
-                logger.info(f"🚀Found existing agent: {agent.name} ({agent.id})")
-                self.toolset = ToolSet()
-                self.toolset.add(FunctionTool(registered_tools))
-                self.agent_client.enable_auto_function_calls(self.toolset)
-                self.agent = agent
-                return self.agent.id
-
-        logger.info(f"🚀Creating new agent: {orchestrator_agent_name}")
-        self.toolset = ToolSet()
-        self.toolset.add(FunctionTool(registered_tools))
-        self.agent_client.enable_auto_function_calls(self.toolset)
-
-        self.agent = self.agent_client.create_agent(
-            model=MODEL_DEPLOYMENT_NAME,
-            name=orchestrator_agent_name,
-            instructions=orchestrator_instruction,
-            toolset=self.toolset,
-            top_p=0.89,
-            temperature=0.01
+        self.toolset = self._get_toolset()
+
+        agent_options = {
+            "model": MODEL_DEPLOYMENT_NAME,
+            "instructions": orchestrator_instruction,
+            "top_p": 0.89,
+            "temperature": 0.01
+        }
+        config_hash = agent_config_hash(tool_definitions=self.toolset.definitions, **agent_options)
+
+        def create_agent():
+            return self.agent_client.create_agent(
+                name=orchestrator_agent_name,
+                toolset=self.toolset,
+                **agent_options
+            )
+
+        def update_agent(agent_id):
+            return self.agent_client.update_agent(
+                agent_id,
+                toolset=self.toolset,
+                **agent_options
+            )
+
+        self.agent = resolve_agent(
+            self.agent_client,
+            orchestrator_agent_name,
+            config_hash,
+            create_agent,
+            update_agent
         )
-        logger.info(f"🚀Created new agent with ID: {self.agent.id}")
+        logger.info(f"🚀Resolved agent {orchestrator_agent_name} with ID: {self.agent.id}")
         return self.agent.id
 
     def _compress_data(self, data: Any) -> dict:
@@ -195,11 +337,13 @@ class AgentFactory:
         start_time = time.time()
         while time.time() - start_time < self.MAX_RUN_WAIT_TIME:
             try:
-                run = self.agent_client.runs.get(thread_id=thread_id, run_id=run_id)
+                run = azure_call(self.agent_client.runs.get, thread_id=thread_id, run_id=run_id)
                 if run.status in ["completed", "failed", "cancelled", "expired"]:
                     return True
                 logger.info("🚀Waiting for run to complete for RUN_CHECK_INTERVAL")
-                time.sleep(self.RUN_CHECK_INTERVAL)
+                resilience.sleep(self.RUN_CHECK_INTERVAL)
+            except OperationCancelled:
+                raise
             except Exception as e:
                 logger.error(f"🚀Error checking run status: {str(e)}")
                 return False
@@ -212,7 +356,10 @@ class AgentFactory:
         file_content: Optional[str] = None,
         chat_history: Optional[list] = None,
         thread_id: Optional[str] = None,
-        max_retries: int = 4
+        max_retries: int = 4,
+        new_thread: bool = False,
+        conversation_id: Optional[str] = None,
+        conversation_thread_id: Optional[str] = None
     ) -> AgentResponse:
         logger.info(f"🚀Inside process_request2")
         logger.info(f"🚀Processing request with mode: {agent_mode}")
@@ -222,50 +369,92 @@ class AgentFactory:
                 self.cleanup_stale_runs()
                 self.last_cleanup = datetime.now()
             
+            if not file_content and self.is_graph_prompt(prompt):
+                with span("agent.fast_path"):
+                    graph_data = try_fast_path(prompt)
+                if graph_data is not None:
+                    return AgentResponse(
+                        response="Here's the requested graph:",
+                        thread_id=thread_id,
+                        input_tokens=0,
+                        output_tokens=0,
+                        graph_data=graph_data,
+                        response_type="graph"
+                    )
+
             agent_id = self.get_or_create_agent()
             logger.info(f"🚀Agent created or retrieved with agent_id : {agent_id}")
 
-            # Use thread lock to prevent concurrent modifications
-            with self.thread_lock:
-                thread = self._get_thread_with_retry(thread_id, max_retries)
+            file_block = None
+            if file_content:
+                file_block = self._prepare_file_content(file_content)
+
+            # Use thread lock to prevent concurrent modifications of the shared threads;
+            # one-off threads belong to this request alone, so those runs proceed in parallel
+            with self.thread_lock if not new_thread else nullcontext():
+                with span("agent.thread_lookup"):
+                    if new_thread:
+                        # One-off request (e.g. tool sub-calls): don't share the rolling conversation thread
+                        thread = self._create_thread()
+                    elif conversation_id and not thread_id:
+                        thread = self._get_conversation_thread(conversation_id, conversation_thread_id)
+                    else:
+                        thread = self._get_thread_with_retry(thread_id, max_retries)
                 if isinstance(thread, AgentResponse):
                     logger.info("🚀Thread is busy with existing run")
                     return thread
+                touch_thread(thread.id)
                 
                 # Check for active runs and wait for them to finish before proceeding
                 if thread_id:
-                    active_runs = list(self.agent_client.runs.list(
-                        thread_id=thread_id,
-                        status=["in_progress", "queued", "requires_action"]
-                    ))
+                    active_runs = self._active_runs(thread_id)
                     if active_runs:
                         logger.info(f"🚀Found active runs on thread {thread_id}. Waiting for completion.")
                         for run in active_runs:
                             self._wait_for_run_completion(thread_id, run.id)
 
-                behavior_instruction = agent_behavior_instructions.get(agent_mode, "")
-                full_instruction = f"""
-                    [Orchestrator Instructions]
-                    {orchestrator_instruction}
-
-                    [Behavior Instructions - Mode: {agent_mode}]
-                    {behavior_instruction}
-                    """.strip()
-                logger.info(f"🚀Using instructions:\n{full_instruction[:200]}...")
+                stats = self._get_thread_stats(thread)
+                instruction = "" if thread_id else self._instruction_for(stats, agent_mode)
+                # Client history only matters on a thread that doesn't hold the conversation yet
+                history = chat_history if stats["runs"] == 0 and not stats["has_context"] else None
+                plan = plan_request(prompt, instruction, history, file_block, stats["context_tokens"])
+                if not plan.fits and not thread_id and not new_thread and stats["runs"] > 0:
+                    logger.info("🚀Request does not fit the current thread, rolling over first")
+                    thread = self._rollover(thread)
+                    if conversation_id:
+                        self.conversation_threads.set(conversation_id, thread)
+                    else:
+                        self.current_thread = thread
+                    touch_thread(thread.id)
+                    stats = self._get_thread_stats(thread)
+                    instruction = self._instruction_for(stats, agent_mode)
+                    plan = plan_request(prompt, instruction, None, file_block, stats["context_tokens"])
+                if not plan.fits:
+                    return AgentResponse(
+                        response="The request is too large to process. Please shorten it or attach a smaller file.",
+                        thread_id=thread.id,
+                        is_error=True
+                    )
 
-                if not thread_id:
-                    logger.info("🚀Sending initial instruction message")
+                if instruction:
+                    logger.info(f"🚀Sending instruction message:\n{instruction[:200]}...")
                     self._send_message_with_retry(
                         thread.id,
                         "assistant",
-                        full_instruction,
+                        instruction,
                         max_retries
                     )
+                    stats["mode"] = agent_mode
 
                 user_message_content = prompt
-                if file_content:
+                if plan.history or plan.history_summary:
+                    history_lines = [plan.history_summary] if plan.history_summary else []
+                    history_lines += [f"- {m.get('role')}: {m.get('content')}" for m in plan.history]
+                    history_block = "\n".join(history_lines)
+                    user_message_content = f"[CONVERSATION_HISTORY]\n{history_block}\n[/CONVERSATION_HISTORY]\n\n{prompt}"
+                if file_block:
                     logger.info("🚀Appending file content to message")
-                    user_message_content += f"\n\n[FILE_CONTENT_START]\n{file_content}\n[FILE_CONTENT_END]"
+                    user_message_content += f"\n\n{file_block}"
 
                 logger.info("🚀Sending user message")
                 self._send_message_with_retry(
@@ -277,17 +466,33 @@ class AgentFactory:
 
                 self.mark_run_active(thread.id)
                 logger.info("🚀Creating and processing run")
-                run = self.agent_client.runs.create_and_process(
-                    thread_id=thread.id,
-                    agent_id=agent_id
-                )
+                # The final SQL of a self-contained request becomes a few-shot example for it; a prompt
+                # answered on a thread with earlier turns may lean on context the example would not carry
+                self_contained = not chat_history and not file_content and (new_thread or stats["runs"] == 0)
+                sql_request = SqlRequest(prompt) if self_contained else None
+                request_token = current_sql_request.set(sql_request)
+                try:
+                    with span("agent.run"):
+                        run = self._run_with_tool_dispatch(thread.id, agent_id)
+                finally:
+                    current_sql_request.reset(request_token)
+                if getattr(run.status, "value", run.status) == "completed":
+                    with span("few_shot.record"):
+                        record_request_example(sql_request)
+                self._update_thread_stats(stats, plan.predicted_input_tokens, run)
+                if new_thread:
+                    self.thread_stats.pop(thread.id, None)
 
                 logger.info("🚀Processing run results")
-                return self._process_run_results(
-                    run,
-                    thread.id,
-                    max_retries
-                )
+                with span("agent.results"):
+                    return self._process_run_results(
+                        run,
+                        thread.id,
+                        max_retries
+                    )
+
+        except (OperationCancelled, CircuitOpenError):
+            raise
 
         except Exception as e:
             logger.error(f"🚀Error in process_request2: {str(e)}")
@@ -303,6 +508,16 @@ class AgentFactory:
                 is_error=True
             )
 
+    def _prepare_file_content(self, file_content: str) -> str:
+        """Inline small files; replace large ones with their map-reduced analysis (done outside the thread lock)"""
+        if count_tokens(file_content) <= FILE_INLINE_MAX_TOKENS:
+            return f"[FILE_CONTENT_START]\n{file_content}\n[FILE_CONTENT_END]"
+        logger.info(f"🚀File content too large to inline ({len(file_content)} chars), analysing in chunks")
+        result = analyze_text(file_content)
+        if result.get("status") != "success":
+            raise RuntimeError(f"File analysis failed: {result.get('message')}")
+        return f"[FILE_ANALYSIS_START]\n{render_insights(result['insights'])}\n[FILE_ANALYSIS_END]"
+
     def _parse_output(self, output):
         if isinstance(output, dict):
             return output
@@ -375,9 +590,31 @@ class AgentFactory:
     ) -> AgentResponse:
         logger.info("🚀Inside _process_run_results")
         logger.info("🚀Processing run results")
-        prompt_tokens = run.usage.prompt_tokens or 0
-        completion_tokens = run.usage.completion_tokens or 0
+        # Cancelled and expired runs may carry no usage
+        usage = getattr(run, "usage", None)
+        prompt_tokens = (getattr(usage, "prompt_tokens", None) if usage else None) or 0
+        completion_tokens = (getattr(usage, "completion_tokens", None) if usage else None) or 0
         logger.info(f"🚀Token usage - Input: {prompt_tokens}, Output: {completion_tokens}")
+        metrics.inc("tokens_total", prompt_tokens, kind="input")
+        metrics.inc("tokens_total", completion_tokens, kind="output")
+
+        status = getattr(run.status, "value", run.status)
+        if status != "completed":
+            # Timed out (cancelled by _run_with_tool_dispatch), failed or expired: whatever is on
+            # the thread is not an answer to this prompt
+            last_error = getattr(run, "last_error", None)
+            detail = getattr(last_error, "message", None) if last_error else None
+            logger.error(f"🚀Run {run.id} ended with status {status}" + (f": {detail}" if detail else ""))
+            metrics.inc("agent_runs_unsuccessful_total", status=status)
+            if thread_id in self.active_runs:
+                del self.active_runs[thread_id]
+            return AgentResponse(
+                response=self.RUN_STATUS_MESSAGES.get(status, self.RUN_STATUS_MESSAGES["failed"]),
+                thread_id=thread_id,
+                is_error=True,
+                input_tokens=prompt_tokens,
+                output_tokens=completion_tokens
+            )
 
         # Check for graph tool output first
         graph_output = self._get_tool_output(run, "generate_graph_from_prompt")
@@ -407,20 +644,7 @@ class AgentFactory:
 
         # Get final agent message
         logger.info(f"🚀will extract agent final message")
-        messages = None
-        for attempt in range(max_retries):
-            try:
-                logger.info(f"🚀attempt {attempt} to extract agent final message")
-                messages = list(self.agent_client.messages.list(
-                    thread_id=thread_id,
-                    order=ListSortOrder.ASCENDING
-                ))
-                break
-            except Exception:
-                logger.info(f"🚀encountered exception in attempt {attempt} to extract agent final message. Will retry in next attmpt")
-                if attempt == max_retries - 1:
-                    raise
-                time.sleep(1 * (attempt + 1))
+        messages = self._list_messages(thread_id, order=ListSortOrder.ASCENDING)
 
         agent_response = None
         for message in reversed(messages):
@@ -454,147 +678,287 @@ class AgentFactory:
             is_error=False
         )
 
+    # -----------------------------------------------------------------------------
+    # Thread accounting and rollover
+    # -----------------------------------------------------------------------------
+
+    def _base_context_tokens(self) -> int:
+        """Agent instructions and tool schemas the service adds to every model call"""
+        tool_definitions = json.dumps(self._get_toolset().definitions, default=str)
+        return count_tokens(orchestrator_instruction) + count_tokens(tool_definitions)
+
+    def _get_thread_stats(self, thread) -> dict:
+        stats = self.thread_stats.get(thread.id)
+        if stats is None:
+            created_at = getattr(thread, "created_at", None)
+            stats = {
+                "runs": 0,
+                "usage_tokens": 0,
+                "context_tokens": self._base_context_tokens(),
+                "created_at": created_at if isinstance(created_at, datetime) else datetime.now(timezone.utc),
+                "mode": None,
+                "has_context": False
+            }
+            self.thread_stats[thread.id] = stats
+        return stats
+
+    def _instruction_for(self, stats: dict, agent_mode: str) -> str:
+        """Full instructions once per thread; afterwards only a changed behavior mode is re-sent"""
+        behavior_instruction = agent_behavior_instructions.get(agent_mode, "")
+        if stats["mode"] is None:
+            return f"""
+                    [Orchestrator Instructions]
+                    {orchestrator_instruction}
+
+                    [Behavior Instructions - Mode: {agent_mode}]
+                    {behavior_instruction}
+                    """.strip()
+        if stats["mode"] != agent_mode:
+            return f"[Behavior Instructions - Mode: {agent_mode}]\n{behavior_instruction}"
+        return ""
+
+    def _update_thread_stats(self, stats: dict, predicted_input_tokens: int, run):
+        usage = getattr(run, "usage", None)
+        prompt_tokens = getattr(usage, "prompt_tokens", None) if usage else None
+        completion_tokens = (getattr(usage, "completion_tokens", None) if usage else None) or 0
+        record_usage(predicted_input_tokens, prompt_tokens)
+        stats["runs"] += 1
+        stats["usage_tokens"] += (prompt_tokens or 0) + completion_tokens
+        stats["context_tokens"] = predicted_input_tokens + completion_tokens
+
+    def _limit_ratio(self, stats: dict) -> float:
+        """How close a thread is to rollover; >= 1 means it must roll over"""
+        age = datetime.now(timezone.utc) - stats["created_at"]
+        return max(
+            stats["runs"] / THREAD_MAX_RUNS,
+            stats["usage_tokens"] / THREAD_MAX_TOKENS,
+            age / timedelta(minutes=THREAD_MAX_AGE_MINUTES)
+        )
+
+    def _message_dicts(self, thread_id: str, after_id: Optional[str] = None) -> list:
+        messages = self._list_messages(thread_id, order=ListSortOrder.ASCENDING)
+        if after_id is not None:
+            ids = [m.id for m in messages]
+            messages = messages[ids.index(after_id) + 1:] if after_id in ids else messages
+        result = []
+        for message in messages:
+            if not message.text_messages:
+                continue
+            content = message.text_messages[-1].text.value
+            # Instructions are re-sent on the new thread; earlier compacted context is already summarised
+            if "[Orchestrator Instructions]" in content or content.startswith("[Behavior Instructions"):
+                continue
+            result.append({"id": message.id, "role": getattr(message.role, "value", message.role), "content": content})
+        return result
+
+    def _compact_context(self, messages: list) -> str:
+        """Bounded summary of older turns plus the last ROLLOVER_KEEP_TURNS turns verbatim"""
+        keep = ROLLOVER_KEEP_TURNS * 2
+        recent, older = messages[-keep:], messages[:-keep]
+        parts = []
+        summary = summarize_messages(older, ROLLOVER_SUMMARY_TOKENS)
+        if summary:
+            parts.append(summary)
+        if recent:
+            parts.append("Most recent messages:")
+            parts += [
+                f"- {m['role']}: {truncate_to_tokens(m['content'], ROLLOVER_SUMMARY_TOKENS // 2)}"
+                for m in recent
+            ]
+        return "\n".join(parts)
+
+    def _post_context(self, thread_id: str, context: str) -> int:
+        """Post compacted context as one message; returns its token count"""
+        if not context:
+            return 0
+        content = f"[CONVERSATION_CONTEXT]\n{context}\n[/CONVERSATION_CONTEXT]"
+        azure_call(self.agent_client.messages.create, thread_id=thread_id, role="assistant", content=content, idempotent=False)
+        return count_tokens(content)
+
+    def _prepare_next_thread(self, old_thread_id: str):
+        """Background: create the successor thread and seed it with the compacted conversation so far"""
+        try:
+            messages = self._message_dicts(old_thread_id)
+            new_thread = self._create_thread()
+            context_tokens = self._post_context(new_thread.id, self._compact_context(messages))
+            snapshot_id = messages[-1]["id"] if messages else None
+            with self._rollover_lock:
+                self.next_threads[old_thread_id] = (new_thread, snapshot_id, context_tokens)
+            logger.info(f"🚀Prepared successor thread {new_thread.id} for {old_thread_id}")
+        except Exception as e:
+            logger.warning(f"🚀Could not prepare successor thread: {e}")
+        finally:
+            with self._rollover_lock:
+                self._preparing_rollover.discard(old_thread_id)
+
+    def _maybe_prepare_rollover(self, thread, stats: dict):
+        if self._limit_ratio(stats) < THREAD_ROLLOVER_PREPARE_RATIO:
+            return
+        with self._rollover_lock:
+            if thread.id in self.next_threads or thread.id in self._preparing_rollover:
+                return
+            self._preparing_rollover.add(thread.id)
+        threading.Thread(target=self._prepare_next_thread, args=(thread.id,), daemon=True).start()
+
+    def _rollover(self, old_thread):
+        """
+        Successor of a thread that reached its limits, holding a compacted copy of the
+        conversation: a bounded summary plus the last few turns, posted as a single message.
+        """
+        old_thread_id = old_thread.id
+        with self._rollover_lock:
+            prepared = self.next_threads.pop(old_thread_id, None)
+        context_tokens = 0
+        try:
+            if prepared is not None:
+                new_thread, snapshot_id, context_tokens = prepared
+                # Only the turns since the background snapshot still need copying
+                delta = self._message_dicts(old_thread_id, after_id=snapshot_id) if snapshot_id else []
+                if delta:
+                    context_tokens += self._post_context(new_thread.id, "Messages since the summary above:\n" + "\n".join(
+                        f"- {m['role']}: {truncate_to_tokens(m['content'], ROLLOVER_SUMMARY_TOKENS // 2)}"
+                        for m in delta[-ROLLOVER_KEEP_TURNS * 2:]
+                    ))
+            else:
+                messages = self._message_dicts(old_thread_id)
+                new_thread = self._create_thread()
+                context_tokens = self._post_context(new_thread.id, self._compact_context(messages))
+        except ResourceNotFoundError:
+            logger.warning(f"🚀Thread {old_thread_id} no longer exists, starting a fresh thread")
+            new_thread = self._create_thread()
+            context_tokens = 0
+
+        stats = self._get_thread_stats(new_thread)
+        stats["context_tokens"] += context_tokens
+        stats["has_context"] = context_tokens > 0
+        self.thread_stats.pop(old_thread_id, None)
+        logger.info(f"🚀Rolled over from thread {old_thread_id} to {new_thread.id}")
+        return new_thread
+
+    def _get_conversation_thread(self, conversation_id: str, conversation_thread_id: Optional[str]):
+        """The thread holding a stored conversation, reopened or rolled over as needed"""
+        thread = self.conversation_threads.get(conversation_id)
+        if thread is None and conversation_thread_id:
+            try:
+                thread = azure_call(self.agent_client.threads.get, conversation_thread_id)
+                # Reopened after a restart or on another worker: the thread already holds the history
+                self._get_thread_stats(thread)["has_context"] = True
+            except ResourceNotFoundError:
+                # Cleaned up while idle; the new thread is seeded from the stored history
+                logger.info(f"🚀Thread {conversation_thread_id} of conversation {conversation_id} is gone")
+                thread = None
+
+        if thread is None:
+            thread = self._create_thread()
+        else:
+            stats = self._get_thread_stats(thread)
+            if self._limit_ratio(stats) >= 1:
+                thread = self._rollover(thread)
+            else:
+                self._maybe_prepare_rollover(thread, stats)
+        self.conversation_threads.set(conversation_id, thread)
+        return thread
+
     def _get_thread_with_retry(self, thread_id: Optional[str], max_retries: int):
         logger.info(f"🚀inside _get_thread_with_retry")
         logger.info(f"🚀Getting thread with ID: {thread_id}")
+        # Individual calls retry transient failures through the shared policy (utility.resilience);
+        # this loop only waits out a user message that is still being processed
         for attempt in range(max_retries):
             logger.info(f"🚀attempt {attempt} to get thread.")
-            try:
-                if thread_id:
-                    # Check for any active runs
-                    logger.info(f"🚀thread_id : {thread_id} available, will check for active runs of this thread.")
-                    active_runs = list(self.agent_client.runs.list(
+            if thread_id:
+                # Check for any active runs
+                logger.info(f"🚀thread_id : {thread_id} available, will check for active runs of this thread.")
+                active_runs = self._active_runs(thread_id)
+                
+                if active_runs:
+                    logger.info(f"🚀Active runs found: {[r.id for r in active_runs]}. Thread is busy.")
+                    # Return an AgentResponse to signal the thread is busy
+                    return AgentResponse(
+                        response="Please wait while I finish processing your previous request.",
                         thread_id=thread_id,
-                        status=["in_progress", "queued", "requires_action"]
-                    ))
+                        is_error=False
+                    )
                     
-                    if active_runs:
-                        logger.info(f"🚀Active runs found: {[r.id for r in active_runs]}. Thread is busy.")
-                        # Return an AgentResponse to signal the thread is busy
+                # Additional check to ensure no pending messages
+                messages = self._list_messages(thread_id)
+                if messages and messages[-1].role == "user" and not messages[-1].completed:
+                    if attempt == max_retries - 1:
                         return AgentResponse(
-                            response="Please wait while I finish processing your previous request.",
+                            response="Your previous message is still being processed.",
                             thread_id=thread_id,
                             is_error=False
                         )
-                        
-                    # Additional check to ensure no pending messages
-                    messages = list(self.agent_client.messages.list(thread_id=thread_id))
-                    if messages and messages[-1].role == "user" and not messages[-1].completed:
-                        if attempt == max_retries - 1:
-                            return AgentResponse(
-                                response="Your previous message is still being processed.",
-                                thread_id=thread_id,
-                                is_error=False
-                            )
-                        time.sleep(1 * (attempt + 1))
-                        continue
-                        
-                    return self.agent_client.threads.get(thread_id)
-                elif self.current_thread:
-                    # Check if we should start a new thread based on run count, token usage, or age
-                    logger.info(f"🚀Checking if a new thread should be created based on run count, token usage, or age")
+                    resilience.sleep(self._backoff(attempt))
+                    continue
                     
-                    thread_info = self.agent_client.threads.get(self.current_thread.id)
-                    logger.info(f"🚀 thread_info {thread_info}")
-
-                    runs = list(self.agent_client.runs.list(thread_id=self.current_thread.id))
-                                        
-                    # Example: Count runs in this thread
-                    run_count = len(runs)
-                    logger.info(f"🚀 run_count:  {run_count}")    
-
-                    # Example: Token usage check
-                    total_tokens = sum(
-                        (r.usage.prompt_tokens or 0) + (r.usage.completion_tokens or 0)
-                        for r in runs
-                    )
-                    logger.info(f"🚀 total_tokens:  {total_tokens}")        
-
-                    #Age check
-                    thread_age = datetime.now(timezone.utc) - thread_info.created_at
-                    logger.info(f"🚀 thread_age  {thread_age} and is greater than 1 hour:  {thread_age > timedelta(hours=1)}")  
-
-                    if run_count >= 20 or total_tokens > 45000 or thread_age > timedelta(hours=1):
-                        logger.info("🚀Starting new thread due to limit reached")
-                        
-                        # 1. Retrieve messages from the old thread
-                        previous_messages = list(self.agent_client.messages.list(
-                            thread_id=self.current_thread.id,
-                            order=ListSortOrder.ASCENDING
-                        ))
-                        
-                        # 2. Create the new thread
-                        new_thread = self.agent_client.threads.create()
-                        
-                        # 3. Transfer messages to the new thread
-                        for message in previous_messages:
-                            # Exclude instructions and empty messages
-                            if not message.text_messages:
-                                continue
-                            
-                            content_to_send = message.text_messages[-1].text.value
-                            if "[Orchestrator Instructions]" in content_to_send:
-                                continue
-                            
-                            try:
-                                self.agent_client.messages.create(
-                                    thread_id=new_thread.id,
-                                    role=message.role,
-                                    content=content_to_send
-                                )
-                            except Exception as transfer_e:
-                                logger.error(f"🚀Failed to transfer message to new thread: {str(transfer_e)}")
-
-                        # 4. Update the current_thread pointer
-                        self.current_thread = new_thread
-                        return new_thread
-
-                    logger.info("🚀No of the conditions met to start new thread, will continue using existing thread.")
+                return azure_call(self.agent_client.threads.get, thread_id)
+            elif self.current_thread:
+                # Limits (runs, token usage, age) are tracked locally; no round trips needed
+                stats = self._get_thread_stats(self.current_thread)
+                ratio = self._limit_ratio(stats)
+                logger.info(f"🚀Thread {self.current_thread.id}: {stats['runs']} runs, {stats['usage_tokens']} tokens, limit ratio {ratio:.2f}")
+
+                if ratio >= 1:
+                    logger.info("🚀Starting new thread due to limit reached")
+                    self.current_thread = self._rollover(self.current_thread)
                     return self.current_thread
 
-                else:
-                    logger.info("🚀Existing thread not found, creating new thread")
-                    thread = self.agent_client.threads.create()
-                    self.current_thread = thread
-                    return thread
-            except Exception as e:
-                if attempt == max_retries - 1:
-                    raise
-                time.sleep(1 * (attempt + 1))
+                self._maybe_prepare_rollover(self.current_thread, stats)
+                return self.current_thread
 
+            else:
+                logger.info("🚀Existing thread not found, creating new thread")
+                thread = self._create_thread()
+                self.current_thread = thread
+                return thread
 
     def _send_message_with_retry(self, thread_id: str, role: str, content: str, max_retries: int):
         logger.info(f"🚀Inside _send_message_with_retry")
         logger.info(f"🚀Sending {role} message to thread {thread_id}")
 
-        for attempt in range(max_retries):
-            logger.info(f"🚀attempt {attempt} to create message")
-            try:
-                self.agent_client.messages.create(
-                    thread_id=thread_id,
-                    role=role,
-                    content=content
-                )
-                logger.info(f"🚀attempt {attempt} to create message was successful")
-                return
-            except Exception as e:
-                logger.info(f"🚀Exception in attempt {attempt} to create message")
-                if "active run" in str(e):
-                    if attempt < max_retries - 1:
-                        # Wait for any active runs to complete
-                        logger.info(f"🚀getting the list of active runs")
-                        active_runs = list(self.agent_client.runs.list(
-                            thread_id=thread_id,
-                            status=["in_progress", "queued", "requires_action"]
-                        ))
-                        if active_runs:
-                            logger.info(f"🚀Waiting for active run to complete")
-                            self._wait_for_run_completion(thread_id, active_runs[0].id)
-                        time.sleep(1 * (attempt + 1))
-                        continue
-                raise
+        with span("agent.message_post"):
+            for attempt in range(max_retries):
+                logger.info(f"🚀attempt {attempt} to create message")
+                try:
+                    # A timed-out create may have posted the message, so only rejected attempts are retried
+                    azure_call(
+                        self.agent_client.messages.create,
+                        thread_id=thread_id,
+                        role=role,
+                        content=content,
+                        idempotent=False
+                    )
+                    logger.info(f"🚀attempt {attempt} to create message was successful")
+                    return
+                except Exception as e:
+                    logger.info(f"🚀Exception in attempt {attempt} to create message")
+                    if "active run" in str(e):
+                        if attempt < max_retries - 1:
+                            # Wait for any active runs to complete
+                            logger.info(f"🚀getting the list of active runs")
+                            active_runs = self._active_runs(thread_id)
+                            if active_runs:
+                                logger.info(f"🚀Waiting for active run to complete")
+                                self._wait_for_run_completion(thread_id, active_runs[0].id)
+                            resilience.sleep(self._backoff(attempt))
+                            continue
+                    raise
+
+    def _list_messages(self, thread_id: str, **kwargs) -> list:
+        # The pager fetches lazily, so the listing happens inside the retried call
+        return azure_call(lambda: list(self.agent_client.messages.list(thread_id=thread_id, **kwargs)))
+
+    def _active_runs(self, thread_id: str) -> list:
+        return azure_call(lambda: list(self.agent_client.runs.list(
+            thread_id=thread_id,
+            status=["in_progress", "queued", "requires_action"]
+        )))
+
+    @staticmethod
+    def _backoff(attempt: int) -> float:
+        return resilience.get_dependency("azure_agents").backoff(attempt)
 
     @staticmethod
     def is_graph_prompt(prompt: str) -> bool:
-        graph_keywords = ["generate graph", "show me a graph", "plot", "visualize", "graph", "chart", "trend"]
-        return any(k in prompt.lower() for k in graph_keywords)
\ No newline at end of file
+        return parse_prompt(prompt).is_graph
\ No newline at end of file
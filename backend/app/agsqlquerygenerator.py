@@ -1,46 +1,58 @@
 # backend/app/agsqlquerygenerator.py
 
+import time
 import threading
 import logging
+from collections import deque
 from datetime import datetime, timedelta
-from azure.identity import DefaultAzureCredential
-from azure.ai.agents import AgentsClient
 from azure.ai.agents.models import ListSortOrder, MessageRole
 
 from app.utility.agent_registry import register_agent_instance
-
+from app.utility.thread_registry import record_thread
+from app.utility.agent_bootstrap import resolve_agent, agent_config_hash
+from app.utility.single_flight import get_single_flight
+from app.utility.cancellation import OperationCancelled, current_token
+from app.utility.resilience import CircuitOpenError, azure_call
+from app.utility.metrics import span
+
+from .config import FEW_SHOT_ENABLED
 from .configagsqlquerygenerator import (
-    PROJECT_ENDPOINT,
     MODEL_DEPLOYMENT_NAME,
     sql_query_generator_agent_name,
     sql_query_generator_instruction
 )
 from .sql_query_generator_instruction import build_sql_instruction
+from .azure_client_provider import get_credential, get_agents_client
+from .similar_sql_cache import lookup_similar_sql, remember_sql
+from .few_shot_store import retrieve_examples, format_examples, record_example
 
 logger = logging.getLogger(__name__)
 logging.basicConfig(level=logging.info)
 
+_sql_generation_flight = get_single_flight("sql_generation")
+
 class AGSQLQueryGenerator:
     _lock = threading.Lock()
+    REGISTRY_NAME = "SQLQueryGeneratorAgent"
+    RUN_POLL_INTERVAL = 0.25
+    RUN_POLL_MAX_INTERVAL = 1.0
 
     def __init__(self):
         logger.info("Initializing AGSQLQueryGenerator...")
         self.agent = None
-        self.agent_client = AgentsClient(
-            endpoint=PROJECT_ENDPOINT,
-            credential=DefaultAzureCredential(
-                exclude_environment_credential=True,
-                exclude_managed_identity_credential=True
-            )
-        )
+        self.credential = get_credential()
+        self.agent_client = get_agents_client()
         logger.info("AgentsClient initialized successfully")
 
         self.active_runs = {}
+        self.spare_threads = deque()
         self.run_timestamps = {}
         self.cleanup_interval = timedelta(minutes=5)
         self.last_cleanup = datetime.min
+        # How the calling thread's last SQL was produced: "similar", "few_shot" or "zero_shot"
+        self._generation = threading.local()
 
-        register_agent_instance("SQLQueryGeneratorAgent", self)
+        register_agent_instance(self.REGISTRY_NAME, self)
 
         logger.info("AgentsClient initialized successfully")
 
@@ -53,51 +65,102 @@ class AGSQLQueryGenerator:
             if self.agent is not None:
                 return self.agent
 
-            for agent in self.agent_client.list_agents():
-                if agent.name == sql_query_generator_agent_name:
-                    self.agent = agent
-                    return self.agent
-
-            self.agent = self.agent_client.create_agent(
-                model=MODEL_DEPLOYMENT_NAME,
-                name=sql_query_generator_agent_name,
-                instructions=sql_query_generator_instruction,
-                top_p=0.89,
-                temperature=0.01
+            agent_options = {
+                "model": MODEL_DEPLOYMENT_NAME,
+                "instructions": sql_query_generator_instruction,
+                "top_p": 0.89,
+                "temperature": 0.01
+            }
+
+            def create_agent():
+                return self.agent_client.create_agent(
+                    name=sql_query_generator_agent_name,
+                    **agent_options
+                )
+
+            def update_agent(agent_id):
+                return self.agent_client.update_agent(agent_id, **agent_options)
+
+            self.agent = resolve_agent(
+                self.agent_client,
+                sql_query_generator_agent_name,
+                agent_config_hash(**agent_options),
+                create_agent,
+                update_agent
             )
             return self.agent
 
-    def invoke(self, prompt: str) -> str:
+    def invoke(self, prompt: str, request_text: str = None) -> str:
+        """
+        `request_text` is the user's own wording inside `prompt`; when given, SQL already
+        verified for a near-duplicate request is reused instead of running the model.
+        """
+        if request_text:
+            with span("sql.similar_lookup"):
+                similar_sql = lookup_similar_sql(request_text)
+            if similar_sql is not None:
+                self._generation.source = "similar"
+                return similar_sql
+        # Identical prompts arriving together (e.g. a circulated report) share one model run
+        key = " ".join(prompt.split())
+        with span("sql.generate"):
+            sql_query, source = _sql_generation_flight.do(key, self._invoke, prompt, request_text)
+        self._generation.source = source
+        return sql_query
+
+    def last_generation_source(self) -> str:
+        return getattr(self._generation, "source", "zero_shot")
+
+    def remember(self, request_text: str, sql_query: str, row_count: int):
+        """Record SQL that returned rows for request_text, for reuse and as a future example"""
+        remember_sql(request_text, sql_query)
+        record_example(request_text, sql_query, row_count, source="sql_agent")
+
+    def _invoke(self, prompt: str, request_text: str = None):
         logger.info(f"🚀Invoking SQL agent for prompt: {prompt}")
         thread = None
         try:
             agent = self.get_or_create_sql_agent()
             instruction = build_sql_instruction() + "\n\nIMPORTANT: Output ONLY the SQL query. Do NOT include any explanations, descriptions, or additional text."
 
-            thread = self.agent_client.threads.create()
+            thread = self._create_thread()
             self.mark_run_active(thread.id)
 
-            self.agent_client.messages.create(
+            azure_call(
+                self.agent_client.messages.create,
                 thread_id=thread.id,
                 role="assistant",
-                content=instruction
+                content=instruction,
+                idempotent=False
             )
 
-            self.agent_client.messages.create(
+            with span("sql.few_shot_retrieval"):
+                examples = retrieve_examples(request_text) if FEW_SHOT_ENABLED and request_text else []
+            if examples:
+                logger.info(f"🚀Adding {len(examples)} verified examples (best score {examples[0]['score']})")
+                azure_call(
+                    self.agent_client.messages.create,
+                    thread_id=thread.id,
+                    role="assistant",
+                    content=format_examples(examples),
+                    idempotent=False
+                )
+
+            azure_call(
+                self.agent_client.messages.create,
                 thread_id=thread.id,
                 role="user",
-                content=prompt
+                content=prompt,
+                idempotent=False
             )
 
-            run = self.agent_client.runs.create_and_process(
-                thread_id=thread.id,
-                agent_id=agent.id
-            )
+            with span("sql.agent_run"):
+                self._run_to_completion(thread.id, agent.id)
 
-            messages = list(self.agent_client.messages.list(
+            messages = azure_call(lambda: list(self.agent_client.messages.list(
                 thread_id=thread.id,
                 order=ListSortOrder.ASCENDING
-            ))
+            )))
 
             agent_response = None
             for message in reversed(messages):
@@ -108,8 +171,10 @@ class AGSQLQueryGenerator:
             if agent_response is None:
                 raise RuntimeError("No response from SQL agent")
 
-            return self.extract_sql_query(agent_response)
+            return self.extract_sql_query(agent_response), "few_shot" if examples else "zero_shot"
 
+        except (OperationCancelled, CircuitOpenError):
+            raise
         except Exception as e:
             logger.error("Error during SQL agent invocation", exc_info=True)
             raise RuntimeError(f"SQL generation failed: {e}")
@@ -121,6 +186,22 @@ class AGSQLQueryGenerator:
                 self.cleanup_stale_runs()
                 self.last_cleanup = datetime.now()
 
+    def _run_to_completion(self, thread_id: str, agent_id: str):
+        """Poll the run like create_and_process would, but cancel it once its request is cancelled"""
+        token = current_token()
+        run = azure_call(self.agent_client.runs.create, thread_id=thread_id, agent_id=agent_id, idempotent=False)
+        interval = self.RUN_POLL_INTERVAL
+        while run.status in ("queued", "in_progress"):
+            if token is not None and token.wait(interval):
+                logger.info(f"🚀Cancelling SQL agent run {run.id}: {token.reason}")
+                self.agent_client.runs.cancel(thread_id=thread_id, run_id=run.id)
+                raise OperationCancelled(token.reason)
+            if token is None:
+                time.sleep(interval)
+            interval = min(interval * 2, self.RUN_POLL_MAX_INTERVAL)
+            run = azure_call(self.agent_client.runs.get, thread_id=thread_id, run_id=run.id)
+        return run
+
     def extract_sql_query(self, response: str) -> str:
         """Ensure only valid SQL is returned"""
         # Reject any code that isn't SQL
@@ -154,7 +235,21 @@ class AGSQLQueryGenerator:
         self.active_runs.pop(thread_id, None)
 
     def get_active_thread_ids(self):
-        return set(self.active_runs.keys())
+        return set(self.active_runs.keys()) | {t.id for t in list(self.spare_threads)}
+
+    def precreate_threads(self, count: int):
+        for _ in range(count):
+            thread = azure_call(self.agent_client.threads.create, idempotent=False)
+            record_thread(thread.id, self.REGISTRY_NAME)
+            self.spare_threads.append(thread)
+
+    def _create_thread(self):
+        try:
+            return self.spare_threads.popleft()
+        except IndexError:
+            thread = azure_call(self.agent_client.threads.create, idempotent=False)
+            record_thread(thread.id, self.REGISTRY_NAME)
+            return thread
 
     def cleanup_stale_runs(self, ttl_minutes=60):
         now = datetime.now()
@@ -167,3 +262,16 @@ class AGSQLQueryGenerator:
         after_count = len(self.active_runs)
         if before_count != after_count:
             logger.info(f"🚀Cleaned up stale AGSQLQueryGenerator runs: {before_count - after_count} removed")
+
+
+_shared_generator = None
+
+
+def get_sql_query_generator() -> AGSQLQueryGenerator:
+    """Process-wide AGSQLQueryGenerator so the agent lookup and client are reused"""
+    global _shared_generator
+    if _shared_generator is None:
+        with AGSQLQueryGenerator._lock:
+            if _shared_generator is None:
+                _shared_generator = AGSQLQueryGenerator()
+    return _shared_generator
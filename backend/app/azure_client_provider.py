@@ -0,0 +1,137 @@
+# backend/app/azure_client_provider.py
+import time
+import threading
+import logging
+import requests
+from requests.adapters import HTTPAdapter
+from azure.identity import DefaultAzureCredential
+from azure.core.pipeline.transport import RequestsTransport
+from azure.ai.agents import AgentsClient
+from .config import (
+    PROJECT_ENDPOINT,
+    AZURE_AI_TOKEN_SCOPE,
+    AZURE_TOKEN_REFRESH_MARGIN_SECONDS,
+    AZURE_HTTP_POOL_MAXSIZE
+)
+
+# Set up logger
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+# Create console handler with higher level
+ch = logging.StreamHandler()
+ch.setLevel(logging.INFO)
+
+# Create formatter and add it to the handlers
+formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+ch.setFormatter(formatter)
+logger.addHandler(ch)
+
+
+class RefreshingCredential:
+    """
+    Token credential that caches tokens per scope and refreshes them in the background
+    shortly before expiry, so request threads almost never wait on AAD.
+    """
+
+    def __init__(self, credential, refresh_margin: int = AZURE_TOKEN_REFRESH_MARGIN_SECONDS):
+        self._credential = credential
+        self._refresh_margin = refresh_margin
+        self._tokens = {}
+        self._timers = {}
+        self._lock = threading.Lock()
+
+    def _fetch(self, scopes: tuple):
+        token = self._credential.get_token(*scopes)
+        with self._lock:
+            self._tokens[scopes] = token
+            self._schedule_refresh(scopes, token)
+        logger.info(f"🚀Fetched AAD token for {scopes}, expires in {int(token.expires_on - time.time())}s")
+        return token
+
+    def _schedule_refresh(self, scopes: tuple, token):
+        timer = self._timers.pop(scopes, None)
+        if timer is not None:
+            timer.cancel()
+        delay = max(token.expires_on - time.time() - self._refresh_margin, 1)
+        timer = threading.Timer(delay, self._background_refresh, args=(scopes,))
+        timer.daemon = True
+        timer.start()
+        self._timers[scopes] = timer
+
+    def _background_refresh(self, scopes: tuple):
+        try:
+            self._fetch(scopes)
+        except Exception as e:
+            # The next get_token call refreshes synchronously if the token has really expired
+            logger.warning(f"🚀Background token refresh failed for {scopes}: {e}")
+
+    def get_token(self, *scopes, **kwargs):
+        if kwargs:
+            # claims / tenant_id challenges are rare; don't cache them
+            return self._credential.get_token(*scopes, **kwargs)
+        token = self._tokens.get(scopes)
+        if token is not None and token.expires_on - time.time() > self._refresh_margin:
+            return token
+        return self._fetch(scopes)
+
+    def close(self):
+        with self._lock:
+            for timer in self._timers.values():
+                timer.cancel()
+            self._timers.clear()
+        self._credential.close()
+
+
+_credential = None
+_transport = None
+_agents_client = None
+_provider_lock = threading.Lock()
+
+
+def get_credential() -> RefreshingCredential:
+    global _credential
+    if _credential is None:
+        with _provider_lock:
+            if _credential is None:
+                _credential = RefreshingCredential(
+                    DefaultAzureCredential(
+                        exclude_environment_credential=True,
+                        exclude_managed_identity_credential=True
+                    )
+                )
+    return _credential
+
+
+def get_transport() -> RequestsTransport:
+    """Pooled HTTP transport shared by every Azure client in the process (keeps TLS connections alive)"""
+    global _transport
+    if _transport is None:
+        with _provider_lock:
+            if _transport is None:
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=4, pool_maxsize=AZURE_HTTP_POOL_MAXSIZE)
+                session.mount("https://", adapter)
+                session.mount("http://", adapter)
+                _transport = RequestsTransport(session=session, session_owner=False)
+    return _transport
+
+
+def get_agents_client() -> AgentsClient:
+    global _agents_client
+    if _agents_client is None:
+        credential = get_credential()
+        transport = get_transport()
+        with _provider_lock:
+            if _agents_client is None:
+                logger.info("🚀Creating shared AgentsClient")
+                _agents_client = AgentsClient(
+                    endpoint=PROJECT_ENDPOINT,
+                    credential=credential,
+                    transport=transport
+                )
+    return _agents_client
+
+
+def prefetch_token():
+    get_credential().get_token(AZURE_AI_TOKEN_SCOPE)
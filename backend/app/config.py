@@ -8,6 +8,8 @@ load_dotenv()
 DATABRICKS_SERVER_HOSTNAME = os.getenv("DATABRICKS_SERVER_HOSTNAME")
 DATABRICKS_ACCESS_TOKEN = os.getenv("DATABRICKS_ACCESS_TOKEN")
 DATABRICKS_HTTP_PATH = os.getenv("DATABRICKS_HTTP_PATH")
+DATABRICKS_CATALOG = os.getenv("DATABRICKS_CATALOG", "trade_catalog")
+DATABRICK_SCHEMA = os.getenv("DATABRICK_SCHEMA", "trade_schema")
 
 PROJECT_ENDPOINT = os.getenv("PROJECT_ENDPOINT")
 MODEL_DEPLOYMENT_NAME = os.getenv("MODEL_DEPLOYMENT_NAME")
@@ -87,4 +89,133 @@ agent_behavior_instructions = {
         "headings, bullet points, and numbered lists. Ensure logical flow and high readability. "
         "Summarize key takeaways at the end if applicable."
     )
-}
\ No newline at end of file
+}
+
+# ----- LOCAL STATE -----
+# SQLite file shared by every worker on this host (thread registry, leases, caches)
+LOCAL_STATE_DB = os.getenv(
+    "LOCAL_STATE_DB",
+    os.path.join(os.path.dirname(__file__), "cache", "local_state.db")
+)
+
+# Threads we created are deleted once idle for longer than this
+THREAD_IDLE_TTL_MINUTES = int(os.getenv("THREAD_IDLE_TTL_MINUTES", "60"))
+
+# ----- DATABRICKS CONNECTION POOL -----
+DATABRICKS_POOL_MIN_SIZE = int(os.getenv("DATABRICKS_POOL_MIN_SIZE", "1"))
+DATABRICKS_POOL_MAX_SIZE = int(os.getenv("DATABRICKS_POOL_MAX_SIZE", "8"))
+# Idle connections older than this are closed instead of reused; keep it below the warehouse session timeout
+DATABRICKS_POOL_MAX_IDLE_SECONDS = int(os.getenv("DATABRICKS_POOL_MAX_IDLE_SECONDS", "600"))
+
+# ----- STARTUP WARM-UP -----
+AZURE_AI_TOKEN_SCOPE = os.getenv("AZURE_AI_TOKEN_SCOPE", "https://ai.azure.com/.default")
+WARMUP_PRECREATED_THREADS = int(os.getenv("WARMUP_PRECREATED_THREADS", "2"))
+
+# ----- SHARED AZURE CLIENT -----
+# Refresh AAD tokens this many seconds before they expire
+AZURE_TOKEN_REFRESH_MARGIN_SECONDS = int(os.getenv("AZURE_TOKEN_REFRESH_MARGIN_SECONDS", "300"))
+AZURE_HTTP_POOL_MAXSIZE = int(os.getenv("AZURE_HTTP_POOL_MAXSIZE", "32"))
+
+# ----- ENTITY MATCHER -----
+# How often the known trader/counterparty names are re-read from Databricks
+ENTITY_REFRESH_INTERVAL_MINUTES = int(os.getenv("ENTITY_REFRESH_INTERVAL_MINUTES", "60"))
+
+# ----- PNL ROLLUP -----
+ROLLUP_REFRESH_INTERVAL_MINUTES = int(os.getenv("ROLLUP_REFRESH_INTERVAL_MINUTES", "30"))
+# Re-read this many days before the watermark on each refresh to pick up late corrections
+ROLLUP_LOOKBACK_DAYS = int(os.getenv("ROLLUP_LOOKBACK_DAYS", "3"))
+# Don't answer from a rollup that hasn't refreshed for this long
+ROLLUP_MAX_STALENESS_MINUTES = int(os.getenv("ROLLUP_MAX_STALENESS_MINUTES", "180"))
+# Rebuild everything this often, dropping groups deleted in the warehouse
+ROLLUP_RECONCILE_HOURS = int(os.getenv("ROLLUP_RECONCILE_HOURS", "24"))
+# Warehouse rows fetched and written per batch while refreshing
+ROLLUP_FETCH_BATCH_ROWS = int(os.getenv("ROLLUP_FETCH_BATCH_ROWS", "50000"))
+
+# ----- GRAPH CACHE / PRE-WARM -----
+GRAPH_CACHE_TTL_MINUTES = int(os.getenv("GRAPH_CACHE_TTL_MINUTES", "120"))
+GRAPH_CACHE_MAX_ENTRIES = int(os.getenv("GRAPH_CACHE_MAX_ENTRIES", "256"))
+PREWARM_INTERVAL_MINUTES = int(os.getenv("PREWARM_INTERVAL_MINUTES", "60"))
+PREWARM_TOP_K = int(os.getenv("PREWARM_TOP_K", "20"))
+PREWARM_LOOKBACK_DAYS = int(os.getenv("PREWARM_LOOKBACK_DAYS", "7"))
+
+# ----- TOOL DISPATCH -----
+TOOL_DISPATCH_MAX_WORKERS = int(os.getenv("TOOL_DISPATCH_MAX_WORKERS", "8"))
+TOOL_TIMEOUT_SECONDS = int(os.getenv("TOOL_TIMEOUT_SECONDS", "120"))
+# Upper bound for one orchestrator run, tool calls included
+AGENT_RUN_TIMEOUT_SECONDS = int(os.getenv("AGENT_RUN_TIMEOUT_SECONDS", "300"))
+
+# ----- FILE INGESTION -----
+# Files above this size are analysed chunk by chunk instead of being pasted into the prompt
+FILE_INLINE_MAX_TOKENS = int(os.getenv("FILE_INLINE_MAX_TOKENS", "8000"))
+FILE_CHUNK_TOKENS = int(os.getenv("FILE_CHUNK_TOKENS", "6000"))
+FILE_CHUNK_OVERLAP_TOKENS = int(os.getenv("FILE_CHUNK_OVERLAP_TOKENS", "200"))
+FILE_INGESTION_MAX_WORKERS = int(os.getenv("FILE_INGESTION_MAX_WORKERS", "4"))
+
+# ----- TOKEN BUDGET / THREAD ROLLOVER -----
+MODEL_CONTEXT_TOKENS = int(os.getenv("MODEL_CONTEXT_TOKENS", "128000"))
+# Tokens kept free for the model's answer when budgeting a request
+RESPONSE_TOKEN_RESERVE = int(os.getenv("RESPONSE_TOKEN_RESERVE", "4000"))
+HISTORY_MAX_TOKENS = int(os.getenv("HISTORY_MAX_TOKENS", "4000"))
+THREAD_MAX_RUNS = int(os.getenv("THREAD_MAX_RUNS", "20"))
+THREAD_MAX_TOKENS = int(os.getenv("THREAD_MAX_TOKENS", "45000"))
+THREAD_MAX_AGE_MINUTES = int(os.getenv("THREAD_MAX_AGE_MINUTES", "60"))
+# Start preparing the next thread in the background once a limit is this close
+THREAD_ROLLOVER_PREPARE_RATIO = float(os.getenv("THREAD_ROLLOVER_PREPARE_RATIO", "0.8"))
+ROLLOVER_KEEP_TURNS = int(os.getenv("ROLLOVER_KEEP_TURNS", "4"))
+ROLLOVER_SUMMARY_TOKENS = int(os.getenv("ROLLOVER_SUMMARY_TOKENS", "1500"))
+
+# ----- CONVERSATION STORE -----
+CONVERSATION_CACHE_SIZE = int(os.getenv("CONVERSATION_CACHE_SIZE", "512"))
+CONVERSATION_MAX_MESSAGES = int(os.getenv("CONVERSATION_MAX_MESSAGES", "200"))
+CONVERSATION_TTL_HOURS = int(os.getenv("CONVERSATION_TTL_HOURS", "24"))
+
+# ----- ASK RESPONSE CACHE -----
+# Opt-in: answers to context-free /ask prompts are reused until the data or schema changes
+ASK_RESPONSE_CACHE_ENABLED = os.getenv("ASK_RESPONSE_CACHE_ENABLED", "false").lower() == "true"
+ASK_RESPONSE_CACHE_TTL_MINUTES = int(os.getenv("ASK_RESPONSE_CACHE_TTL_MINUTES", "30"))
+ASK_RESPONSE_CACHE_MAX_ENTRIES = int(os.getenv("ASK_RESPONSE_CACHE_MAX_ENTRIES", "512"))
+
+# ----- SIMILAR PROMPT SQL REUSE -----
+# SQL of a verified near-duplicate prompt is reused when cosine similarity reaches the threshold
+SIMILAR_SQL_CACHE_ENABLED = os.getenv("SIMILAR_SQL_CACHE_ENABLED", "true").lower() == "true"
+SIMILAR_SQL_THRESHOLD = float(os.getenv("SIMILAR_SQL_THRESHOLD", "0.7"))
+SIMILARITY_INDEX_CAPACITY = int(os.getenv("SIMILARITY_INDEX_CAPACITY", "512"))
+SIMILARITY_INDEX_FEATURES = int(os.getenv("SIMILARITY_INDEX_FEATURES", "2048"))
+
+# ----- FEW-SHOT SQL EXAMPLES -----
+FEW_SHOT_ENABLED = os.getenv("FEW_SHOT_ENABLED", "true").lower() == "true"
+FEW_SHOT_K = int(os.getenv("FEW_SHOT_K", "3"))
+# Examples below this cosine similarity are not worth their tokens
+FEW_SHOT_MIN_SCORE = float(os.getenv("FEW_SHOT_MIN_SCORE", "0.3"))
+FEW_SHOT_MAX_EXAMPLES = int(os.getenv("FEW_SHOT_MAX_EXAMPLES", "1000"))
+
+# ----- ADMISSION CONTROL -----
+# Agent requests running at once per worker, and how many may wait behind them before 429s
+ASK_MAX_CONCURRENCY = int(os.getenv("ASK_MAX_CONCURRENCY", "8"))
+ASK_MAX_QUEUE = int(os.getenv("ASK_MAX_QUEUE", "32"))
+ASK_QUEUE_TIMEOUT_SECONDS = float(os.getenv("ASK_QUEUE_TIMEOUT_SECONDS", "15"))
+# Per user (X-User-Id header, else client address): running and waiting requests allowed at once
+ASK_USER_MAX_ACTIVE = int(os.getenv("ASK_USER_MAX_ACTIVE", "4"))
+ASK_USER_MAX_QUEUED = int(os.getenv("ASK_USER_MAX_QUEUED", "16"))
+
+# ----- BATCH ASK -----
+BATCH_MAX_ITEMS = int(os.getenv("BATCH_MAX_ITEMS", "200"))
+# Items of one batch in flight at once; they also pass admission control as "bulk" requests
+BATCH_MAX_CONCURRENCY = int(os.getenv("BATCH_MAX_CONCURRENCY", "4"))
+# Times an item rejected by admission control is retried after its Retry-After
+BATCH_ADMISSION_RETRIES = int(os.getenv("BATCH_ADMISSION_RETRIES", "5"))
+
+# ----- CANCELLATION -----
+# Work for an /ask request stops (Azure runs cancelled, warehouse statements cancelled) after this long
+ASK_DEADLINE_SECONDS = float(os.getenv("ASK_DEADLINE_SECONDS", "300"))
+DISCONNECT_POLL_SECONDS = float(os.getenv("DISCONNECT_POLL_SECONDS", "1.0"))
+
+# ----- RETRIES / CIRCUIT BREAKERS -----
+RETRY_MAX_ATTEMPTS = int(os.getenv("RETRY_MAX_ATTEMPTS", "4"))
+RETRY_BASE_DELAY_SECONDS = float(os.getenv("RETRY_BASE_DELAY_SECONDS", "0.5"))
+RETRY_MAX_DELAY_SECONDS = float(os.getenv("RETRY_MAX_DELAY_SECONDS", "8"))
+# Each call earns this fraction of a retry, so retries stay a bounded share of traffic
+RETRY_BUDGET_RATIO = float(os.getenv("RETRY_BUDGET_RATIO", "0.2"))
+RETRY_BUDGET_MAX_TOKENS = float(os.getenv("RETRY_BUDGET_MAX_TOKENS", "10"))
+BREAKER_FAILURE_THRESHOLD = int(os.getenv("BREAKER_FAILURE_THRESHOLD", "5"))
+BREAKER_RECOVERY_SECONDS = float(os.getenv("BREAKER_RECOVERY_SECONDS", "30"))
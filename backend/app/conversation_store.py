@@ -0,0 +1,147 @@
+# backend/app/conversation_store.py
+import json
+import time
+import uuid
+import logging
+from contextlib import closing
+from dataclasses import dataclass, field
+from typing import List, Optional
+from .config import CONVERSATION_CACHE_SIZE, CONVERSATION_MAX_MESSAGES, CONVERSATION_TTL_HOURS
+from .utility.local_db import get_connection
+from .utility.ttl_cache import TTLCache
+
+# Set up logger
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+# Create console handler with higher level
+ch = logging.StreamHandler()
+ch.setLevel(logging.INFO)
+
+# Create formatter and add it to the handlers
+formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+ch.setFormatter(formatter)
+logger.addHandler(ch)
+
+# -----------------------------------------------------------------------------
+# Server-side chat history keyed by conversation id, so clients send only the new
+# message. The local state DB is the source of truth (every worker on the host
+# sees the same conversations); a bounded per-worker LRU keeps hot conversations
+# parsed and is revalidated by the row's version on each read. Ids are issued by
+# the server and a conversation is only visible to the caller that started it.
+# Writes are compare-and-set on the version, so concurrent turns are merged, not lost.
+# -----------------------------------------------------------------------------
+
+CONVERSATION_TTL_SECONDS = CONVERSATION_TTL_HOURS * 3600
+# Attempts to save a turn while other turns of the same conversation keep landing first
+APPEND_MAX_ATTEMPTS = 5
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS conversations (
+    conversation_id TEXT PRIMARY KEY,
+    owner           TEXT,
+    thread_id       TEXT,
+    messages        TEXT NOT NULL,
+    version         INTEGER NOT NULL,
+    updated_at      REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_conversations_updated ON conversations (updated_at);
+"""
+
+
+@dataclass
+class Conversation:
+    conversation_id: str
+    owner: Optional[str] = None
+    thread_id: Optional[str] = None
+    messages: List[dict] = field(default_factory=list)
+    version: int = 0
+
+
+_cache = TTLCache(maxsize=CONVERSATION_CACHE_SIZE, ttl_seconds=CONVERSATION_TTL_SECONDS)
+
+
+def _connect():
+    return get_connection("conversations", _SCHEMA)
+
+
+def create_conversation(owner: Optional[str] = None) -> Conversation:
+    """New conversation with a server-issued id"""
+    return Conversation(conversation_id=uuid.uuid4().hex, owner=owner)
+
+
+def get_conversation(conversation_id: str, owner: Optional[str] = None) -> Optional[Conversation]:
+    """The caller's live conversation with this id; None when unknown, expired or someone else's"""
+    with closing(_connect()) as conn:
+        row = conn.execute(
+            "SELECT thread_id, version FROM conversations "
+            "WHERE conversation_id = ? AND owner IS ? AND updated_at > ?",
+            (conversation_id, owner, time.time() - CONVERSATION_TTL_SECONDS)
+        ).fetchone()
+        if row is None:
+            return None
+        cached = _cache.get(conversation_id)
+        if cached is not None and cached.version == row["version"]:
+            return cached
+        # Not cached here, or appended to by another worker since
+        messages = conn.execute(
+            "SELECT messages FROM conversations WHERE conversation_id = ?", (conversation_id,)
+        ).fetchone()["messages"]
+    conversation = Conversation(conversation_id, owner, row["thread_id"], json.loads(messages), row["version"])
+    _cache.set(conversation_id, conversation)
+    return conversation
+
+
+def _save(conn, updated: Conversation, expected_version: int) -> bool:
+    """Write `updated` only if the stored row is still at expected_version (or, for a new one, absent or expired)"""
+    values = (updated.thread_id, json.dumps(updated.messages), updated.version, time.time())
+    if expected_version == 0:
+        cursor = conn.execute(
+            "INSERT INTO conversations (conversation_id, owner, thread_id, messages, version, updated_at) "
+            "VALUES (?, ?, ?, ?, ?, ?) "
+            "ON CONFLICT (conversation_id) DO UPDATE SET owner = excluded.owner, thread_id = excluded.thread_id, "
+            "messages = excluded.messages, version = excluded.version, updated_at = excluded.updated_at "
+            "WHERE conversations.updated_at <= ?",
+            (updated.conversation_id, updated.owner, *values, time.time() - CONVERSATION_TTL_SECONDS)
+        )
+    else:
+        cursor = conn.execute(
+            "UPDATE conversations SET thread_id = ?, messages = ?, version = ?, updated_at = ? "
+            "WHERE conversation_id = ? AND version = ?",
+            (*values, updated.conversation_id, expected_version)
+        )
+    return cursor.rowcount == 1
+
+
+def append_messages(conversation: Conversation, messages: List[dict], thread_id: Optional[str] = None) -> Conversation:
+    """
+    Append the new turn and persist; history beyond CONVERSATION_MAX_MESSAGES drops its oldest messages.
+    When another turn was saved since `conversation` was read, the turn is appended to that newer copy.
+    """
+    for _ in range(APPEND_MAX_ATTEMPTS):
+        updated = Conversation(
+            conversation_id=conversation.conversation_id,
+            owner=conversation.owner,
+            thread_id=thread_id or conversation.thread_id,
+            messages=(conversation.messages + messages)[-CONVERSATION_MAX_MESSAGES:],
+            version=conversation.version + 1
+        )
+        with closing(_connect()) as conn:
+            saved = _save(conn, updated, conversation.version)
+        if saved:
+            _cache.set(updated.conversation_id, updated)
+            return updated
+        logger.info(f"🚀Conversation {conversation.conversation_id} changed concurrently, merging turn")
+        latest = get_conversation(conversation.conversation_id, conversation.owner)
+        # Expired (or purged) in between: the turn starts it afresh under the same id
+        conversation = latest or Conversation(conversation.conversation_id, conversation.owner)
+    raise RuntimeError(f"Conversation {conversation.conversation_id} kept changing; turn not saved")
+
+
+def purge_expired_conversations():
+    with closing(_connect()) as conn:
+        deleted = conn.execute(
+            "DELETE FROM conversations WHERE updated_at <= ?", (time.time() - CONVERSATION_TTL_SECONDS,)
+        ).rowcount
+    if deleted:
+        logger.info(f"🚀Purged {deleted} expired conversations")
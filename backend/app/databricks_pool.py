@@ -0,0 +1,150 @@
+# backend/app/databricks_pool.py
+import time
+import queue
+import threading
+import logging
+from contextlib import contextmanager
+from databricks import sql
+from databricks.sql import OperationalError, InterfaceError
+from .config import (
+    DATABRICKS_SERVER_HOSTNAME,
+    DATABRICKS_ACCESS_TOKEN,
+    DATABRICKS_HTTP_PATH,
+    DATABRICKS_POOL_MIN_SIZE,
+    DATABRICKS_POOL_MAX_SIZE,
+    DATABRICKS_POOL_MAX_IDLE_SECONDS
+)
+
+# Set up logger
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+# Create console handler with higher level
+ch = logging.StreamHandler()
+ch.setLevel(logging.INFO)
+
+# Create formatter and add it to the handlers
+formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+ch.setFormatter(formatter)
+logger.addHandler(ch)
+
+
+class DatabricksConnectionPool:
+    """Small blocking pool of Databricks SQL connections so queries skip the connect/TLS handshake."""
+
+    def __init__(self, min_size: int = DATABRICKS_POOL_MIN_SIZE, max_size: int = DATABRICKS_POOL_MAX_SIZE, acquire_timeout: float = 60,
+                 max_idle_seconds: float = DATABRICKS_POOL_MAX_IDLE_SECONDS):
+        self.min_size = min_size
+        self.max_size = max(max_size, 1)
+        self.acquire_timeout = acquire_timeout
+        self.max_idle_seconds = max_idle_seconds
+        # (connection, time it was last returned) pairs, most recently used on top
+        self._idle = queue.LifoQueue()
+        self._created = 0
+        self._lock = threading.Lock()
+
+    def _open(self):
+        logger.info("🚀Opening new Databricks connection")
+        return sql.connect(
+            server_hostname=DATABRICKS_SERVER_HOSTNAME,
+            http_path=DATABRICKS_HTTP_PATH,
+            access_token=DATABRICKS_ACCESS_TOKEN
+        )
+
+    def _discard(self, conn):
+        with self._lock:
+            self._created -= 1
+        try:
+            conn.close()
+        except Exception as e:
+            logger.warning(f"🚀Failed to close Databricks connection: {e}")
+
+    def fill_to_min(self):
+        """Open connections until min_size are available (used during startup warm-up)."""
+        while True:
+            with self._lock:
+                if self._created >= self.min_size:
+                    return
+                self._created += 1
+            try:
+                self._idle.put((self._open(), time.monotonic()))
+            except Exception:
+                with self._lock:
+                    self._created -= 1
+                raise
+
+    def _take_fresh(self, idle_entry):
+        """The idle connection, or None after discarding it if the warehouse has likely expired its session"""
+        conn, last_used = idle_entry
+        if time.monotonic() - last_used > self.max_idle_seconds:
+            logger.info("🚀Discarding Databricks connection idle past the session timeout")
+            self._discard(conn)
+            return None
+        return conn
+
+    def acquire(self):
+        deadline = time.monotonic() + self.acquire_timeout
+        while True:
+            try:
+                conn = self._take_fresh(self._idle.get_nowait())
+                if conn is not None:
+                    return conn
+                continue
+            except queue.Empty:
+                pass
+
+            with self._lock:
+                can_open = self._created < self.max_size
+                if can_open:
+                    self._created += 1
+            if can_open:
+                try:
+                    return self._open()
+                except Exception:
+                    with self._lock:
+                        self._created -= 1
+                    raise
+
+            remaining = deadline - time.monotonic()
+            logger.info("🚀Databricks pool exhausted, waiting for a free connection")
+            try:
+                conn = self._take_fresh(self._idle.get(timeout=max(remaining, 0)))
+            except queue.Empty:
+                raise TimeoutError(f"Databricks connection pool exhausted after {self.acquire_timeout:g}s") from None
+            if conn is not None:
+                return conn
+
+    def release(self, conn, broken: bool = False):
+        if broken:
+            self._discard(conn)
+        else:
+            self._idle.put((conn, time.monotonic()))
+
+    @contextmanager
+    def connection(self):
+        conn = self.acquire()
+        broken = False
+        try:
+            yield conn
+        except (OperationalError, InterfaceError):
+            # Connection-level failures leave the session unusable; don't hand it out again
+            broken = True
+            raise
+        finally:
+            self.release(conn, broken=broken)
+
+    def stats(self) -> dict:
+        return {"open": self._created, "idle": self._idle.qsize(), "max": self.max_size}
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool() -> DatabricksConnectionPool:
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = DatabricksConnectionPool()
+    return _pool
@@ -0,0 +1,159 @@
+# backend/app/entity_matcher.py
+import threading
+import logging
+from collections import deque
+from typing import Dict, Iterable, List, Optional, Tuple
+from .config import DATABRICKS_CATALOG, DATABRICK_SCHEMA
+
+# Set up logger
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+# Create console handler with higher level
+ch = logging.StreamHandler()
+ch.setLevel(logging.INFO)
+
+# Create formatter and add it to the handlers
+formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+ch.setFormatter(formatter)
+logger.addHandler(ch)
+
+# Entity kind -> column in entity_trade_header holding the known names
+ENTITY_COLUMNS = {
+    "trader": "trader",
+    "counterparty": "counterparty",
+}
+
+
+class AhoCorasick:
+    """Multi-pattern automaton: finds every known pattern in one pass over the text."""
+
+    def __init__(self):
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._out: List[List[Tuple[int, object]]] = [[]]
+
+    def add(self, pattern: str, payload):
+        node = 0
+        for char in pattern:
+            nxt = self._goto[node].get(char)
+            if nxt is None:
+                nxt = len(self._goto)
+                self._goto[node][char] = nxt
+                self._goto.append({})
+                self._fail.append(0)
+                self._out.append([])
+            node = nxt
+        self._out[node].append((len(pattern), payload))
+
+    def build(self):
+        # Breadth-first so every node's failure link is computed before its children's
+        queue = deque(self._goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for char, child in self._goto[node].items():
+                queue.append(child)
+                fail = self._fail[node]
+                while fail and char not in self._goto[fail]:
+                    fail = self._fail[fail]
+                target = self._goto[fail].get(char, 0)
+                self._fail[child] = target if node else 0
+                self._out[child] = self._out[child] + self._out[self._fail[child]]
+        return self
+
+    def search(self, text: str):
+        """Yield (start, end, payload) for every occurrence of every pattern."""
+        node = 0
+        for idx, char in enumerate(text):
+            while node and char not in self._goto[node]:
+                node = self._fail[node]
+            node = self._goto[node].get(char, 0)
+            for length, payload in self._out[node]:
+                yield idx - length + 1, idx + 1, payload
+
+
+def _is_boundary(text: str, start: int, end: int) -> bool:
+    before = text[start - 1] if start > 0 else " "
+    after = text[end] if end < len(text) else " "
+    return not before.isalnum() and not after.isalnum()
+
+
+class EntityMatcher:
+    """Resolves trader/counterparty mentions in a prompt against the known entity names."""
+
+    def __init__(self):
+        self._automaton: Optional[AhoCorasick] = None
+        self._names: Dict[str, List[str]] = {}
+        self._lock = threading.Lock()
+
+    @property
+    def is_loaded(self) -> bool:
+        return self._automaton is not None
+
+    def load(self, names_by_kind: Dict[str, Iterable[str]]):
+        names = {kind: sorted({v for v in values if v}) for kind, values in names_by_kind.items()}
+        automaton = build_automaton(names)
+        with self._lock:
+            self._automaton = automaton
+            self._names = names
+        logger.info(f"🚀Entity matcher loaded: { {k: len(v) for k, v in names.items()} }")
+
+    def refresh_from_databricks(self):
+        """Rebuild the automaton from the distinct entity names in the trade header table"""
+        from .graph_service import GraphService
+        names_by_kind = {}
+        for kind, column in ENTITY_COLUMNS.items():
+            result = GraphService.execute_sql_query(
+                f"SELECT DISTINCT {column} FROM {DATABRICKS_CATALOG}.{DATABRICK_SCHEMA}.entity_trade_header "
+                f"WHERE {column} IS NOT NULL"
+            )
+            if result.get("status") != "success":
+                logger.warning(f"🚀Entity matcher refresh failed for {kind}: {result.get('message')}")
+                return
+            names_by_kind[kind] = [row[column] for row in result["data"]]
+        self.load(names_by_kind)
+
+    def mentions(self, prompt: str, automaton: Optional[AhoCorasick] = None) -> Dict[str, Tuple[str, int, int]]:
+        """
+        One pass over the prompt. Returns {kind: (canonical name, start, end)} using the
+        longest whole-word match per kind (so "John Smith" wins over "John").
+        """
+        automaton = automaton or self._automaton
+        if automaton is None or not prompt:
+            return {}
+        text = prompt.lower()
+        best: Dict[str, Tuple[str, int, int]] = {}
+        for start, end, (kind, name) in automaton.search(text):
+            if not _is_boundary(text, start, end):
+                continue
+            if kind not in best or end - start > best[kind][2] - best[kind][1]:
+                best[kind] = (name, start, end)
+        return best
+
+    def match(self, prompt: str, automaton: Optional[AhoCorasick] = None) -> Dict[str, str]:
+        """Returns {kind: canonical name} of the mentions in the prompt"""
+        return {kind: name for kind, (name, _, _) in self.mentions(prompt, automaton).items()}
+
+
+def build_automaton(names_by_kind: Dict[str, Iterable[str]]) -> AhoCorasick:
+    """One-off automaton, e.g. over the values of a DataFrame when no global names are loaded"""
+    automaton = AhoCorasick()
+    for kind, values in names_by_kind.items():
+        for name in {v for v in values if v}:
+            automaton.add(name.lower(), (kind, name))
+    return automaton.build()
+
+
+_matcher = EntityMatcher()
+
+
+def get_entity_matcher() -> EntityMatcher:
+    return _matcher
+
+
+def refresh_entity_matcher():
+    """Reload the known names from Databricks (warm-up and the scheduled refresh)"""
+    try:
+        _matcher.refresh_from_databricks()
+    except Exception as e:
+        logger.warning(f"🚀Entity matcher refresh failed: {e}")
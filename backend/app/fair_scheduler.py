@@ -0,0 +1,117 @@
+# backend/app/fair_scheduler.py
+import itertools
+from collections import defaultdict, deque
+from dataclasses import dataclass, field
+from typing import Any, Dict, Optional
+
+# -----------------------------------------------------------------------------
+# Weighted fair queue for agent requests (self-clocked fair queuing). Each user
+# has a FIFO of waiting requests; a request is stamped with a virtual finish time
+# of max(system virtual time, the user's previous finish) + 1 / weight, and the
+# earliest stamp among users below their concurrency cap runs next. A user firing
+# a hundred questions therefore interleaves with everyone else instead of going
+# ahead of them, and priority classes only change how fast each user's clock runs.
+# -----------------------------------------------------------------------------
+
+PRIORITY_WEIGHTS = {
+    "interactive": 4.0,
+    "bulk": 1.0,
+}
+DEFAULT_PRIORITY = "interactive"
+
+
+def priority_weight(priority: Optional[str]) -> float:
+    return PRIORITY_WEIGHTS.get((priority or DEFAULT_PRIORITY).lower(), PRIORITY_WEIGHTS[DEFAULT_PRIORITY])
+
+
+@dataclass
+class QueueEntry:
+    user: str
+    priority: str
+    finish: float
+    seq: int
+    item: Any = None
+    removed: bool = field(default=False, repr=False)
+
+
+class FairQueue:
+    def __init__(self, user_max_active: int):
+        self.user_max_active = user_max_active
+        self.virtual_time = 0.0
+        self.active: Dict[str, int] = defaultdict(int)
+        self._queues: Dict[str, deque] = {}
+        self._last_finish: Dict[str, float] = defaultdict(float)
+        self._seq = itertools.count()
+        self._size = 0
+
+    def __len__(self) -> int:
+        return self._size
+
+    def queued_for(self, user: str) -> int:
+        return len(self._queues.get(user, ()))
+
+    def can_start(self, user: str) -> bool:
+        """A new request from `user` may run straight away if a slot is free"""
+        return self.active.get(user, 0) < self.user_max_active and not self._eligible_head()
+
+    def push(self, user: str, priority: Optional[str] = None, item: Any = None) -> QueueEntry:
+        start = max(self.virtual_time, self._last_finish[user])
+        priority = (priority or DEFAULT_PRIORITY).lower()
+        entry = QueueEntry(user, priority, start + 1.0 / priority_weight(priority), next(self._seq), item)
+        self._last_finish[user] = entry.finish
+        self._queues.setdefault(user, deque()).append(entry)
+        self._size += 1
+        return entry
+
+    def remove(self, entry: QueueEntry):
+        """Drop a waiting entry (timed out or cancelled)"""
+        queue = self._queues.get(entry.user)
+        if queue is None or entry.removed:
+            return
+        try:
+            queue.remove(entry)
+        except ValueError:
+            return
+        entry.removed = True
+        self._size -= 1
+        if not queue:
+            del self._queues[entry.user]
+            # Give back the virtual time it reserved, so a timeout is not held against the user
+            self._last_finish[entry.user] = max(self.virtual_time, self._last_finish[entry.user] - 1.0 / priority_weight(entry.priority))
+
+    def _eligible_head(self) -> Optional[QueueEntry]:
+        heads = [
+            queue[0] for user, queue in self._queues.items()
+            if self.active.get(user, 0) < self.user_max_active
+        ]
+        return min(heads, key=lambda e: (e.finish, e.seq)) if heads else None
+
+    def pop_next(self) -> Optional[QueueEntry]:
+        """Earliest-finishing head among users below their cap; the caller starts it"""
+        entry = self._eligible_head()
+        if entry is None:
+            return None
+        queue = self._queues[entry.user]
+        queue.popleft()
+        if not queue:
+            del self._queues[entry.user]
+        self._size -= 1
+        self.virtual_time = max(self.virtual_time, entry.finish)
+        return entry
+
+    def started(self, user: str):
+        self.active[user] += 1
+
+    def finished(self, user: str):
+        self.active[user] -= 1
+        if self.active[user] <= 0:
+            del self.active[user]
+            if user not in self._queues:
+                self._last_finish.pop(user, None)
+
+    def stats(self) -> dict:
+        return {
+            "queued_by_user": {user: len(queue) for user, queue in self._queues.items()},
+            "active_by_user": dict(self.active),
+            "virtual_time": round(self.virtual_time, 3),
+        }
@@ -0,0 +1,299 @@
+# backend/app/fast_path_router.py
+import time
+import calendar
+import threading
+import logging
+from collections import Counter
+from dataclasses import dataclass, field
+from typing import Optional, Dict, Any, Tuple
+from .config import DATABRICKS_CATALOG, DATABRICK_SCHEMA
+from .graph_service import GraphService
+from .schema_utils import load_schema
+from .prompt_parser import parse_prompt, PromptIntent, TimeWindow
+from .pnl_rollup import query_rollup
+from .graph_cache import get_cached_graph, cache_graph, log_graph_request
+from .entity_matcher import get_entity_matcher, ENTITY_COLUMNS
+
+# Set up logger
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+# Create console handler with higher level
+ch = logging.StreamHandler()
+ch.setLevel(logging.INFO)
+
+# Create formatter and add it to the handlers
+formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+ch.setFormatter(formatter)
+logger.addHandler(ch)
+
+# -----------------------------------------------------------------------------
+# Deterministic router for templated graph questions ("top 10 deals by
+# ltd_realized_value", "mtd realized value per trader as a pie chart"). These
+# are answered with one generated SQL query and no model round trips; anything
+# the router does not recognize falls through to the orchestrator agent.
+# -----------------------------------------------------------------------------
+
+PNL_TABLE = "entity_pnl_detail"
+HEADER_TABLE = "entity_trade_header"
+
+# Used when a graph of deals is requested without a metric (see orchestrator rule 22)
+DEFAULT_METRIC = "ltd_realized_value"
+
+# group_by dimension -> (table holding the column, label expression, label alias)
+DIMENSIONS = {
+    "trader": (HEADER_TABLE, "h.trader", "trader"),
+    "portfolio": (HEADER_TABLE, "h.internal_portfolio", "internal_portfolio"),
+    "month": (PNL_TABLE, "date_format(p.pnl_end_date, 'yyyy-MM')", "month"),
+    "deal": (PNL_TABLE, "p.deal_num", "deal_num"),
+}
+
+# The router only answers when every word of the prompt is understood; a filter it
+# cannot express ("for trader X", "in July", "excluding ...") must go to the agent.
+TEMPLATE_WORDS = {
+    "a", "an", "the", "of", "by", "per", "each", "every", "for", "me", "us", "as", "in", "on", "with", "and",
+    "show", "give", "provide", "plot", "graph", "chart", "draw", "generate", "create", "visualize", "visualise",
+    "display", "please", "can", "you", "top", "highest", "largest", "bar", "line", "pie", "deal", "deals",
+    "trader", "traders", "portfolio", "portfolios", "month", "monthly", "value", "values", "pnl",
+    # time windows are parsed by prompt_parser and pushed into the WHERE clause
+    "last", "during", "q1", "q2", "q3", "q4",
+} | {name.lower() for name in calendar.month_name if name}
+
+# Words that only name the kind of an entity filter ("for counterparty BP")
+ENTITY_KIND_WORDS = {
+    "trader": {"trader"},
+    "counterparty": {"counterparty"},
+}
+
+# Date the parsed time window is applied to
+WINDOW_DATE_COLUMN = "pnl_end_date"
+
+
+@dataclass
+class FastPathPlan:
+    dimension: str
+    metric: str
+    top_n: int
+    chart_type: str
+    sql: str
+    parameters: Optional[dict] = None
+    time_window: Optional[TimeWindow] = None
+    # Entity kind -> canonical name the rows are restricted to
+    entity_filters: Dict[str, str] = field(default_factory=dict)
+
+
+FAST_PATH_STATS = {
+    "requests": 0,
+    "fast_path_hits": 0,
+    "fallbacks": 0,
+    "errors": 0,
+    "total_latency_ms": 0.0,
+    "max_latency_ms": 0.0,
+}
+_stats_lock = threading.Lock()
+
+
+def _record(outcome: str, latency_ms: float = None):
+    with _stats_lock:
+        FAST_PATH_STATS["requests"] += 1
+        FAST_PATH_STATS[outcome] += 1
+        if latency_ms is not None:
+            FAST_PATH_STATS["total_latency_ms"] += latency_ms
+            FAST_PATH_STATS["max_latency_ms"] = max(FAST_PATH_STATS["max_latency_ms"], latency_ms)
+
+
+def get_fast_path_stats() -> dict:
+    with _stats_lock:
+        stats = dict(FAST_PATH_STATS)
+    hits = stats["fast_path_hits"]
+    stats["avg_latency_ms"] = round(stats["total_latency_ms"] / hits, 1) if hits else None
+    stats["hit_rate"] = round(hits / stats["requests"], 3) if stats["requests"] else None
+    return stats
+
+
+def _table(name: str) -> str:
+    return f"{DATABRICKS_CATALOG}.{DATABRICK_SCHEMA}.{name}"
+
+
+def current_header_sql(columns) -> str:
+    """Trade header rows at their latest version only, so an amended trade is joined once"""
+    return (
+        f"(SELECT deal_num, tran_num, {', '.join(columns)} FROM {_table(HEADER_TABLE)}\n"
+        f"    QUALIFY ROW_NUMBER() OVER (PARTITION BY deal_num, tran_num ORDER BY version_id DESC) = 1)"
+    )
+
+
+def _consumed_numbers(intent: PromptIntent) -> Counter:
+    """Numbers the plan actually uses: N of "top N" and the year of the time window"""
+    numbers = Counter()
+    if intent.top_n is not None:
+        numbers[intent.top_n] += 1
+    if intent.time_window is not None:
+        numbers[intent.time_window.start.year] += 1
+    return numbers
+
+
+def _has_unrecognized_terms(intent: PromptIntent, entity_filters: Dict[str, str]) -> bool:
+    known = set(TEMPLATE_WORDS)
+    if intent.metric:
+        known.add(intent.metric)
+        known.update(intent.metric.split("_"))
+    # Words of a resolved entity name are part of its filter, even if they are numbers
+    entity_words = set()
+    for kind, name in entity_filters.items():
+        known.update(ENTITY_KIND_WORDS[kind])
+        entity_words.update(name.lower().split())
+    # Any other number ("for deal 12345", "portfolio 42") is a filter the template cannot apply
+    numbers = _consumed_numbers(intent)
+    for word in intent.words:
+        if word in entity_words:
+            continue
+        if word.isdigit():
+            if numbers[int(word)] <= 0:
+                return True
+            numbers[int(word)] -= 1
+        elif word not in known:
+            return True
+    return False
+
+
+def _entity_filters(prompt: str) -> Dict[str, str]:
+    """
+    Trader/counterparty names the prompt filters on, resolved in one pass against the known
+    names. Only a name right after "for" or its kind word is a filter ("for BP", "trader John
+    Smith"); a name that happens to be an ordinary word elsewhere stays unrecognized.
+    """
+    lower = prompt.lower()
+    filters = {}
+    for kind, (name, start, _) in get_entity_matcher().mentions(prompt).items():
+        preceding = lower[:start].split()[-1:]
+        if preceding and preceding[0] in ENTITY_KIND_WORDS[kind] | {"for"}:
+            filters[kind] = name
+    return filters
+
+
+def _build_sql(dimension: str, metric: str, top_n: int, time_window: Optional[TimeWindow],
+               entity_filters: Optional[Dict[str, str]] = None) -> Tuple[str, Optional[dict]]:
+    table, label_expr, label_alias = DIMENSIONS[dimension]
+    entity_filters = entity_filters or {}
+    header_columns = [label_expr.split(".")[-1]] if table == HEADER_TABLE else []
+    header_columns += [ENTITY_COLUMNS[kind] for kind in entity_filters if ENTITY_COLUMNS[kind] not in header_columns]
+    join = ""
+    if header_columns:
+        join = f"\nJOIN {current_header_sql(header_columns)} h ON p.deal_num = h.deal_num AND p.tran_num = h.tran_num"
+    clauses = []
+    parameters = {}
+    if time_window is not None:
+        # Push the window down so the warehouse only scans the requested dates
+        clauses.append(f"p.{WINDOW_DATE_COLUMN} BETWEEN :window_start AND :window_end")
+        parameters.update(window_start=time_window.start, window_end=time_window.end)
+    for kind, name in entity_filters.items():
+        clauses.append(f"h.{ENTITY_COLUMNS[kind]} = :{kind}")
+        parameters[kind] = name
+    where = f"\nWHERE {' AND '.join(clauses)}" if clauses else ""
+    parameters = parameters or None
+    # Only whitelisted identifiers and a parsed integer are interpolated; values are bound parameters
+    sql = (
+        f"SELECT {label_expr} AS {label_alias}, SUM(p.{metric}) AS {metric}\n"
+        f"FROM {_table(PNL_TABLE)} p{join}{where}\n"
+        f"GROUP BY 1\n"
+        f"ORDER BY 2 DESC\n"
+        f"LIMIT {int(top_n)}"
+    )
+    return sql, parameters
+
+
+def plan(prompt: str) -> Optional[FastPathPlan]:
+    """Return a SQL plan if the graph prompt matches a known template, else None."""
+    intent = parse_prompt(prompt)
+    dimension = intent.group_by
+    if dimension is None:
+        return None
+
+    metric = intent.metric
+    if metric is None:
+        if dimension != "deal":
+            return None
+        metric = DEFAULT_METRIC
+
+    if intent.time_terms_unparsed:
+        # "in may", "in 2023 and 2024": a period the single WHERE window cannot express
+        return None
+
+    if intent.portfolio:
+        # "portfolio GAS_UK": the templates have no portfolio filter
+        return None
+
+    entity_filters = _entity_filters(prompt)
+    if intent.trader and "trader" not in entity_filters:
+        # "for trader Smyth": a name we do not know must not be dropped from the query
+        return None
+
+    if _has_unrecognized_terms(intent, entity_filters):
+        return None
+
+    table, label_expr, _ = DIMENSIONS[dimension]
+    header_schema = load_schema().get(HEADER_TABLE, [])
+    if dimension != "month" and label_expr.split(".")[-1] not in load_schema().get(table, []):
+        return None
+    if any(ENTITY_COLUMNS[kind] not in header_schema for kind in entity_filters):
+        return None
+
+    top_n = intent.top_n_or(10)
+    sql, parameters = _build_sql(dimension, metric, top_n, intent.time_window, entity_filters)
+    return FastPathPlan(
+        dimension=dimension,
+        metric=metric,
+        top_n=top_n,
+        chart_type=intent.chart_type,
+        sql=sql,
+        parameters=parameters,
+        time_window=intent.time_window,
+        entity_filters=entity_filters
+    )
+
+
+def execute_plan(fast_plan: FastPathPlan) -> dict:
+    """Run a plan against the local PnL rollup when it covers the request, else the warehouse"""
+    query_results = query_rollup(fast_plan.dimension, fast_plan.metric, fast_plan.top_n, fast_plan.time_window,
+                                 fast_plan.entity_filters)
+    if query_results is not None:
+        return query_results
+    return GraphService.execute_sql_query(fast_plan.sql, fast_plan.parameters)
+
+
+def try_fast_path(prompt: str) -> Optional[Dict[str, Any]]:
+    """
+    Answer a templated graph request without the agents.
+    Returns the same graph_data shape as the generate_graph_from_prompt tool, or None to fall back.
+    """
+    started = time.perf_counter()
+    try:
+        fast_plan = plan(prompt)
+    except Exception as e:
+        logger.warning(f"🚀Fast path planning failed, falling back to agent: {e}")
+        fast_plan = None
+    if fast_plan is None:
+        _record("fallbacks")
+        return None
+
+    logger.info(f"🚀Fast path: {fast_plan.dimension} by {fast_plan.metric} (top {fast_plan.top_n})")
+    log_graph_request(prompt, fast_plan.sql, fast_plan.parameters, source="fast_path")
+    graph = get_cached_graph(prompt)
+    if graph is None:
+        query_results = execute_plan(fast_plan)
+        if query_results.get("status") != "success":
+            logger.warning(f"🚀Fast path query failed, falling back to agent: {query_results.get('message')}")
+            _record("errors")
+            return None
+
+        graph = GraphService.generate_from_query_results(query_results, prompt)
+        if graph.get("status") != "success":
+            _record("errors")
+            return None
+        cache_graph(prompt, graph)
+
+    latency_ms = (time.perf_counter() - started) * 1000
+    _record("fast_path_hits", latency_ms)
+    logger.info(f"🚀Fast path answered in {latency_ms:.0f} ms")
+    return graph["graph"]
@@ -0,0 +1,195 @@
+# backend/app/few_shot_store.py
+import time
+import hashlib
+import threading
+import contextvars
+import logging
+from contextlib import closing
+from dataclasses import dataclass
+from typing import List, Optional
+from .config import (
+    FEW_SHOT_K,
+    FEW_SHOT_MIN_SCORE,
+    FEW_SHOT_MAX_EXAMPLES,
+    SIMILARITY_INDEX_FEATURES
+)
+from .similar_sql_cache import tokenize_request
+from .utility.local_db import get_connection
+from .utility.similarity_index import SimilarityIndex
+
+# Set up logger
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+# Create console handler with higher level
+ch = logging.StreamHandler()
+ch.setLevel(logging.INFO)
+
+# Create formatter and add it to the handlers
+formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+ch.setFormatter(formatter)
+logger.addHandler(ch)
+
+# -----------------------------------------------------------------------------
+# Store of verified prompt -> SQL pairs (the SQL ran and returned rows). Pairs are
+# persisted in the host-local state DB so every worker learns from all of them,
+# and indexed in-process so the most similar ones can be handed to the SQL agent
+# as worked examples. Outcome metrics compare zero-shot and few-shot generation.
+# -----------------------------------------------------------------------------
+
+# How often a worker picks up pairs recorded by the other workers
+SYNC_INTERVAL_SECONDS = 60
+# Longest SQL quoted in an example
+EXAMPLE_SQL_MAX_CHARS = 2000
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS sql_examples (
+    prompt_key TEXT PRIMARY KEY,
+    prompt     TEXT NOT NULL,
+    sql        TEXT NOT NULL,
+    row_count  INTEGER NOT NULL,
+    source     TEXT,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_sql_examples_updated ON sql_examples (updated_at);
+"""
+
+
+@dataclass
+class SqlRequest:
+    """A self-contained request being answered by an agent run, and the last SQL a tool ran for it"""
+    prompt: str
+    sql: Optional[str] = None
+    row_count: int = 0
+
+
+# Set for the duration of an agent run, so SQL run by a tool can be paired with the request
+current_sql_request: contextvars.ContextVar = contextvars.ContextVar("current_sql_request", default=None)
+
+_index = SimilarityIndex(
+    capacity=FEW_SHOT_MAX_EXAMPLES,
+    n_features=SIMILARITY_INDEX_FEATURES,
+    tokenize=tokenize_request
+)
+_sync_lock = threading.Lock()
+_sync_state = {"synced_at": 0.0, "high_water": 0.0}
+
+_stats_lock = threading.Lock()
+FEW_SHOT_STATS = {
+    "examples_recorded": 0,
+    "retrievals": 0,
+    "retrievals_with_examples": 0,
+    "examples_returned": 0,
+}
+# Generation source ("similar", "few_shot", "zero_shot") -> first-try outcomes and latency
+SQL_OUTCOME_STATS = {}
+
+
+def _connect():
+    return get_connection("few_shot_store", _SCHEMA)
+
+
+def _prompt_key(prompt: str) -> str:
+    return hashlib.sha256(" ".join(tokenize_request(prompt)).encode("utf-8")).hexdigest()
+
+
+def _sync():
+    """Load pairs written since the last sync (all of them, newest last, on first use)"""
+    if time.time() - _sync_state["synced_at"] < SYNC_INTERVAL_SECONDS:
+        return
+    with _sync_lock:
+        if time.time() - _sync_state["synced_at"] < SYNC_INTERVAL_SECONDS:
+            return
+        try:
+            with closing(_connect()) as conn:
+                rows = conn.execute(
+                    "SELECT prompt_key, prompt, sql, row_count, updated_at FROM sql_examples "
+                    "WHERE updated_at > ? ORDER BY updated_at DESC LIMIT ?",
+                    (_sync_state["high_water"], FEW_SHOT_MAX_EXAMPLES)
+                ).fetchall()
+        except Exception as e:
+            logger.warning(f"🚀few-shot store: sync failed: {e}")
+            rows = []
+        for row in reversed(rows):
+            _index.add(row["prompt_key"], row["prompt"], {"prompt": row["prompt"], "sql": row["sql"], "row_count": row["row_count"]})
+        if rows:
+            _sync_state["high_water"] = max(_sync_state["high_water"], rows[0]["updated_at"])
+            logger.info(f"🚀few-shot store: loaded {len(rows)} examples")
+        _sync_state["synced_at"] = time.time()
+
+
+def record_example(prompt: str, sql: str, row_count: int, source: str):
+    """Keep a prompt -> SQL pair that returned rows"""
+    if not prompt or not sql or not row_count:
+        return
+    key = _prompt_key(prompt)
+    now = time.time()
+    try:
+        with closing(_connect()) as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO sql_examples (prompt_key, prompt, sql, row_count, source, updated_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (key, prompt, sql, int(row_count), source, now)
+            )
+    except Exception as e:
+        logger.warning(f"🚀few-shot store: write failed: {e}")
+    _index.add(key, prompt, {"prompt": prompt, "sql": sql, "row_count": int(row_count)})
+    with _stats_lock:
+        FEW_SHOT_STATS["examples_recorded"] += 1
+
+
+def note_request_sql(sql: str, row_count: int):
+    """Remember SQL a tool ran successfully; the run's last one is its answer, earlier ones were exploration"""
+    request = current_sql_request.get()
+    if request is not None:
+        request.sql, request.row_count = sql, row_count
+
+
+def record_request_example(request: Optional[SqlRequest]):
+    """After a completed run, keep its final SQL as an example for the request"""
+    if request is not None and request.sql:
+        record_example(request.prompt, request.sql, request.row_count, source="agent_tool")
+
+
+def retrieve_examples(prompt: str, k: int = FEW_SHOT_K) -> List[dict]:
+    """Up to k verified pairs most similar to the prompt, best first"""
+    _sync()
+    matches = _index.search(prompt, k=k, min_score=FEW_SHOT_MIN_SCORE)
+    with _stats_lock:
+        FEW_SHOT_STATS["retrievals"] += 1
+        FEW_SHOT_STATS["retrievals_with_examples"] += 1 if matches else 0
+        FEW_SHOT_STATS["examples_returned"] += len(matches)
+    return [{**value, "score": round(score, 3)} for score, _, value in matches]
+
+
+def format_examples(examples: List[dict]) -> str:
+    blocks = [
+        f"Request: {example['prompt']}\nSQL:\n{example['sql'][:EXAMPLE_SQL_MAX_CHARS]}"
+        for example in examples
+    ]
+    return (
+        "Examples of requests similar to the next one, with SQL that ran successfully against this schema. "
+        "Follow their tables, joins and column usage where they apply:\n\n" + "\n\n".join(blocks)
+    )
+
+
+def record_sql_outcome(source: str, success: bool, elapsed_seconds: float):
+    """First-try outcome of one generated query, split by how it was generated"""
+    with _stats_lock:
+        stats = SQL_OUTCOME_STATS.setdefault(source, {"attempts": 0, "first_try_success": 0, "total_latency_ms": 0.0})
+        stats["attempts"] += 1
+        stats["first_try_success"] += 1 if success else 0
+        stats["total_latency_ms"] += elapsed_seconds * 1000
+
+
+def get_few_shot_stats() -> dict:
+    with _stats_lock:
+        stats = dict(FEW_SHOT_STATS)
+        outcomes = {source: dict(values) for source, values in SQL_OUTCOME_STATS.items()}
+    for values in outcomes.values():
+        attempts = values["attempts"]
+        values["first_try_success_rate"] = round(values["first_try_success"] / attempts, 3) if attempts else None
+        values["mean_latency_ms"] = round(values.pop("total_latency_ms") / attempts, 1) if attempts else None
+    stats["outcomes"] = outcomes
+    stats["index"] = _index.stats()
+    return stats
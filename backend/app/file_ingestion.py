@@ -0,0 +1,194 @@
+# backend/app/file_ingestion.py
+import time
+import contextvars
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterator, List, Optional
+from .config import (
+    FILE_CHUNK_TOKENS,
+    FILE_CHUNK_OVERLAP_TOKENS,
+    FILE_INGESTION_MAX_WORKERS
+)
+from .tool_dispatcher import inline_tool_calls
+from .token_budget import count_tokens, CHARS_PER_TOKEN
+
+# Set up logger
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+# Create console handler with higher level
+ch = logging.StreamHandler()
+ch.setLevel(logging.INFO)
+
+# Create formatter and add it to the handlers
+formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+ch.setFormatter(formatter)
+logger.addHandler(ch)
+
+# -----------------------------------------------------------------------------
+# Map-reduce analysis of large text: the content is cut into token-budgeted
+# chunks, each chunk is analysed concurrently by the insights agent, and the
+# partial structured insights are merged into one result.
+# -----------------------------------------------------------------------------
+
+ANALYSIS_PROMPT = """
+        Analyze the following text and provide key insights, summaries, and important findings.
+        Focus on identifying:
+        - Main topics and themes
+        - Key statistics or numerical data
+        - Important names, dates, or entities
+        - Any notable trends or patterns
+        {part_note}
+        Text to analyze:
+        {text}
+
+        Provide your analysis in a structured JSON format with these sections:
+        - summary (brief overall summary)
+        - key_points (bulleted list of main points)
+        - notable_data (any important numbers or metrics)
+        - entities (important people, organizations, or locations mentioned)
+        """
+
+_executor = ThreadPoolExecutor(max_workers=FILE_INGESTION_MAX_WORKERS, thread_name_prefix="file-chunk")
+
+
+def _iter_segments(text: str, max_chars: int) -> Iterator[str]:
+    """Lines of the text, with any line longer than a whole chunk cut into pieces"""
+    for line in text.splitlines(keepends=True):
+        for start in range(0, len(line), max_chars):
+            yield line[start:start + max_chars]
+
+
+def chunk_text(text: str, max_tokens: int = FILE_CHUNK_TOKENS, overlap_tokens: int = FILE_CHUNK_OVERLAP_TOKENS) -> List[str]:
+    """Split on line boundaries into chunks of at most max_tokens, repeating a short tail for context"""
+    # Sizes are counted with the same tokenizer as the rest of the request budget. A token is at
+    # least one character, so a segment cut to (max - overlap) characters always fits with a tail.
+    overlap_chars = overlap_tokens * CHARS_PER_TOKEN
+    chunks = []
+    current: List[str] = []
+    size = 0
+    for segment in _iter_segments(text, max(max_tokens - overlap_tokens, 1)):
+        segment_tokens = count_tokens(segment)
+        if size + segment_tokens > max_tokens and current:
+            chunk = "".join(current)
+            chunks.append(chunk)
+            tail = chunk[-overlap_chars:] if overlap_chars else ""
+            current, size = [tail], count_tokens(tail)
+        current.append(segment)
+        size += segment_tokens
+    if current and "".join(current).strip():
+        chunks.append("".join(current))
+    return chunks
+
+
+def _analyze_chunk(chunk: str, index: int, total: int) -> Optional[dict]:
+    from .tools import _get_insights_factory, _extract_structured_insights
+    part_note = f"\n        This is part {index + 1} of {total} of a larger document.\n" if total > 1 else ""
+    # Tools the insights agent calls run inline so this pool cannot starve the tool pool
+    with inline_tool_calls():
+        response = _get_insights_factory().process_request2(
+            prompt=ANALYSIS_PROMPT.format(part_note=part_note, text=chunk),
+            agent_mode="Detailed",  # Use detailed mode for comprehensive analysis
+            new_thread=True
+        )
+    if response.is_error:
+        logger.error(f"🚀Chunk {index + 1}/{total} analysis failed: {response.response}")
+        return None
+    return {
+        "agent_response": response.response,
+        "structured_analysis": _extract_structured_insights(response.response)
+    }
+
+
+def _as_list(value) -> list:
+    if value is None:
+        return []
+    if isinstance(value, list):
+        return value
+    if isinstance(value, dict):
+        return [{k: v} for k, v in value.items()]
+    return [value]
+
+
+def _dedupe(items: list) -> list:
+    seen = set()
+    merged = []
+    for item in items:
+        marker = repr(item).strip().lower()
+        if marker not in seen:
+            seen.add(marker)
+            merged.append(item)
+    return merged
+
+
+def merge_insights(partials: List[dict]) -> dict:
+    """Reduce step: combine the per-chunk structured insights, in document order"""
+    structured = [p["structured_analysis"] for p in partials if isinstance(p.get("structured_analysis"), dict)]
+    summaries = [s.get("summary") for s in structured if s.get("summary")]
+    return {
+        "summary": " ".join(str(s) for s in summaries),
+        "key_points": _dedupe([item for s in structured for item in _as_list(s.get("key_points"))]),
+        "notable_data": _dedupe([item for s in structured for item in _as_list(s.get("notable_data"))]),
+        "entities": _dedupe([item for s in structured for item in _as_list(s.get("entities"))]),
+        "source": "chunked_agent_analysis",
+        "chunks": len(partials)
+    }
+
+
+def analyze_text(text: str) -> dict:
+    """
+    Insights for text of any size. Small text is a single agent call; larger text is
+    chunked and the chunks are analysed concurrently, so latency follows the pool size.
+    """
+    started = time.perf_counter()
+    chunks = chunk_text(text)
+    if len(chunks) <= 1:
+        result = _analyze_chunk(text, 0, 1)
+        if result is None:
+            return {"status": "error", "message": "Failed to analyze text"}
+        return {"status": "success", "insights": result}
+
+    logger.info(f"🚀Analysing {len(chunks)} chunks with {FILE_INGESTION_MAX_WORKERS} workers")
+    # Each chunk carries the caller's context, so a cancelled request stops its chunk runs too
+    futures = [
+        _executor.submit(contextvars.copy_context().run, _analyze_chunk, chunk, idx, len(chunks))
+        for idx, chunk in enumerate(chunks)
+    ]
+    partials = []
+    failed = 0
+    for future in futures:
+        try:
+            result = future.result()
+        except Exception as e:
+            logger.error(f"🚀Chunk analysis raised: {e}")
+            result = None
+        if result is None:
+            failed += 1
+        else:
+            partials.append(result)
+
+    if not partials:
+        return {"status": "error", "message": "Failed to analyze text"}
+
+    merged = merge_insights(partials)
+    merged["failed_chunks"] = failed
+    logger.info(f"🚀Chunked analysis finished in {time.perf_counter() - started:.1f}s ({failed} chunks failed)")
+    return {
+        "status": "success",
+        "insights": {
+            "agent_response": merged["summary"],
+            "structured_analysis": merged
+        }
+    }
+
+
+def render_insights(insights: dict) -> str:
+    """Compact text form of merged insights, for use in place of the raw file in a prompt"""
+    analysis = insights.get("structured_analysis", {})
+    lines = [f"Summary: {analysis.get('summary') or insights.get('agent_response', '')}"]
+    for section in ("key_points", "notable_data", "entities"):
+        items = _as_list(analysis.get(section))
+        if items:
+            lines.append(f"{section.replace('_', ' ').title()}:")
+            lines.extend(f"- {item}" for item in items)
+    return "\n".join(lines)
@@ -0,0 +1,229 @@
+# backend/app/graph_cache.py
+import re
+import json
+import time
+import hashlib
+import logging
+from contextlib import closing
+from datetime import date
+from typing import List, Optional
+from .config import GRAPH_CACHE_TTL_MINUTES, GRAPH_CACHE_MAX_ENTRIES
+from .prompt_parser import parse_prompt
+from .pnl_rollup import get_data_version
+from .utility.local_db import get_connection
+from .utility.ttl_cache import TTLCache
+from .utility import metrics
+
+# Set up logger
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+# Create console handler with higher level
+ch = logging.StreamHandler()
+ch.setLevel(logging.INFO)
+
+# Create formatter and add it to the handlers
+formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+ch.setFormatter(formatter)
+logger.addHandler(ch)
+
+# -----------------------------------------------------------------------------
+# Two-tier cache for graph results and the query results behind them: a per-worker
+# TTL LRU in front of a table in the host-local state DB, so entries pre-warmed by
+# one worker are served by all of them. Keys carry the PnL data version, so when
+# the leader loads new data every worker stops serving the old entries. Also
+# keeps the per-day request counts that tell the pre-warm job which prompts are
+# popular.
+# -----------------------------------------------------------------------------
+
+GRAPH_CACHE_TTL_SECONDS = GRAPH_CACHE_TTL_MINUTES * 60
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS graph_cache (
+    key        TEXT PRIMARY KEY,
+    kind       TEXT NOT NULL,
+    value      TEXT NOT NULL,
+    expires_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS graph_request_counts (
+    prompt_key TEXT NOT NULL,
+    day        TEXT NOT NULL,
+    hits       INTEGER NOT NULL,
+    PRIMARY KEY (prompt_key, day)
+);
+CREATE TABLE IF NOT EXISTS graph_queries (
+    prompt_key TEXT PRIMARY KEY,
+    prompt     TEXT NOT NULL,
+    sql        TEXT,
+    parameters TEXT,
+    source     TEXT,
+    updated_at REAL NOT NULL
+);
+"""
+
+WHITESPACE_PATTERN = re.compile(r"\s+")
+
+_memory = TTLCache(maxsize=GRAPH_CACHE_MAX_ENTRIES, ttl_seconds=GRAPH_CACHE_TTL_SECONDS)
+
+GRAPH_CACHE_STATS = {
+    "memory_hits": 0,
+    "local_db_hits": 0,
+    "misses": 0,
+    "writes": 0,
+}
+
+
+def _connect():
+    return get_connection("graph_cache", _SCHEMA)
+
+
+def normalize_prompt(prompt: str) -> str:
+    return WHITESPACE_PATTERN.sub(" ", (prompt or "").strip().lower())
+
+
+def prompt_key(prompt: str) -> str:
+    normalized = normalize_prompt(prompt)
+    # Relative windows ("last month") resolve differently tomorrow, so scope those keys to today
+    intent = parse_prompt(prompt)
+    if intent.time_window is not None or intent.time_terms_unparsed:
+        normalized = f"{normalized}|{date.today().isoformat()}"
+    return hashlib.sha256(normalized.encode("utf-8")).hexdigest()
+
+
+def _log_key(prompt: str) -> str:
+    # Popularity is counted across days, unlike the cache keys
+    return hashlib.sha256(normalize_prompt(prompt).encode("utf-8")).hexdigest()
+
+
+def sql_key(sql: str, parameters: Optional[dict] = None) -> str:
+    payload = json.dumps([WHITESPACE_PATTERN.sub(" ", sql.strip()), parameters], sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def _cache_key(kind: str, key: str) -> str:
+    # Entries from before the last data load stop matching on every worker, not just the leader
+    return f"{kind}:{get_data_version()}:{key}"
+
+
+def _get(kind: str, key: str) -> Optional[dict]:
+    cache_key = _cache_key(kind, key)
+    value = _memory.get(cache_key)
+    if value is not None:
+        GRAPH_CACHE_STATS["memory_hits"] += 1
+        metrics.inc("cache_lookups_total", cache=kind, result="memory_hit")
+        return value
+    try:
+        with closing(_connect()) as conn:
+            row = conn.execute(
+                "SELECT value, expires_at FROM graph_cache WHERE key = ? AND expires_at > ?",
+                (cache_key, time.time())
+            ).fetchone()
+    except Exception as e:
+        logger.warning(f"🚀graph cache: local db read failed: {e}")
+        row = None
+    if row is None:
+        GRAPH_CACHE_STATS["misses"] += 1
+        metrics.inc("cache_lookups_total", cache=kind, result="miss")
+        return None
+    value = json.loads(row["value"])
+    _memory.set(cache_key, value, ttl_seconds=row["expires_at"] - time.time())
+    GRAPH_CACHE_STATS["local_db_hits"] += 1
+    metrics.inc("cache_lookups_total", cache=kind, result="local_db_hit")
+    return value
+
+
+def _put(kind: str, key: str, value: dict):
+    cache_key = _cache_key(kind, key)
+    _memory.set(cache_key, value)
+    GRAPH_CACHE_STATS["writes"] += 1
+    try:
+        with closing(_connect()) as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO graph_cache (key, kind, value, expires_at) VALUES (?, ?, ?, ?)",
+                (cache_key, kind, json.dumps(value, default=str), time.time() + GRAPH_CACHE_TTL_SECONDS)
+            )
+    except Exception as e:
+        logger.warning(f"🚀graph cache: local db write failed: {e}")
+
+
+def get_cached_graph(prompt: str) -> Optional[dict]:
+    """Successful generate_from_prompt result for this prompt, if cached"""
+    return _get("graph", prompt_key(prompt))
+
+
+def cache_graph(prompt: str, graph_result: dict):
+    if graph_result.get("status") == "success":
+        _put("graph", prompt_key(prompt), graph_result)
+
+
+def get_cached_query_result(sql: str, parameters: Optional[dict] = None) -> Optional[dict]:
+    return _get("query", sql_key(sql, parameters))
+
+
+def cache_query_result(sql: str, parameters: Optional[dict], query_results: dict):
+    if query_results.get("status") == "success":
+        _put("query", sql_key(sql, parameters), query_results)
+
+
+def purge_expired():
+    with closing(_connect()) as conn:
+        conn.execute("DELETE FROM graph_cache WHERE expires_at <= ?", (time.time(),))
+
+
+def invalidate_graph_cache():
+    """Drop every cached result, e.g. after new data was loaded (other workers miss via the data version)"""
+    _memory.clear()
+    with closing(_connect()) as conn:
+        conn.execute("DELETE FROM graph_cache")
+
+
+# -----------------------------------------------------------------------------
+# Request counts
+# -----------------------------------------------------------------------------
+
+def log_graph_request(prompt: str, sql: Optional[str] = None, parameters: Optional[dict] = None, source: str = None):
+    """Count a graph request; when the SQL behind it is known, remember it for pre-warming"""
+    key = _log_key(prompt)
+    try:
+        with closing(_connect()) as conn:
+            # One row per prompt and day, however often it is asked (cache hits included)
+            conn.execute(
+                "INSERT INTO graph_request_counts (prompt_key, day, hits) VALUES (?, ?, 1) "
+                "ON CONFLICT (prompt_key, day) DO UPDATE SET hits = hits + 1",
+                (key, date.today().isoformat())
+            )
+            if sql:
+                conn.execute(
+                    "INSERT OR REPLACE INTO graph_queries (prompt_key, prompt, sql, parameters, source, updated_at) "
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    (key, prompt, sql, json.dumps(parameters, default=str) if parameters else None, source, time.time())
+                )
+    except Exception as e:
+        logger.warning(f"🚀graph cache: request log write failed: {e}")
+
+
+def top_prompts(limit: int, lookback_days: float) -> List[dict]:
+    """Most requested graph prompts over the lookback window, with the SQL last used for each"""
+    since = date.fromtimestamp(time.time() - lookback_days * 86400).isoformat()
+    with closing(_connect()) as conn:
+        conn.execute("DELETE FROM graph_request_counts WHERE day < ?", (since,))
+        rows = conn.execute(
+            """
+            SELECT q.prompt, q.sql, q.parameters, q.source, q.updated_at, SUM(c.hits) AS hits
+            FROM graph_request_counts c
+            JOIN graph_queries q ON q.prompt_key = c.prompt_key
+            WHERE c.day >= ?
+            GROUP BY c.prompt_key
+            ORDER BY hits DESC
+            LIMIT ?
+            """,
+            (since, int(limit))
+        ).fetchall()
+    return [
+        {**dict(row), "parameters": json.loads(row["parameters"]) if row["parameters"] else None}
+        for row in rows
+    ]
+
+
+def get_graph_cache_stats() -> dict:
+    return {**GRAPH_CACHE_STATS, "memory": _memory.stats()}
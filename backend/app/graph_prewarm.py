@@ -0,0 +1,92 @@
+# backend/app/graph_prewarm.py
+import time
+import logging
+from datetime import date, datetime
+from .config import PREWARM_TOP_K, PREWARM_LOOKBACK_DAYS, PREWARM_INTERVAL_MINUTES
+from .graph_service import GraphService
+from .prompt_parser import parse_prompt
+from .fast_path_router import plan, execute_plan
+from .graph_cache import top_prompts, cache_graph, cache_query_result, purge_expired
+from .utility.worker_coordination import run_if_leader
+
+# Set up logger
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+# Create console handler with higher level
+ch = logging.StreamHandler()
+ch.setLevel(logging.INFO)
+
+# Create formatter and add it to the handlers
+formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+ch.setFormatter(formatter)
+logger.addHandler(ch)
+
+PREWARM_LEASE_NAME = "graph_prewarm"
+PREWARM_LEASE_TTL_SECONDS = PREWARM_INTERVAL_MINUTES * 60 * 1.5
+
+# Outcome of the last pre-warm run, served by /stats/graph-cache
+PREWARM_STATE = {
+    "last_run": None,
+    "seconds": None,
+    "warmed": 0,
+    "skipped": 0,
+    "failed": 0
+}
+
+
+def _warm_one(entry: dict) -> str:
+    prompt = entry["prompt"]
+    fast_plan = plan(prompt)
+    if fast_plan is not None:
+        # Templated prompts are re-planned, so relative windows resolve against today
+        sql, parameters = fast_plan.sql, fast_plan.parameters
+        query_results = execute_plan(fast_plan)
+    elif entry.get("sql"):
+        logged_today = date.fromtimestamp(entry["updated_at"]) == date.today()
+        if parse_prompt(prompt).time_window is not None and not logged_today:
+            # Model-written SQL has its dates baked in; let the next real request regenerate it
+            return "skipped"
+        sql, parameters = entry["sql"], entry.get("parameters")
+        query_results = GraphService.execute_sql_query(sql, parameters)
+    else:
+        return "skipped"
+
+    if query_results.get("status") != "success":
+        return "failed"
+    cache_query_result(sql, parameters, query_results)
+    graph = GraphService.generate_from_query_results(query_results, prompt)
+    if graph.get("status") != "success":
+        return "failed"
+    cache_graph(prompt, graph)
+    return "warmed"
+
+
+def prewarm_popular_graphs(limit: int = PREWARM_TOP_K) -> dict:
+    """Re-run the most requested graph prompts and refill the result and graph caches"""
+    started = time.perf_counter()
+    purge_expired()
+    entries = top_prompts(limit, PREWARM_LOOKBACK_DAYS)
+    logger.info(f"🚀Pre-warming {len(entries)} popular graph prompts")
+
+    outcomes = {"warmed": 0, "skipped": 0, "failed": 0}
+    for entry in entries:
+        try:
+            outcomes[_warm_one(entry)] += 1
+        except Exception as e:
+            logger.warning(f"🚀Pre-warm failed for '{entry['prompt'][:80]}': {e}")
+            outcomes["failed"] += 1
+
+    PREWARM_STATE.update(outcomes)
+    PREWARM_STATE["last_run"] = datetime.now().isoformat()
+    PREWARM_STATE["seconds"] = round(time.perf_counter() - started, 2)
+    logger.info(f"🚀Pre-warm finished: {outcomes} in {PREWARM_STATE['seconds']}s")
+    return outcomes
+
+
+def run_prewarm_as_leader():
+    """Scheduled job: one worker pre-warms; the shared cache tier serves the rest"""
+    try:
+        run_if_leader(PREWARM_LEASE_NAME, PREWARM_LEASE_TTL_SECONDS, prewarm_popular_graphs)
+    except Exception as e:
+        logger.error(f"🚀Graph pre-warm job failed: {e}")
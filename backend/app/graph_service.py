@@ -5,6 +5,7 @@ import pandas as pd
 from datetime import datetime, date
 from typing import List, Optional, Dict, Any
 from databricks import sql
+import time
 import traceback
 import logging
 from .config import (
@@ -13,6 +14,21 @@ from .config import (
     DATABRICKS_HTTP_PATH
 )
 from .schema_utils import load_schema
+from .databricks_pool import get_pool
+from .prompt_parser import parse_prompt
+from .graph_cache import (
+    get_cached_graph,
+    cache_graph,
+    get_cached_query_result,
+    cache_query_result,
+    log_graph_request,
+    sql_key
+)
+from .few_shot_store import record_sql_outcome
+from .utility.single_flight import get_single_flight
+from .utility.cancellation import OperationCancelled, current_token, is_cancelled
+from .utility.resilience import CircuitOpenError, databricks_call
+from .utility.metrics import span
 
 # Set up logger
 logger = logging.getLogger(__name__)
@@ -27,33 +43,28 @@ formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(messag
 ch.setFormatter(formatter)
 logger.addHandler(ch)
 
+_sql_execution_flight = get_single_flight("sql_execution")
+
 class GraphService:
     @staticmethod
     def infer_chart_type(prompt: str) -> str:
-        logger.info(f"🚀Inferring chart type from prompt: {prompt[:100]}...")
-        if "line" in prompt.lower():
-            logger.info("🚀Chart type inferred as: line")
-            return "line"
-        elif "pie" in prompt.lower():
-            logger.info("🚀Chart type inferred as: pie")
-            return "pie"
-        else: 
-            logger.info("🚀Chart type inferred as: bar (default)")
-            return "bar"
+        chart_type = parse_prompt(prompt).chart_type
+        logger.info(f"🚀Chart type inferred as: {chart_type}")
+        return chart_type
 
     @staticmethod
     def infer_top_n(prompt: str, default: int = 10) -> int:
-        logger.info(f"🚀Checking for top N value in prompt: {prompt[:100]}...")
-        match = re.search(r"top\s+(\d+)", prompt.lower())
-        if match:
-            top_n = int(match.group(1))
-            logger.info(f"🚀 Found top_n value: {top_n}")
-            return top_n
-        logger.info(f"🚀 Using default top_n value: {default}")
-        return default
+        top_n = parse_prompt(prompt).top_n_or(default)
+        logger.info(f"🚀 Using top_n value: {top_n}")
+        return top_n
 
     @staticmethod
     def generate_from_query_results(query_results: dict, prompt: str) -> dict:
+        with span("graph.dataframe"):
+            return GraphService._graph_from_query_results(query_results, prompt)
+
+    @staticmethod
+    def _graph_from_query_results(query_results: dict, prompt: str) -> dict:
         logger.info("Starting graph generation from query results")
         if not query_results.get('data'):
             logger.error("🚀 No data available in query results for graph generation")
@@ -119,27 +130,65 @@ class GraphService:
                 "traceback": traceback.format_exc()
             }
 
-    def execute_sql_query(sql_query: str) -> dict:
+    def execute_sql_query(sql_query: str, parameters: Optional[dict] = None) -> dict:
+        # Concurrent identical queries share one warehouse execution
+        return _sql_execution_flight.do(
+            sql_key(sql_query, parameters), GraphService._execute_sql_query, sql_query, parameters
+        )
+
+    def _execute_sql_query(sql_query: str, parameters: Optional[dict] = None) -> dict:
         logger.info(f"🚀Executing SQL query: {sql_query[:100]}...")
         try:
-            with sql.connect(
-                server_hostname=DATABRICKS_SERVER_HOSTNAME,
-                http_path=DATABRICKS_HTTP_PATH,
-                access_token=DATABRICKS_ACCESS_TOKEN
-            ) as conn:
+            # Dropped connections and warehouse hiccups are retried with backoff; query errors are not
+            return databricks_call(GraphService._run_query, sql_query, parameters)
+        except OperationCancelled:
+            logger.info("🚀SQL query cancelled")
+            raise
+        except CircuitOpenError as e:
+            logger.error(f"🚀 SQL query not sent: {str(e)}")
+            return {
+                "status": "error",
+                "message": str(e),
+                "query": sql_query,
+                "error_type": "CircuitOpen",
+                "retry_after": e.retry_after
+            }
+        except Exception as e:
+            logger.error(f"🚀 SQL query execution failed: {str(e)}")
+            logger.error(traceback.format_exc())
+            return {
+                "status": "error",
+                "message": str(e),
+                "query": sql_query,
+                "error_type": type(e).__name__
+            }
+
+    def _run_query(sql_query: str, parameters: Optional[dict] = None) -> dict:
+        try:
+            with get_pool().connection() as conn:
                 with conn.cursor() as cursor:
                     logger.info("🚀Connected to Databricks, executing query")
-                    cursor.execute(sql_query)
-                    columns = [desc[0] for desc in cursor.description]
-                    data = []
-                    for row in cursor.fetchall():
-                        row_dict = {}
-                        for idx, col in enumerate(columns):
-                            if isinstance(row[idx], (datetime, date)):
-                                row_dict[col] = row[idx].isoformat()
-                            else:
-                                row_dict[col] = row[idx]
-                        data.append(row_dict)
+                    token = current_token()
+                    with span("databricks.execute"):
+                        if token is None:
+                            cursor.execute(sql_query, parameters)
+                        else:
+                            token.raise_if_cancelled()
+                            # Closing the tab or passing the deadline stops the statement on the warehouse
+                            with token.on_cancel(cursor.cancel):
+                                cursor.execute(sql_query, parameters)
+                            token.raise_if_cancelled()
+                    with span("databricks.fetch"):
+                        columns = [desc[0] for desc in cursor.description]
+                        data = []
+                        for row in cursor.fetchall():
+                            row_dict = {}
+                            for idx, col in enumerate(columns):
+                                if isinstance(row[idx], (datetime, date)):
+                                    row_dict[col] = row[idx].isoformat()
+                                else:
+                                    row_dict[col] = row[idx]
+                            data.append(row_dict)
                     
                     logger.info(f"🚀Query executed successfully. Returned {len(data)} rows")
                     return {
@@ -149,15 +198,13 @@ class GraphService:
                         "query": sql_query,
                         "row_count": len(data)
                     }
-        except Exception as e:
-            logger.error(f"🚀 SQL query execution failed: {str(e)}")
-            logger.error(traceback.format_exc())
-            return {
-                "status": "error",
-                "message": str(e),
-                "query": sql_query,
-                "error_type": type(e).__name__
-            }
+        except OperationCancelled:
+            raise
+        except Exception:
+            if is_cancelled():
+                # The cancelled statement surfaces as a driver error; it is not a warehouse failure
+                raise OperationCancelled(current_token().reason)
+            raise
 
 
     @staticmethod  
@@ -200,29 +247,69 @@ class GraphService:
             if embedded_data_result:
                   return embedded_data_result
                   
+            cached_graph = get_cached_graph(prompt)
+            if cached_graph is not None:
+                  logger.info("🚀Serving graph from cache")
+                  log_graph_request(prompt)
+                  return cached_graph
+
+            # Templated requests skip SQL generation and may be served by the local PnL rollup
+            from .fast_path_router import plan, execute_plan
+            fast_plan = plan(prompt)
+            if fast_plan is not None:
+                  query_results = execute_plan(fast_plan)
+                  if query_results.get("status") == "success":
+                        logger.info(f"🚀Answered templated request from {query_results.get('source', 'warehouse')}")
+                        log_graph_request(prompt, fast_plan.sql, fast_plan.parameters, source="fast_path")
+                        graph_result = GraphService.generate_from_query_results(query_results, prompt)
+                        cache_graph(prompt, graph_result)
+                        return graph_result
+
             # If no embedded data, generate SQL and execute
-            from .agsqlquerygenerator import AGSQLQueryGenerator
+            from .agsqlquerygenerator import get_sql_query_generator
             logger.info("Generating SQL from prompt")
             
-            sql_generator = AGSQLQueryGenerator()
+            sql_generator = get_sql_query_generator()
+            time_window = parse_prompt(prompt).time_window
+            window_rule = ""
+            if time_window is not None:
+                  # Push the date restriction into the warehouse instead of filtering fetched rows
+                  window_rule = (
+                        f"3. Restrict rows in the WHERE clause to dates between '{time_window.start.isoformat()}' "
+                        f"and '{time_window.end.isoformat()}' inclusive ({time_window.label}), "
+                        "using the date column relevant to the request (e.g. pnl_end_date)\n"
+                  )
             enhanced_prompt = (
                   "Generate a Databricks SQL query to fetch data for visualization. "
                   "The query should return exactly two columns: "
                   "1. First column: labels/categories (e.g., deal numbers, dates)"
-                  "2. Second column: numeric values to visualize\n\n"
+                  "2. Second column: numeric values to visualize\n"
+                  f"{window_rule}\n"
                   f"Original request: {prompt}"
             )
             
-            sql_query = sql_generator.invoke(enhanced_prompt)
-            logger.info(f"🚀Generated SQL: {sql_query}")
+            started = time.perf_counter()
+            sql_query = sql_generator.invoke(enhanced_prompt, request_text=prompt)
+            generation_source = sql_generator.last_generation_source()
+            logger.info(f"🚀Generated SQL ({generation_source}): {sql_query}")
             
             if not sql_query.lstrip().upper().startswith(("SELECT", "WITH")):
+                  record_sql_outcome(generation_source, False, time.perf_counter() - started)
                   raise ValueError("Generated query is not valid SQL")
                   
             # Execute and process results
             logger.info("Executing SQL query")
-            query_results = GraphService.execute_sql_query(sql_query)
+            log_graph_request(prompt, sql_query, source="sql_agent")
+            query_results = get_cached_query_result(sql_query)
+            if query_results is None:
+                  query_results = GraphService.execute_sql_query(sql_query)
+                  cache_query_result(sql_query, None, query_results)
             
+            record_sql_outcome(
+                  generation_source,
+                  query_results.get("status") == "success" and query_results.get("row_count", 0) > 0,
+                  time.perf_counter() - started
+            )
             if query_results.get("status") != "success":
                   logger.error("SQL execution failed")
                   return {
@@ -232,8 +319,15 @@ class GraphService:
                   "available_columns": query_results.get("columns", [])
                   }
 
-            return GraphService.generate_from_query_results(query_results, prompt)
+            if query_results.get("row_count", 0) > 0:
+                  sql_generator.remember(prompt, sql_query, query_results["row_count"])
+
+            graph_result = GraphService.generate_from_query_results(query_results, prompt)
+            cache_graph(prompt, graph_result)
+            return graph_result
             
+      except OperationCancelled:
+            raise
       except Exception as e:
             logger.error(f"🚀 Critical error in generate_from_prompt: {str(e)}")
             return {
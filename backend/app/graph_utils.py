@@ -1,7 +1,7 @@
 #graph_utils.py
+import numpy as np
 import pandas as pd
-import re
-from datetime import datetime, timedelta
+from datetime import timedelta
 from . import config
 import logging
 from .config import (
@@ -10,6 +10,8 @@ from .config import (
     DATABRICKS_HTTP_PATH
 )
 from .schema_utils import load_schema
+from .prompt_parser import parse_prompt
+from .entity_matcher import get_entity_matcher, build_automaton
 
 # Set up logger
 logger = logging.getLogger(__name__)
@@ -35,79 +37,93 @@ def infer_y_axis_column(prompt: str, df: pd.DataFrame) -> str:
 
 def infer_chart_type(prompt: str) -> str:
     logger.info("🚀 infer_chart_type")
-    if "line" in prompt.lower():
-        return "line"
-    elif "pie" in prompt.lower():
-        return "pie"
-    else: 
-        return "bar"
+    return parse_prompt(prompt).chart_type
     
 
 def infer_top_n(prompt: str, default: int = 10) -> int:
     logger.info("🚀 infer_top_n")
-    match = re.search(r"top\s+(\d+)", prompt.lower())
-    if match:
-        return int(match.group(1))
-    return default
+    return parse_prompt(prompt).top_n_or(default)
+
+ENTITY_FILTER_COLUMNS = {"trader": "trader", "counterparty": "counterparty"}
+
+def normalize_entity_columns(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Return a copy of df with lower-cased categorical copies of the entity columns (e.g. trader_norm).
+    Done once per DataFrame; later filters compare small integer codes instead of strings.
+    """
+    norm_columns = {
+        f"{column}_norm": df[column].str.lower().astype("category")
+        for column in ENTITY_FILTER_COLUMNS.values()
+        if column in df.columns and f"{column}_norm" not in df.columns
+    }
+    # assign() leaves the caller's frame untouched
+    return df.assign(**norm_columns) if norm_columns else df
+
+def _filter_by_entity(df: pd.DataFrame, column: str, name: str) -> pd.DataFrame:
+    norm = df[f"{column}_norm"]
+    code = norm.cat.categories.get_indexer([name.lower()])[0]
+    if code == -1:
+        return df.iloc[0:0]
+    return df[norm.cat.codes.to_numpy() == code]
 
 def apply_prompt_filters(df: pd.DataFrame, prompt: str) -> pd.DataFrame:
     logger.info("🚀 apply_prompt_filters")
 
-    prompt_lower = prompt.lower()
-
-    # Filter by trader
-    for trader in df['trader'].dropna().unique():
-        if trader.lower() in prompt_lower:
-            df = df[df['trader'].str.lower() == trader.lower()]
-            break
-
-    # Filter by counterparty
-    for cp in df['counterparty'].dropna().unique():
-        if cp.lower() in prompt_lower:
-            df = df[df['counterparty'].str.lower() == cp.lower()]
-            break
-
-    # Filter by month/year
-    if "july" in prompt_lower:
-        df = df[df['latest_trade_date'].dt.month == 7]
-    elif "2025" in prompt_lower:
-        df = df[df['latest_trade_date'].dt.year == 2025]
-
+    original_columns = list(df.columns)
+    df = normalize_entity_columns(df)
+
+    # Resolve trader/counterparty mentions in one pass over the prompt
+    matcher = get_entity_matcher()
+    if matcher.is_loaded:
+        mentions = matcher.match(prompt)
+    else:
+        # Known names load at warm-up; until then use this frame's values
+        automaton = build_automaton({
+            kind: df[column].dropna().unique()
+            for kind, column in ENTITY_FILTER_COLUMNS.items() if column in df.columns
+        })
+        mentions = matcher.match(prompt, automaton)
+
+    for kind, name in mentions.items():
+        column = ENTITY_FILTER_COLUMNS[kind]
+        if column in df.columns:
+            df = _filter_by_entity(df, column, name)
+
+    # Filter by month/quarter/year; the *_norm helper columns are not part of the result
+    return apply_time_filter(df[original_columns], prompt)
+
+TRADE_DATE_COLUMN = 'latest_trade_date'
+
+def index_by_trade_date(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Return df ordered by latest_trade_date (NaT last) so time windows can be cut by binary search.
+    Sorting happens at most once per frame; already-indexed frames are returned untouched.
+    """
+    if df.attrs.get('sorted_by') == TRADE_DATE_COLUMN:
+        return df
+    if not pd.api.types.is_datetime64_any_dtype(df[TRADE_DATE_COLUMN]):
+        # execute_sql_query returns dates as ISO strings
+        df = df.assign(**{TRADE_DATE_COLUMN: pd.to_datetime(df[TRADE_DATE_COLUMN], errors='coerce')})
+    if not df[TRADE_DATE_COLUMN].is_monotonic_increasing:
+        df = df.sort_values(TRADE_DATE_COLUMN, kind='mergesort', na_position='last')
+    df.attrs['sorted_by'] = TRADE_DATE_COLUMN
     return df
 
-# Parse common natural language time filters from the prompt
+# Restrict rows to the time window parsed from the prompt (last month, named month, Qn, year)
 def apply_time_filter(df, prompt):
     logger.info("🚀 apply_time_filter")
-    now = datetime.now()
 
-    # Ensure latest_trade_date is datetime
-    if 'latest_trade_date' not in df.columns:
+    if TRADE_DATE_COLUMN not in df.columns:
         return df
 
-    df = df.copy()
-
-    # Filter for "last month"
-    if re.search(r'\blast month\b', prompt, re.IGNORECASE):
-        first_day_of_current_month = now.replace(day=1)
-        last_month_end = first_day_of_current_month - timedelta(days=1)
-        last_month_start = last_month_end.replace(day=1)
-        return df[(df['latest_trade_date'] >= last_month_start) & (df['latest_trade_date'] <= last_month_end)]
-
-    # Filter for specific month like "July"
-    match = re.search(r'\b(January|February|March|April|May|June|July|August|September|October|November|December)\b', prompt, re.IGNORECASE)
-    if match:
-        month_str = match.group(1)
-        month_number = datetime.strptime(month_str, "%B").month
-        return df[df['latest_trade_date'].dt.month == month_number]
-
-    # Filter for "Q1", "Q2", "Q3", "Q4"
-    match = re.search(r'\bQ([1-4])\b', prompt, re.IGNORECASE)
-    if match:
-        quarter = int(match.group(1))
-        start_month = 3 * (quarter - 1) + 1
-        end_month = start_month + 2
-        return df[df['latest_trade_date'].dt.month.isin(range(start_month, end_month + 1))]
-
-    # Default: no filter
-    return df
+    window = parse_prompt(prompt).time_window
+    if window is None:
+        # Default: no filter
+        return df
 
+    df = index_by_trade_date(df)
+    dates = df[TRADE_DATE_COLUMN].to_numpy()
+    start = dates.searchsorted(np.datetime64(window.start), side='left')
+    end = dates.searchsorted(np.datetime64(window.end + timedelta(days=1)), side='left')
+    # Positional slice of the sorted frame: no boolean masks, no copy
+    return df.iloc[start:end]
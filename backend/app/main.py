@@ -1,14 +1,49 @@
 # backend/app/main.py
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Request, Response
+from fastapi.responses import JSONResponse, StreamingResponse, PlainTextResponse
 from pydantic import BaseModel
 from typing import List, Optional, Dict, Any
 from fastapi.middleware.cors import CORSMiddleware
 import os
 import sys
+import json
+import time
+import asyncio
+import functools
+import traceback
 from contextlib import asynccontextmanager
 import logging
 from .agentfactory import AgentFactory
-from .utility.thread_cleanup_scheduler import start_thread_cleanup_scheduler
+from .utility.thread_cleanup_scheduler import start_thread_cleanup_scheduler, schedule_interval_job
+from .entity_matcher import refresh_entity_matcher
+from .config import (
+    ENTITY_REFRESH_INTERVAL_MINUTES,
+    ROLLUP_REFRESH_INTERVAL_MINUTES,
+    PREWARM_INTERVAL_MINUTES,
+    BATCH_MAX_ITEMS,
+    BATCH_MAX_CONCURRENCY,
+    BATCH_ADMISSION_RETRIES,
+    ASK_DEADLINE_SECONDS,
+    DISCONNECT_POLL_SECONDS
+)
+from .warmup import run_warmup, WARMUP_STATE
+from .fast_path_router import get_fast_path_stats
+from .pnl_rollup import run_rollup_refresh_as_leader, get_rollup_status
+from .graph_cache import get_graph_cache_stats
+from .graph_prewarm import run_prewarm_as_leader, PREWARM_STATE
+from .utility.single_flight import get_single_flight, get_single_flight_stats
+from .token_budget import get_token_budget_stats
+from .conversation_store import get_conversation, create_conversation, append_messages, purge_expired_conversations
+from .response_cache import get_cached_response, cache_response, get_response_cache_stats
+from .similar_sql_cache import get_similar_sql_stats
+from .few_shot_store import get_few_shot_stats
+from .admission import ask_admission, AdmissionRejected
+from .utility.cancellation import CancellationToken, OperationCancelled, cancellation_scope
+from .utility.resilience import CircuitOpenError, ensure_available, get_resilience_stats
+from .utility import metrics
+from .utility.metrics import span
+from .databricks_pool import get_pool
+from .tool_dispatcher import get_tool_dispatch_stats
 
 # Set up logger
 logger = logging.getLogger(__name__)
@@ -25,12 +60,41 @@ logger.addHandler(ch)
 
 sys.path.append(os.path.dirname(__file__))
 agent_factory = AgentFactory()
+_ask_flight = get_single_flight("ask")
+
+# The /stats/* views, rendered on /metrics as well
+metrics.describe("cache_lookups_total", "Cache lookups by cache and result")
+metrics.describe("retries_total", "Retried calls to backing services")
+metrics.describe("tokens_total", "Model tokens used by agent runs")
+metrics.describe("stage_errors_total", "Stages that ended with an exception")
+metrics.register_collector("fast_path", get_fast_path_stats)
+metrics.register_collector("graph_cache", get_graph_cache_stats)
+metrics.register_collector("response_cache", get_response_cache_stats)
+metrics.register_collector("similar_sql", get_similar_sql_stats)
+metrics.register_collector("few_shot", get_few_shot_stats, nested_labels={"outcomes": "source"})
+metrics.register_collector("admission", ask_admission.stats, nested_labels={"queued_by_user": "user", "active_by_user": "user"})
+metrics.register_collector("resilience", get_resilience_stats, label="dependency")
+metrics.register_collector("single_flight", get_single_flight_stats, label="flight")
+metrics.register_collector("token_budget", get_token_budget_stats)
+metrics.register_collector("databricks_pool", lambda: get_pool().stats())
+metrics.register_collector("tool_dispatch", get_tool_dispatch_stats)
+metrics.register_collector("warmup", lambda: {"ready": WARMUP_STATE["ready"]})
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     logger.info("🚀Starting application lifespan")
     start_thread_cleanup_scheduler()
+    schedule_interval_job(refresh_entity_matcher, ENTITY_REFRESH_INTERVAL_MINUTES, "entity_matcher_refresh")
+    schedule_interval_job(run_rollup_refresh_as_leader, ROLLUP_REFRESH_INTERVAL_MINUTES, "pnl_rollup_refresh")
+    schedule_interval_job(run_prewarm_as_leader, PREWARM_INTERVAL_MINUTES, "graph_prewarm")
+    schedule_interval_job(purge_expired_conversations, 60, "conversation_purge")
+    # Warm up in the background so liveness answers immediately; /ready flips once done
+    warmup_task = asyncio.create_task(run_warmup(agent_factory))
+    # The first rollup build can take a while, so it is not part of readiness
+    asyncio.create_task(asyncio.to_thread(run_rollup_refresh_as_leader))
     yield
+    if not warmup_task.done():
+        warmup_task.cancel()
     logger.info("🚀Application shutdown")
 
 app = FastAPI(lifespan=lifespan)
@@ -58,7 +122,9 @@ class AskRequest(BaseModel):
     agentMode: str
     prompt: str
     file_content: Optional[str] = None
+    # Deprecated: send conversation_id and only the new prompt instead
     chat_history: Optional[List[Message]] = None
+    conversation_id: Optional[str] = None
 
 class AskResponse(BaseModel):
     response: str
@@ -66,59 +132,282 @@ class AskResponse(BaseModel):
     input_tokens: Optional[int]
     output_tokens: Optional[int]
     graph_data: Optional[Dict[str, Any]] = None
+    conversation_id: Optional[str] = None
     status: str
 
+class BatchAskRequest(BaseModel):
+    agentMode: str
+    prompts: List[str]
+
+def _caller(http_request: Request) -> tuple:
+    """Fair-scheduling identity and priority class of a request"""
+    user = http_request.headers.get("x-user-id") or (http_request.client.host if http_request.client else "anonymous")
+    return user, http_request.headers.get("x-request-priority")
+
+async def _run_admitted(caller: tuple, token: CancellationToken, func, *args, **kwargs):
+    """Run blocking agent work once admission control lets it in, under the request's cancellation token"""
+    user, priority = caller
+    # While Azure Agents is known to be down, answer at once instead of holding a queue slot
+    ensure_available("azure_agents")
+    queued_at = time.perf_counter()
+    async with ask_admission.admit(user, priority):
+        metrics.observe("ask.admission_wait", time.perf_counter() - queued_at)
+        # The client may have left while the request was queued
+        token.raise_if_cancelled()
+        with cancellation_scope(token):
+            return await asyncio.to_thread(func, *args, **kwargs)
+
+async def _watch_disconnect(http_request: Request, token: CancellationToken):
+    """Cancel the token when the client goes away or the deadline passes"""
+    while not token.cancelled:
+        if await http_request.is_disconnected():
+            token.cancel("client disconnected")
+            return
+        await asyncio.sleep(DISCONNECT_POLL_SECONDS)
+
 @app.post("/ask", response_model=AskResponse)
-async def ask_agent(request: AskRequest):
+async def ask_agent(request: AskRequest, http_request: Request, http_response: Response):
     logger.info("🚀Received /ask request")
-    try:
-        if not request.prompt and not request.file_content:
-            logger.warning("Empty request received")
+    token = CancellationToken(ASK_DEADLINE_SECONDS)
+    watcher = asyncio.create_task(_watch_disconnect(http_request, token))
+    # Stage timings of this request (agent run, SQL, warehouse...) for its log line and Server-Timing header
+    with metrics.request_stages() as stages:
+        started = time.perf_counter()
+        try:
+            if not request.prompt and not request.file_content:
+                logger.warning("Empty request received")
+                raise HTTPException(
+                    status_code=400,
+                    detail="Either prompt or file content must be provided"
+                )
+
+            # History lives server-side; clients only send the new message and the conversation id
+            caller = _caller(http_request)
+            conversation = None
+            if request.conversation_id:
+                with span("ask.load_conversation"):
+                    conversation = await asyncio.to_thread(get_conversation, request.conversation_id, caller[0])
+            if conversation is None:
+                # Ids are issued here; an unknown, expired or foreign id starts a new conversation
+                if request.conversation_id:
+                    logger.info("🚀Conversation id not found for this caller, starting a new conversation")
+                conversation = create_conversation(caller[0])
+                if request.chat_history:
+                    # Older clients still post the whole history; adopt it once
+                    logger.debug(f"Seeding conversation from {len(request.chat_history)} posted messages")
+                    conversation.messages = [
+                        {"role": "assistant" if msg.role == "agent" else msg.role, "content": msg.content}
+                        for msg in request.chat_history
+                    ]
+
+            logger.debug(f"Processing request with mode: {request.agentMode}")
+            if not request.file_content and not conversation.messages:
+                # Stateless opening request: identical ones already in flight share a single agent run
+                process = functools.partial(
+                    agent_factory.process_request2,
+                    prompt=request.prompt,
+                    agent_mode=request.agentMode
+                )
+                key = (request.agentMode, " ".join(request.prompt.split()))
+                bypass = http_request.headers.get("x-cache-bypass", "").lower() in ("1", "true") \
+                    or "no-cache" in http_request.headers.get("cache-control", "").lower()
+                response = None if bypass else get_cached_response(request.prompt, request.agentMode)
+                http_response.headers["X-Cache"] = "HIT" if response is not None else ("BYPASS" if bypass else "MISS")
+                if response is None:
+                    response = await _run_admitted(caller, token, _ask_flight.do, key, process)
+                    if not response.is_error:
+                        cache_response(request.prompt, request.agentMode, response)
+            else:
+                response = await _run_admitted(
+                    caller,
+                    token,
+                    agent_factory.process_request2,
+                    prompt=request.prompt,
+                    agent_mode=request.agentMode,
+                    file_content=request.file_content,
+                    chat_history=conversation.messages,
+                    conversation_id=conversation.conversation_id,
+                    conversation_thread_id=conversation.thread_id
+                )
+
+            if not response.is_error:
+                with span("ask.save_conversation"):
+                    await asyncio.to_thread(
+                        append_messages,
+                        conversation,
+                        [
+                            {"role": "user", "content": request.prompt},
+                            {"role": "assistant", "content": response.response}
+                        ],
+                        # Only conversation threads are remembered; the shared rolling thread is not theirs
+                        response.thread_id if conversation.messages or request.file_content else None
+                    )
+        
+            logger.info("🚀Request processed successfully")
+            return {
+                "response": response.response,
+                "thread_id": response.thread_id,
+                "input_tokens": response.input_tokens,
+                "output_tokens": response.output_tokens,
+                "graph_data": response.graph_data,
+                "conversation_id": conversation.conversation_id,
+                "status": "success"
+            }
+
+        except OperationCancelled:
+            logger.info(f"🚀/ask cancelled: {token.reason}")
+            # 499: client closed request (nobody reads it); 504 when the deadline ran out
             raise HTTPException(
-                status_code=400,
-                detail="Either prompt or file content must be provided"
+                status_code=499 if token.reason == "client disconnected" else 504,
+                detail=f"Request cancelled: {token.reason}"
             )
 
-        formatted_history = None
-        if request.chat_history:
-            logger.debug(f"Processing chat history with {len(request.chat_history)} messages")
-            formatted_history = [
-                {
-                    "role": msg.role,
-                    "content": msg.content
-                } 
-                for msg in request.chat_history
-            ]
-
-        logger.debug(f"Processing request with mode: {request.agentMode}")
-        response = agent_factory.process_request2(
-            prompt=request.prompt,
-            agent_mode=request.agentMode,
-            file_content=request.file_content,
-            chat_history=formatted_history
-        )
-        
-        logger.info("🚀Request processed successfully")
-        return {
-            "response": response.response,
-            "thread_id": response.thread_id,
-            "input_tokens": response.input_tokens,
-            "output_tokens": response.output_tokens,
-            "graph_data": response.graph_data,
-            "status": "success"
-        }
+        except AdmissionRejected as rejected:
+            logger.warning(f"🚀/ask rejected by admission control: {rejected.reason}")
+            raise HTTPException(
+                status_code=429,
+                detail=f"Server is busy ({rejected.reason}), please retry shortly",
+                headers={"Retry-After": str(rejected.retry_after)}
+            )
+
+        except CircuitOpenError as unavailable:
+            logger.warning(f"🚀/ask failed fast: {unavailable}")
+            raise HTTPException(
+                status_code=503,
+                detail=f"A backing service is unavailable ({unavailable.dependency}), please retry shortly",
+                headers={"Retry-After": str(unavailable.retry_after)}
+            )
 
-    except HTTPException as http_err:
-        logger.error(f"HTTP error in /ask: {http_err.detail}")
-        raise http_err
+        except HTTPException as http_err:
+            logger.error(f"HTTP error in /ask: {http_err.detail}")
+            raise http_err
         
-    except Exception as e:
-        logger.error(f"Unexpected error in /ask: {str(e)}")
-        logger.error(traceback.format_exc())
-        raise HTTPException(
-            status_code=500,
-            detail=f"Internal server error: {str(e)}"
-        )
+        except Exception as e:
+            logger.error(f"Unexpected error in /ask: {str(e)}")
+            logger.error(traceback.format_exc())
+            raise HTTPException(
+                status_code=500,
+                detail=f"Internal server error: {str(e)}"
+            )
+
+        finally:
+            watcher.cancel()
+            metrics.observe("ask", time.perf_counter() - started)
+            if stages:
+                http_response.headers["Server-Timing"] = metrics.server_timing(stages)
+                logger.info(f"🚀/ask stages (ms): {metrics.summarize_stages(stages)}")
+
+async def _answer_batch_item(prompt: str, agent_mode: str, caller: tuple, token: CancellationToken) -> dict:
+    """One batch question on its own one-off thread, retried while admission control is saturated"""
+    started = time.perf_counter()
+    response = get_cached_response(prompt, agent_mode)
+    for attempt in range(BATCH_ADMISSION_RETRIES + 1):
+        if response is not None:
+            break
+        try:
+            response = await _run_admitted(
+                caller,
+                token,
+                agent_factory.process_request2,
+                prompt=prompt,
+                agent_mode=agent_mode,
+                new_thread=True
+            )
+        except AdmissionRejected as rejected:
+            if attempt == BATCH_ADMISSION_RETRIES:
+                return {"status": "error", "response": f"Server is busy ({rejected.reason})",
+                        "latency_ms": round((time.perf_counter() - started) * 1000, 1)}
+            await asyncio.sleep(rejected.retry_after)
+    if not response.is_error:
+        cache_response(prompt, agent_mode, response)
+    return {
+        "status": "error" if response.is_error else "success",
+        "response": response.response,
+        "thread_id": response.thread_id,
+        "input_tokens": response.input_tokens,
+        "output_tokens": response.output_tokens,
+        "graph_data": response.graph_data,
+        "latency_ms": round((time.perf_counter() - started) * 1000, 1)
+    }
+
+async def _stream_batch(request: BatchAskRequest, caller: tuple, http_request: Request):
+    started = time.perf_counter()
+    # The batch token only tracks the client; each item gets its own /ask deadline below
+    token = CancellationToken()
+    watcher = asyncio.create_task(_watch_disconnect(http_request, token))
+    # Repeated questions run once; identical SQL across questions is coalesced further down
+    indices: Dict[str, List[int]] = {}
+    for index, prompt in enumerate(request.prompts):
+        indices.setdefault(" ".join(prompt.split()).lower(), []).append(index)
+
+    limit = asyncio.Semaphore(BATCH_MAX_CONCURRENCY)
+
+    async def run(key: str):
+        async with limit:
+            prompt = request.prompts[indices[key][0]]
+            item_started = time.perf_counter()
+            item_token = CancellationToken(ASK_DEADLINE_SECONDS)
+            try:
+                with token.on_cancel(lambda: item_token.cancel(token.reason)):
+                    result = await _answer_batch_item(prompt, request.agentMode, caller, item_token)
+            except OperationCancelled:
+                result = {"status": "cancelled", "response": f"Request cancelled: {item_token.reason}",
+                          "latency_ms": round((time.perf_counter() - item_started) * 1000, 1)}
+            except CircuitOpenError as unavailable:
+                result = {"status": "error", "response": str(unavailable), "retry_after": unavailable.retry_after,
+                          "latency_ms": round((time.perf_counter() - item_started) * 1000, 1)}
+            except Exception as e:
+                logger.error(f"🚀Batch item failed: {e}")
+                result = {"status": "error", "response": f"Internal server error: {e}",
+                          "latency_ms": round((time.perf_counter() - item_started) * 1000, 1)}
+            return key, result
+
+    item_latency_ms = 0.0
+    failed = 0
+    tasks = [asyncio.create_task(run(key)) for key in indices]
+    try:
+        for finished in asyncio.as_completed(tasks):
+            key, result = await finished
+            item_latency_ms += result["latency_ms"]
+            for position, index in enumerate(indices[key]):
+                failed += result["status"] != "success"
+                line = {"type": "result", "index": index, "prompt": request.prompts[index],
+                        "deduplicated": position > 0, **result}
+                yield json.dumps(line, default=str) + "\n"
+    finally:
+        # Stream closed early (client gone): stop the items still queued or running
+        if any(not task.done() for task in tasks):
+            token.cancel("batch stream closed")
+            for task in tasks:
+                task.cancel()
+        watcher.cancel()
+
+    wall_clock_ms = round((time.perf_counter() - started) * 1000, 1)
+    logger.info(f"🚀Batch of {len(request.prompts)} finished in {wall_clock_ms}ms "
+                f"(items took {item_latency_ms:.0f}ms in total)")
+    yield json.dumps({
+        "type": "summary",
+        "items": len(request.prompts),
+        "unique_prompts": len(indices),
+        "failed": failed,
+        "wall_clock_ms": wall_clock_ms,
+        "sum_item_latency_ms": round(item_latency_ms, 1),
+        "speedup": round(item_latency_ms / wall_clock_ms, 2) if wall_clock_ms else None
+    }) + "\n"
+
+@app.post("/ask/batch")
+async def ask_batch(request: BatchAskRequest, http_request: Request):
+    """
+    Answer a list of independent questions concurrently, streaming one NDJSON line per
+    question as it finishes and a final summary line with wall-clock vs summed latency.
+    """
+    logger.info(f"🚀Received /ask/batch request with {len(request.prompts)} prompts")
+    if not request.prompts or len(request.prompts) > BATCH_MAX_ITEMS:
+        raise HTTPException(status_code=400, detail=f"Provide between 1 and {BATCH_MAX_ITEMS} prompts")
+    if any(not prompt.strip() for prompt in request.prompts):
+        raise HTTPException(status_code=400, detail="Prompts must not be empty")
+    user, _ = _caller(http_request)
+    return StreamingResponse(_stream_batch(request, (user, "bulk"), http_request), media_type="application/x-ndjson")
 
 @app.get("/")
 async def health_check():
@@ -128,4 +417,76 @@ async def health_check():
         "service": "AI Agent Backend",
         "version": "1.1",
         "features": ["text", "graph_generation", "nl_to_sql"]
-    }
\ No newline at end of file
+    }
+
+@app.get("/ready")
+async def readiness_check():
+    """Readiness probe: 503 until the startup warm-up has finished on this worker"""
+    status_code = 200 if WARMUP_STATE["ready"] else 503
+    return JSONResponse(
+        status_code=status_code,
+        content={
+            "status": "ready" if WARMUP_STATE["ready"] else "warming_up",
+            "steps": WARMUP_STATE["steps"]
+        }
+    )
+
+@app.get("/metrics")
+async def prometheus_metrics():
+    """Stage latency histograms, counters and the /stats/* figures in the Prometheus text format"""
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+@app.get("/stats/fast-path")
+async def fast_path_stats():
+    """How many graph requests were answered by the deterministic router, and how fast"""
+    return get_fast_path_stats()
+
+@app.get("/stats/pnl-rollup")
+async def pnl_rollup_stats():
+    """Coverage and freshness of the local PnL rollup"""
+    return get_rollup_status()
+
+@app.get("/stats/graph-cache")
+async def graph_cache_stats():
+    """Graph/result cache hit rates and the outcome of the last pre-warm run"""
+    return {**get_graph_cache_stats(), "prewarm": PREWARM_STATE}
+
+@app.get("/stats/response-cache")
+async def response_cache_stats():
+    """Hit rate of the opt-in /ask response cache"""
+    return get_response_cache_stats()
+
+@app.get("/stats/similar-sql")
+async def similar_sql_stats():
+    """How often SQL of a near-duplicate prompt was reused instead of generated"""
+    return get_similar_sql_stats()
+
+@app.get("/stats/few-shot")
+async def few_shot_stats():
+    """Example retrieval counts and first-try SQL success / latency, zero-shot vs few-shot"""
+    return get_few_shot_stats()
+
+@app.get("/stats/admission")
+async def admission_stats():
+    """Concurrency, queue depth, rejections, wait-time percentiles and per-user fair-queue state of /ask"""
+    return ask_admission.stats()
+
+@app.get("/stats/resilience")
+async def resilience_stats():
+    """Circuit state, retries, retry budget and short-circuited calls per backing service"""
+    return get_resilience_stats()
+
+@app.get("/stats/single-flight")
+async def single_flight_stats():
+    """How often identical in-flight work was shared instead of repeated"""
+    return get_single_flight_stats()
+
+@app.get("/stats/tool-dispatch")
+async def tool_dispatch_stats():
+    """Busy tool workers, timeouts and calls still running after their timeout"""
+    return get_tool_dispatch_stats()
+
+@app.get("/stats/token-budget")
+async def token_budget_stats():
+    """Predicted vs actual input tokens of agent runs"""
+    return get_token_budget_stats()
@@ -0,0 +1,348 @@
+# backend/app/pnl_rollup.py
+import time
+import logging
+from contextlib import closing
+from datetime import date, timedelta
+from typing import Dict, Optional
+from .config import (
+    DATABRICKS_CATALOG,
+    DATABRICK_SCHEMA,
+    ROLLUP_LOOKBACK_DAYS,
+    ROLLUP_MAX_STALENESS_MINUTES,
+    ROLLUP_REFRESH_INTERVAL_MINUTES,
+    ROLLUP_RECONCILE_HOURS,
+    ROLLUP_FETCH_BATCH_ROWS
+)
+from .databricks_pool import get_pool
+from .prompt_parser import TimeWindow
+from .utility.local_db import get_connection
+from .utility.resilience import databricks_call
+from .utility.worker_coordination import run_if_leader
+
+# Set up logger
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+# Create console handler with higher level
+ch = logging.StreamHandler()
+ch.setLevel(logging.INFO)
+
+# Create formatter and add it to the handlers
+formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+ch.setFormatter(formatter)
+logger.addHandler(ch)
+
+# -----------------------------------------------------------------------------
+# Local materialized rollup of entity_pnl_detail by deal, portfolio, trader and
+# pnl_end_date. Refreshed incrementally by a scheduled job; dashboard-style
+# questions the fast path recognizes are answered from it without the warehouse.
+# Refreshes stream the warehouse result into a staging table in batches, then
+# swap it in with one transaction. A periodic full rebuild (the reconcile)
+# drops groups deleted in the warehouse since the last one.
+# -----------------------------------------------------------------------------
+
+ROLLUP_METRICS = [
+    "ltd_realized_value", "ltd_unrealized_value",
+    "ytd_realized_value", "ytd_unrealized_value",
+    "mtd_realized_value", "mtd_unrealized_value",
+    "dtd_realized_value", "dtd_unrealized_value",
+]
+
+# fast-path dimension -> (label expression over pnl_rollup, label alias, excluded empty key)
+ROLLUP_DIMENSIONS = {
+    "deal": ("deal_num", "deal_num", None),
+    "trader": ("trader", "trader", "trader"),
+    "portfolio": ("internal_portfolio", "internal_portfolio", "internal_portfolio"),
+    "month": ("substr(pnl_end_date, 1, 7)", "month", None),
+}
+
+# Entity filter kind -> rollup column
+ROLLUP_ENTITY_COLUMNS = {"trader": "trader"}
+
+ROLLUP_LEASE_NAME = "pnl_rollup_refresh"
+ROLLUP_LEASE_TTL_SECONDS = ROLLUP_REFRESH_INTERVAL_MINUTES * 60 * 1.5
+
+_SCHEMA = f"""
+CREATE TABLE IF NOT EXISTS pnl_rollup (
+    deal_num           INTEGER NOT NULL,
+    internal_portfolio TEXT NOT NULL,
+    trader             TEXT NOT NULL,
+    pnl_end_date       TEXT NOT NULL,
+    {", ".join(f"{m} REAL" for m in ROLLUP_METRICS)},
+    PRIMARY KEY (deal_num, internal_portfolio, trader, pnl_end_date)
+);
+CREATE INDEX IF NOT EXISTS idx_pnl_rollup_date ON pnl_rollup (pnl_end_date);
+CREATE TABLE IF NOT EXISTS pnl_rollup_stage (
+    deal_num           INTEGER NOT NULL,
+    internal_portfolio TEXT NOT NULL,
+    trader             TEXT NOT NULL,
+    pnl_end_date       TEXT NOT NULL,
+    {", ".join(f"{m} REAL" for m in ROLLUP_METRICS)},
+    PRIMARY KEY (deal_num, internal_portfolio, trader, pnl_end_date)
+);
+CREATE TABLE IF NOT EXISTS pnl_rollup_meta (
+    key   TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+"""
+
+
+ROLLUP_COLUMNS = ["deal_num", "internal_portfolio", "trader", "pnl_end_date"] + ROLLUP_METRICS
+
+
+def _connect():
+    return get_connection("pnl_rollup", _SCHEMA)
+
+
+def _table(name: str) -> str:
+    return f"{DATABRICKS_CATALOG}.{DATABRICK_SCHEMA}.{name}"
+
+
+def _get_meta(conn) -> dict:
+    return {row["key"]: row["value"] for row in conn.execute("SELECT key, value FROM pnl_rollup_meta")}
+
+
+def get_rollup_status() -> dict:
+    with closing(_connect()) as conn:
+        meta = _get_meta(conn)
+        meta["rows"] = conn.execute("SELECT COUNT(*) AS n FROM pnl_rollup").fetchone()["n"]
+    return meta
+
+
+_data_version = {"value": None, "read_at": 0.0}
+# How long a worker trusts its last read of the shared data_version
+DATA_VERSION_CHECK_SECONDS = 5
+
+
+def get_data_version() -> str:
+    """Version of the loaded PnL data, cheap enough to read on every request"""
+    now = time.monotonic()
+    if now - _data_version["read_at"] > DATA_VERSION_CHECK_SECONDS:
+        try:
+            with closing(_connect()) as conn:
+                row = conn.execute("SELECT value FROM pnl_rollup_meta WHERE key = 'data_version'").fetchone()
+            _data_version["value"] = row["value"] if row else "0"
+        except Exception as e:
+            logger.warning(f"🚀Could not read PnL data version: {e}")
+            _data_version["value"] = _data_version["value"] or "0"
+        _data_version["read_at"] = now
+    return _data_version["value"]
+
+
+def _source_query(since: Optional[date]):
+    """Aggregate query against the warehouse; with `since`, only (deal, date) groups touched since then"""
+    # Lazy import: fast_path_router imports this module
+    from .fast_path_router import current_header_sql
+    sums = ",\n    ".join(f"SUM(p.{m}) AS {m}" for m in ROLLUP_METRICS)
+    changed_cte = ""
+    changed_join = ""
+    parameters = None
+    if since is not None:
+        # Whole groups are recomputed, so a late payment_date correction replaces its group completely.
+        # Groups of deals whose header was amended are re-read too, to pick up a new trader or portfolio.
+        changed_cte = (
+            f"WITH changed AS (\n"
+            f"    SELECT DISTINCT deal_num, pnl_end_date FROM {_table('entity_pnl_detail')}\n"
+            f"    WHERE pnl_end_date >= :since OR payment_date >= :since\n"
+            f"    UNION\n"
+            f"    SELECT DISTINCT d.deal_num, d.pnl_end_date FROM {_table('entity_pnl_detail')} d\n"
+            f"    JOIN {_table('entity_trade_header')} u ON d.deal_num = u.deal_num AND d.tran_num = u.tran_num\n"
+            f"    WHERE u.last_update_datetime >= :since\n"
+            f")\n"
+        )
+        changed_join = "JOIN changed c ON p.deal_num = c.deal_num AND p.pnl_end_date = c.pnl_end_date\n"
+        parameters = {"since": since}
+    sql = (
+        f"{changed_cte}"
+        f"SELECT p.deal_num,\n"
+        f"    COALESCE(h.internal_portfolio, '') AS internal_portfolio,\n"
+        f"    COALESCE(h.trader, '') AS trader,\n"
+        f"    p.pnl_end_date,\n"
+        f"    {sums}\n"
+        f"FROM {_table('entity_pnl_detail')} p\n"
+        f"{changed_join}"
+        f"LEFT JOIN {current_header_sql(['internal_portfolio', 'trader'])} h\n"
+        f"    ON p.deal_num = h.deal_num AND p.tran_num = h.tran_num\n"
+        f"WHERE p.pnl_end_date IS NOT NULL\n"
+        f"GROUP BY 1, 2, 3, 4"
+    )
+    return sql, parameters
+
+
+def _stage_row(row) -> tuple:
+    pnl_end_date = row[3].isoformat() if isinstance(row[3], date) else str(row[3])
+    return tuple([row[0], row[1], row[2], pnl_end_date[:10]]
+                 + [float(value) if value is not None else None for value in row[4:]])
+
+
+def _load_stage(sql: str, parameters: Optional[dict]) -> int:
+    """Stream the warehouse result into pnl_rollup_stage batch by batch; returns the row count"""
+    insert = (
+        f"INSERT INTO pnl_rollup_stage ({', '.join(ROLLUP_COLUMNS)}) "
+        f"VALUES ({', '.join('?' for _ in ROLLUP_COLUMNS)})"
+    )
+    loaded = 0
+    with closing(_connect()) as conn:
+        # Also clears a partial load from a failed attempt, so the whole call can be retried
+        conn.execute("DELETE FROM pnl_rollup_stage")
+        with get_pool().connection() as source:
+            with source.cursor() as cursor:
+                cursor.execute(sql, parameters)
+                while True:
+                    batch = cursor.fetchmany(ROLLUP_FETCH_BATCH_ROWS)
+                    if not batch:
+                        break
+                    conn.execute("BEGIN")
+                    conn.executemany(insert, [_stage_row(row) for row in batch])
+                    conn.execute("COMMIT")
+                    loaded += len(batch)
+    return loaded
+
+
+def _stage_differs(conn, live_rows: str) -> bool:
+    """True when the staged rows and `live_rows` (a SELECT of ROLLUP_COLUMNS) are not the same set"""
+    staged = f"SELECT {', '.join(ROLLUP_COLUMNS)} FROM pnl_rollup_stage"
+    for query in (f"{live_rows} EXCEPT {staged}", f"{staged} EXCEPT {live_rows}"):
+        if conn.execute(f"SELECT EXISTS ({query}) AS differs").fetchone()["differs"]:
+            return True
+    return False
+
+
+def _reconcile_due(meta: dict) -> bool:
+    return time.time() - float(meta.get("reconciled_at") or 0) > ROLLUP_RECONCILE_HOURS * 3600
+
+
+def refresh_rollup(full: bool = False) -> dict:
+    """
+    Build (first run, full=True or reconcile due) or incrementally refresh the rollup from the warehouse.
+    Returns the resulting status; the data_version counter changes only when the aggregates do.
+    """
+    started = time.perf_counter()
+    with closing(_connect()) as conn:
+        meta = _get_meta(conn)
+    watermark = meta.get("watermark")
+    since = None
+    if watermark and not full and not _reconcile_due(meta):
+        since = date.fromisoformat(watermark) - timedelta(days=ROLLUP_LOOKBACK_DAYS)
+
+    sql, parameters = _source_query(since)
+    logger.info(f"🚀Refreshing PnL rollup ({'full' if since is None else f'since {since}'})")
+    try:
+        loaded = databricks_call(_load_stage, sql, parameters)
+    except Exception as e:
+        logger.error(f"🚀PnL rollup refresh failed: {e}")
+        return get_rollup_status()
+
+    columns = ", ".join(ROLLUP_COLUMNS)
+    staged_keys = "SELECT DISTINCT deal_num, pnl_end_date FROM pnl_rollup_stage"
+    with closing(_connect()) as conn:
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            # Full rebuild: anything no longer in the warehouse disappears with the swap.
+            # Incremental: only the re-read groups are replaced.
+            replaced = "" if since is None else f" WHERE (deal_num, pnl_end_date) IN ({staged_keys})"
+            # The lookback re-reads unchanged groups every time; only a real difference is a new data version
+            data_changed = _stage_differs(conn, f"SELECT {columns} FROM pnl_rollup{replaced}")
+            if data_changed:
+                conn.execute(f"DELETE FROM pnl_rollup{replaced}")
+                conn.execute(f"INSERT INTO pnl_rollup ({columns}) SELECT {columns} FROM pnl_rollup_stage")
+            conn.execute("DELETE FROM pnl_rollup_stage")
+            bounds = conn.execute("SELECT MIN(pnl_end_date) AS lo, MAX(pnl_end_date) AS hi FROM pnl_rollup").fetchone()
+            new_meta = {
+                "refreshed_at": str(time.time()),
+                "min_date": bounds["lo"] or "",
+                "watermark": bounds["hi"] or watermark or "",
+            }
+            if since is None:
+                new_meta["reconciled_at"] = new_meta["refreshed_at"]
+            if data_changed:
+                new_meta["data_version"] = str(int(meta.get("data_version", "0")) + 1)
+            conn.executemany(
+                "INSERT OR REPLACE INTO pnl_rollup_meta (key, value) VALUES (?, ?)",
+                list(new_meta.items())
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+    # Re-read on next use, so entries cached right after (e.g. by pre-warm) carry the new version
+    _data_version["read_at"] = 0.0
+
+    logger.info(f"🚀PnL rollup refreshed: {loaded} groups in {time.perf_counter() - started:.1f}s")
+    return get_rollup_status()
+
+
+def run_rollup_refresh_as_leader():
+    """Scheduled job: one worker refreshes the shared rollup, the others read it"""
+    try:
+        before = get_rollup_status().get("data_version")
+        status = run_if_leader(ROLLUP_LEASE_NAME, ROLLUP_LEASE_TTL_SECONDS, refresh_rollup)
+        if status is not None and status.get("data_version") != before:
+            # New data landed: drop stale graphs and refill the popular ones straight away
+            from .graph_cache import invalidate_graph_cache
+            from .graph_prewarm import prewarm_popular_graphs
+            invalidate_graph_cache()
+            prewarm_popular_graphs()
+    except Exception as e:
+        logger.error(f"🚀PnL rollup refresh job failed: {e}")
+
+
+def _covers(meta: dict, metric: str, dimension: str, time_window: Optional[TimeWindow],
+            entity_filters: Optional[Dict[str, str]] = None) -> bool:
+    if metric not in ROLLUP_METRICS or dimension not in ROLLUP_DIMENSIONS:
+        return False
+    # Only the trader is kept per rollup row; a counterparty filter needs the warehouse
+    if any(kind not in ROLLUP_ENTITY_COLUMNS for kind in entity_filters or {}):
+        return False
+    if not meta.get("refreshed_at") or not meta.get("watermark"):
+        return False
+    if time.time() - float(meta["refreshed_at"]) > ROLLUP_MAX_STALENESS_MINUTES * 60:
+        return False
+    if time_window is not None:
+        # Only windows fully inside the loaded date range are answerable
+        if time_window.start.isoformat() < meta["min_date"] or time_window.end.isoformat() > meta["watermark"]:
+            return False
+    return True
+
+
+def query_rollup(dimension: str, metric: str, top_n: int, time_window: Optional[TimeWindow] = None,
+                 entity_filters: Optional[Dict[str, str]] = None) -> Optional[dict]:
+    """
+    Answer a fast-path plan from the rollup. Returns a result in the execute_sql_query shape,
+    or None when the rollup does not cover the request.
+    """
+    try:
+        with closing(_connect()) as conn:
+            if not _covers(_get_meta(conn), metric, dimension, time_window, entity_filters):
+                return None
+            label_expr, label_alias, non_empty = ROLLUP_DIMENSIONS[dimension]
+            clauses, args = [], []
+            if time_window is not None:
+                clauses.append("pnl_end_date BETWEEN ? AND ?")
+                args += [time_window.start.isoformat(), time_window.end.isoformat()]
+            for kind, name in (entity_filters or {}).items():
+                clauses.append(f"{ROLLUP_ENTITY_COLUMNS[kind]} = ?")
+                args.append(name)
+            if non_empty:
+                # Mirror the warehouse query's inner join to the trade header
+                clauses.append(f"{non_empty} != ''")
+            where = f" WHERE {' AND '.join(clauses)}" if clauses else ""
+            query = (
+                f"SELECT {label_expr} AS {label_alias}, SUM({metric}) AS {metric} FROM pnl_rollup"
+                f"{where} GROUP BY 1 ORDER BY 2 DESC LIMIT ?"
+            )
+            rows = conn.execute(query, args + [int(top_n)]).fetchall()
+    except Exception as e:
+        logger.warning(f"🚀PnL rollup query failed, using warehouse: {e}")
+        return None
+
+    data = [dict(row) for row in rows]
+    logger.info(f"🚀Answered {dimension} by {metric} from PnL rollup ({len(data)} rows)")
+    return {
+        "status": "success",
+        "columns": [label_alias, metric],
+        "data": data,
+        "query": query,
+        "row_count": len(data),
+        "source": "pnl_rollup"
+    }
@@ -0,0 +1,184 @@
+# backend/app/prompt_parser.py
+import re
+import calendar
+import logging
+from dataclasses import dataclass
+from datetime import date, timedelta
+from functools import lru_cache
+from typing import Optional, Tuple
+from .schema_utils import load_schema
+
+# Set up logger
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+# Create console handler with higher level
+ch = logging.StreamHandler()
+ch.setLevel(logging.INFO)
+
+# Create formatter and add it to the handlers
+formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+ch.setFormatter(formatter)
+logger.addHandler(ch)
+
+# -----------------------------------------------------------------------------
+# Single-pass prompt analysis. Every consumer (GraphService, graph_utils, the
+# fast-path router, AgentFactory.is_graph_prompt) reads the same memoized
+# PromptIntent instead of re-scanning the prompt with its own regexes.
+# -----------------------------------------------------------------------------
+
+PNL_TABLE = "entity_pnl_detail"
+
+MONTHS = {name.lower(): idx for idx, name in enumerate(calendar.month_name) if name}
+
+WORD_PATTERN = re.compile(r"[a-z0-9_]+")
+GRAPH_PATTERN = re.compile(r"generate graph|show me a graph|plot|visualize|graph|chart|trend")
+LINE_PATTERN = re.compile(r"\bline\b")
+PIE_PATTERN = re.compile(r"\bpie\b")
+TOP_N_PATTERN = re.compile(r"\btop\s+(\d+)")
+METRIC_COLUMN_PATTERN = re.compile(r"^(core_)?(ltd|ytd|qtd|mtd|dtd)_[a-z_]*value(_eur)?$")
+
+LAST_MONTH_PATTERN = re.compile(r"\blast month\b")
+# "may" on its own is usually a verb; only treat it as a month when capitalised or followed by a year
+MONTH_PATTERN = re.compile(
+    r"\b(?i:january|february|march|april|june|july|august|september|october|november|december)\b"
+    r"|\bMay\b|\b(?i:may)(?=\s+(?:19|20)\d{2}\b)"
+)
+QUARTER_PATTERN = re.compile(r"\bq([1-4])\b")
+YEAR_PATTERN = re.compile(r"\b((?:19|20)\d{2})\b")
+# Every word that may name a period, in any casing; each must be used by the parsed window
+TIME_TERM_PATTERN = re.compile(r"\b(?:" + "|".join(MONTHS) + r"|q[1-4]|(?:19|20)\d{2}|last)\b")
+
+# Group-by dimensions, in priority order
+GROUP_BY_PATTERNS = (
+    ("trader", re.compile(r"\b(per|by|each|for every)\s+traders?\b")),
+    ("portfolio", re.compile(r"\b(per|by|each|for every)\s+portfolios?\b")),
+    ("month", re.compile(r"\b(per|by|each)\s+month\b|\bmonthly\b")),
+    ("deal", re.compile(r"\bdeals?\b")),
+)
+
+# Filter values are read from the original casing: "for trader John Smith", "portfolio GAS_UK"
+TRADER_VALUE_PATTERN = re.compile(r"\b(?i:trader)\s+([A-Z][\w.'-]*(?:\s+[A-Z][\w.'-]*)*)")
+PORTFOLIO_VALUE_PATTERN = re.compile(r"\b(?i:portfolio)\s+([A-Z0-9][\w.-]*(?:\s+[A-Z0-9][\w.-]*)*)")
+
+
+@dataclass(frozen=True)
+class TimeWindow:
+    kind: str  # "last_month" | "month" | "quarter" | "year"
+    start: date
+    end: date  # inclusive
+    label: str
+
+
+@dataclass(frozen=True)
+class PromptIntent:
+    text: str
+    words: Tuple[str, ...]
+    is_graph: bool
+    chart_type: str
+    top_n: Optional[int]
+    metric: Optional[str]
+    group_by: Optional[str]
+    time_window: Optional[TimeWindow]
+    # A time term was left out of time_window ("in may", "in 2023 and 2024"); time_window is then None
+    time_terms_unparsed: bool
+    trader: Optional[str]
+    portfolio: Optional[str]
+
+    def top_n_or(self, default: int) -> int:
+        return self.top_n if self.top_n is not None else default
+
+
+def _month_window(year: int, month: int) -> Tuple[date, date]:
+    return date(year, month, 1), date(year, month, calendar.monthrange(year, month)[1])
+
+
+def _parse_time_window(text: str, lower: str, today: date) -> Tuple[Optional[TimeWindow], Tuple[str, ...]]:
+    """The window named in the prompt and the time terms it was built from"""
+    year_match = YEAR_PATTERN.search(lower)
+    year = int(year_match.group(1)) if year_match else None
+    year_terms = (year_match.group(1),) if year_match else ()
+
+    if LAST_MONTH_PATTERN.search(lower):
+        last_month_end = today.replace(day=1) - timedelta(days=1)
+        start, end = _month_window(last_month_end.year, last_month_end.month)
+        return TimeWindow("last_month", start, end, "last month"), ("last",)
+
+    match = MONTH_PATTERN.search(text)
+    if match:
+        month = MONTHS[match.group(0).lower()]
+        # Without an explicit year, a named month means its most recent occurrence
+        window_year = year or (today.year if month <= today.month else today.year - 1)
+        start, end = _month_window(window_year, month)
+        label = f"{calendar.month_name[month]} {window_year}"
+        return TimeWindow("month", start, end, label), (match.group(0).lower(),) + year_terms
+
+    match = QUARTER_PATTERN.search(lower)
+    if match:
+        quarter = int(match.group(1))
+        first_month = 3 * (quarter - 1) + 1
+        window_year = year or (today.year if first_month <= today.month else today.year - 1)
+        start, _ = _month_window(window_year, first_month)
+        _, end = _month_window(window_year, 3 * quarter)
+        return TimeWindow("quarter", start, end, f"Q{quarter} {window_year}"), (match.group(0),) + year_terms
+
+    if year:
+        return TimeWindow("year", date(year, 1, 1), date(year, 12, 31), str(year)), year_terms
+    return None, ()
+
+
+def _find_metric(lower: str) -> Optional[str]:
+    # Longest first so "ltd_base_realized_value" wins over "ltd_realized_value"
+    candidates = sorted(
+        (c for c in load_schema().get(PNL_TABLE, []) if METRIC_COLUMN_PATTERN.match(c)),
+        key=len,
+        reverse=True
+    )
+    for column in candidates:
+        if column in lower or column.replace("_", " ") in lower:
+            return column
+    return None
+
+
+@lru_cache(maxsize=1024)
+def _parse(text: str, today: date) -> PromptIntent:
+    lower = text.lower()
+
+    top_n_match = TOP_N_PATTERN.search(lower)
+    if LINE_PATTERN.search(lower):
+        chart_type = "line"
+    elif PIE_PATTERN.search(lower):
+        chart_type = "pie"
+    else:
+        chart_type = "bar"
+
+    # One window per prompt: a second period ("2023 and 2024") or a lowercase "may" is not expressed by it
+    time_window, used_terms = _parse_time_window(text, lower, today)
+    time_terms_unparsed = sorted(TIME_TERM_PATTERN.findall(lower)) != sorted(used_terms)
+
+    trader_match = TRADER_VALUE_PATTERN.search(text)
+    portfolio_match = PORTFOLIO_VALUE_PATTERN.search(text)
+
+    return PromptIntent(
+        text=text,
+        words=tuple(WORD_PATTERN.findall(lower)),
+        is_graph=bool(GRAPH_PATTERN.search(lower)),
+        chart_type=chart_type,
+        top_n=int(top_n_match.group(1)) if top_n_match else None,
+        metric=_find_metric(lower),
+        group_by=next((name for name, pattern in GROUP_BY_PATTERNS if pattern.search(lower)), None),
+        time_window=None if time_terms_unparsed else time_window,
+        time_terms_unparsed=time_terms_unparsed,
+        trader=trader_match.group(1) if trader_match else None,
+        portfolio=portfolio_match.group(1) if portfolio_match else None
+    )
+
+
+def parse_prompt(prompt: str, today: Optional[date] = None) -> PromptIntent:
+    """Parse the prompt once; repeated calls for the same prompt (on the same day) are cache hits."""
+    return _parse(prompt or "", today or date.today())
+
+
+def clear_prompt_cache():
+    """Parsed metrics depend on the schema registry; called when the schema is refreshed"""
+    _parse.cache_clear()
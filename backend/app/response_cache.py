@@ -0,0 +1,65 @@
+# backend/app/response_cache.py
+import logging
+from typing import Optional
+from .config import (
+    ASK_RESPONSE_CACHE_ENABLED,
+    ASK_RESPONSE_CACHE_TTL_MINUTES,
+    ASK_RESPONSE_CACHE_MAX_ENTRIES
+)
+from .graph_cache import normalize_prompt
+from .schema_utils import get_schema_version
+from .pnl_rollup import get_data_version
+from .agentfactory import AgentResponse
+from .utility.ttl_cache import TTLCache
+from .utility import metrics
+
+# Set up logger
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+# Create console handler with higher level
+ch = logging.StreamHandler()
+ch.setLevel(logging.INFO)
+
+# Create formatter and add it to the handlers
+formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+ch.setFormatter(formatter)
+logger.addHandler(ch)
+
+# -----------------------------------------------------------------------------
+# Opt-in cache of whole /ask answers for context-free prompts. Keys carry the
+# schema and data versions, so a data load or schema refresh retires old entries
+# without an explicit flush. The data version only tracks the PnL rollup; changes
+# to other tables (legs, profiles) are picked up when entries expire after
+# ASK_RESPONSE_CACHE_TTL_MINUTES.
+# -----------------------------------------------------------------------------
+
+# Only answers the agent actually gave; fallbacks such as "Agent did not provide a
+# direct response" have no response_type and are not errors, but must not be replayed
+CACHEABLE_RESPONSE_TYPES = ("text", "graph")
+
+_cache = TTLCache(maxsize=ASK_RESPONSE_CACHE_MAX_ENTRIES, ttl_seconds=ASK_RESPONSE_CACHE_TTL_MINUTES * 60)
+
+
+def response_cache_key(prompt: str, agent_mode: str) -> tuple:
+    return (normalize_prompt(prompt), agent_mode, get_schema_version(), get_data_version())
+
+
+def get_cached_response(prompt: str, agent_mode: str) -> Optional[AgentResponse]:
+    if not ASK_RESPONSE_CACHE_ENABLED:
+        return None
+    response = _cache.get(response_cache_key(prompt, agent_mode))
+    metrics.inc("cache_lookups_total", cache="response", result="hit" if response is not None else "miss")
+    return response
+
+
+def cache_response(prompt: str, agent_mode: str, response: AgentResponse):
+    if not ASK_RESPONSE_CACHE_ENABLED:
+        return
+    if response.is_error or response.response_type not in CACHEABLE_RESPONSE_TYPES:
+        return
+    _cache.set(response_cache_key(prompt, agent_mode), response)
+
+
+def get_response_cache_stats() -> dict:
+    return {"enabled": ASK_RESPONSE_CACHE_ENABLED, **_cache.stats()}
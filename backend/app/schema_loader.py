@@ -5,6 +5,7 @@ import json
 import databricks.sql
 from databricks.sql import OperationalError
 from . import config
+from .schema_utils import invalidate_schema_cache
 import logging
 
 # Set up logger
@@ -61,6 +62,7 @@ def fetch_schema_from_databricks():
                 json.dump(schema_dict, f, indent=2)
 
             logger.info(f"🚀Schema successfully written to {SCHEMA_FILE}")
+            invalidate_schema_cache()
 
     except OperationalError as e:
         logger.info(f"🚀Databricks connection failed: {e}")
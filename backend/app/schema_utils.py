@@ -3,6 +3,7 @@
 
 import os
 import json
+import hashlib
 from pathlib import Path
 from .config import DATABRICKS_SERVER_HOSTNAME, DATABRICKS_HTTP_PATH, DATABRICKS_ACCESS_TOKEN
 from databricks import sql
@@ -23,15 +24,38 @@ logger.addHandler(ch)
 
 SCHEMA_FILE = os.path.join(os.path.dirname(__file__), "cache", "databricks_schema.json")
 
+_schema_cache = None
+_schema_version = None
+
 def load_schema() -> dict:
+    global _schema_cache, _schema_version
+    if _schema_cache is not None:
+        return _schema_cache
     logger.info(f"🚀Schema Loader: load schema")
     schema_file = Path(__file__).parent / "cache/databricks_schema.json"
     logger.info(f"🚀[DEBUG] Loading schema from: {schema_file}")
     with open(schema_file) as f:
         schema = json.load(f)
     logger.info(f"🚀[DEBUG] Loaded {len(schema)} tables from schema")
+    _schema_version = hashlib.sha256(json.dumps(schema, sort_keys=True).encode("utf-8")).hexdigest()[:12]
+    _schema_cache = schema
     return schema
 
+def get_schema_version() -> str:
+    """Content hash of the schema registry; changes whenever the cached schema does"""
+    load_schema()
+    return _schema_version
+
+def invalidate_schema_cache():
+    """Drop the in-memory schema registry after the cached schema file was rewritten"""
+    global _schema_cache, _schema_version
+    from .sql_query_generator_instruction import build_sql_instruction
+    from .prompt_parser import clear_prompt_cache
+    _schema_cache = None
+    _schema_version = None
+    build_sql_instruction.cache_clear()
+    clear_prompt_cache()
+
 def fetch_and_save_schema():
     conn = sql.connect(
         server_hostname=DATABRICKS_SERVER_HOSTNAME,
@@ -55,6 +79,7 @@ def fetch_and_save_schema():
         with open(SCHEMA_FILE, "w") as f:
             json.dump(schema, f, indent=2)
         logger.info("Schema saved to databricks_schema.json")
+        invalidate_schema_cache()
 
     finally:
         conn.close()
\ No newline at end of file
@@ -0,0 +1,216 @@
+# backend/app/similar_sql_cache.py
+import re
+import threading
+import logging
+from difflib import SequenceMatcher
+from functools import lru_cache
+from typing import List, Optional
+from .config import (
+    SIMILAR_SQL_CACHE_ENABLED,
+    SIMILAR_SQL_THRESHOLD,
+    SIMILARITY_INDEX_CAPACITY,
+    SIMILARITY_INDEX_FEATURES
+)
+from .prompt_parser import parse_prompt
+from .schema_utils import load_schema, get_schema_version
+from .utility.similarity_index import SimilarityIndex
+from .utility import metrics
+
+# Set up logger
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+# Create console handler with higher level
+ch = logging.StreamHandler()
+ch.setLevel(logging.INFO)
+
+# Create formatter and add it to the handlers
+formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+ch.setFormatter(formatter)
+logger.addHandler(ch)
+
+# -----------------------------------------------------------------------------
+# Near-duplicate lookup for NL-to-SQL. Prompts whose SQL ran successfully are kept
+# in a local similarity index; a new prompt reuses that SQL when it is close enough
+# AND asks for the same thing (same top N, metric, grouping, window, filters and
+# numbers, and no word that is not just a respelling), so "top ten deals by
+# realized pnl" can reuse "show top 10 deals realized value" but never "top 5
+# deals ..." or "... unrealized pnl". Only schema and request vocabulary may be
+# respelled; names and ids must match exactly ("trader smyth" is not "trader smith").
+# -----------------------------------------------------------------------------
+
+NUMBER_WORDS = {
+    "one": "1", "two": "2", "three": "3", "four": "4", "five": "5",
+    "six": "6", "seven": "7", "eight": "8", "nine": "9", "ten": "10",
+    "eleven": "11", "twelve": "12", "fifteen": "15", "twenty": "20",
+    "twenty five": "25", "fifty": "50", "hundred": "100",
+}
+NUMBER_WORD_PATTERN = re.compile(
+    r"\b(" + "|".join(sorted((re.escape(w) for w in NUMBER_WORDS), key=len, reverse=True)) + r")\b",
+    re.IGNORECASE
+)
+SYNONYMS = {
+    "pnl": "value", "p&l": "value", "profit": "value", "amount": "value",
+    "largest": "top", "biggest": "top", "highest": "top", "best": "top",
+}
+STOPWORDS = {
+    "a", "an", "the", "me", "show", "list", "give", "get", "display", "what", "which", "are", "is",
+    "of", "by", "for", "in", "on", "our", "all", "please", "can", "you", "and", "with", "to",
+}
+TOKEN_PATTERN = re.compile(r"[a-z0-9_&]+")
+# Differing words closer than this are taken as spelling variants ("realised" / "realized")
+RESPELLING_RATIO = 0.8
+# Request words that may be respelled besides the schema's table and column names
+REQUEST_VOCABULARY = {
+    "deal", "trade", "trader", "portfolio", "counterparty", "graph", "chart", "plot", "visualize",
+    "top", "bottom", "lowest", "total", "sum", "average", "month", "monthly", "quarter", "year",
+    "daily", "realized", "unrealized", "value", "latest", "current",
+}
+DIGITS_PATTERN = re.compile(r"\d+")
+
+SIMILAR_SQL_STATS = {
+    "lookups": 0,
+    "hits": 0,
+    "misses": 0,
+    "rejected_by_intent": 0,
+    "stored": 0,
+    "last_hit_score": None,
+}
+_stats_lock = threading.Lock()
+
+
+def expand_number_words(text: str) -> str:
+    return NUMBER_WORD_PATTERN.sub(lambda m: NUMBER_WORDS[m.group(0).lower()], text or "")
+
+
+def tokenize_request(text: str) -> List[str]:
+    """Canonical tokens of a request: digits for number words, synonyms folded, filler dropped"""
+    tokens = []
+    for token in TOKEN_PATTERN.findall(expand_number_words(text).lower()):
+        token = SYNONYMS.get(token, token)
+        if token in STOPWORDS:
+            continue
+        if len(token) > 3 and token.endswith("s") and not token.endswith("ss"):
+            token = token[:-1]
+        tokens.append(token)
+    return tokens
+
+
+_index = SimilarityIndex(
+    capacity=SIMILARITY_INDEX_CAPACITY,
+    n_features=SIMILARITY_INDEX_FEATURES,
+    tokenize=tokenize_request
+)
+
+
+def intent_signature(text: str) -> tuple:
+    """Everything that changes the SQL even when the wording is nearly the same"""
+    expanded = expand_number_words(text)
+    intent = parse_prompt(expanded)
+    window = intent.time_window
+    return (
+        intent.top_n,
+        intent.metric,
+        intent.group_by,
+        (window.start.isoformat(), window.end.isoformat()) if window else None,
+        (intent.trader or "").lower(),
+        (intent.portfolio or "").lower(),
+        tuple(sorted(set(DIGITS_PATTERN.findall(expanded)))),
+    )
+
+
+@lru_cache(maxsize=4)
+def _vocabulary(schema_version: str) -> frozenset:
+    """Tokens of the schema's identifiers plus REQUEST_VOCABULARY, for one schema version"""
+    words = set(tokenize_request(" ".join(REQUEST_VOCABULARY)))
+    for table, columns in load_schema().items():
+        for identifier in [table, *columns]:
+            words.update(tokenize_request(identifier))
+            words.update(tokenize_request(identifier.replace("_", " ")))
+    return frozenset(words)
+
+
+def _is_respelling(token: str, candidate: str, vocabulary: frozenset) -> bool:
+    # Names, ids and numbers differ in meaning, not spelling: one side must be a known word
+    if token not in vocabulary and candidate not in vocabulary:
+        return False
+    if any(char.isdigit() for char in token + candidate):
+        return False
+    # A word containing the other ("unrealized" / "realized") changes the meaning
+    if token in candidate or candidate in token:
+        return False
+    return SequenceMatcher(None, token, candidate).ratio() >= RESPELLING_RATIO
+
+
+def _same_terms(tokens: List[str], other: List[str]) -> bool:
+    """True when the two requests use the same words up to respelling of vocabulary words"""
+    extra = set(tokens) - set(other)
+    unmatched = set(other) - set(tokens)
+    if len(extra) != len(unmatched):
+        return False
+    vocabulary = _vocabulary(get_schema_version()) if extra else frozenset()
+    for token in extra:
+        match = next((
+            candidate for candidate in unmatched if _is_respelling(token, candidate, vocabulary)
+        ), None)
+        if match is None:
+            return False
+        unmatched.discard(match)
+    return True
+
+
+def _bump(name: str):
+    with _stats_lock:
+        SIMILAR_SQL_STATS[name] += 1
+
+
+def lookup_similar_sql(request_text: str) -> Optional[str]:
+    """SQL of a verified near-duplicate request, or None"""
+    if not SIMILAR_SQL_CACHE_ENABLED or not request_text:
+        return None
+    _bump("lookups")
+    signature = intent_signature(request_text)
+    tokens = tokenize_request(request_text)
+    schema_version = get_schema_version()
+    rejected = False
+    for score, _, entry in _index.search(request_text, k=5, min_score=SIMILAR_SQL_THRESHOLD):
+        if entry["schema_version"] != schema_version:
+            continue
+        if entry["signature"] != signature or not _same_terms(tokens, entry["tokens"]):
+            rejected = True
+            continue
+        _bump("hits")
+        metrics.inc("cache_lookups_total", cache="similar_sql", result="hit")
+        with _stats_lock:
+            SIMILAR_SQL_STATS["last_hit_score"] = round(score, 3)
+        logger.info(f"🚀Reusing SQL of similar request (score {score:.2f}): {entry['prompt'][:80]}")
+        return entry["sql"]
+    _bump("rejected_by_intent" if rejected else "misses")
+    metrics.inc("cache_lookups_total", cache="similar_sql", result="rejected" if rejected else "miss")
+    return None
+
+
+def remember_sql(request_text: str, sql: str):
+    """Index SQL that executed successfully for this request"""
+    if not SIMILAR_SQL_CACHE_ENABLED or not request_text or not sql:
+        return
+    tokens = tokenize_request(request_text)
+    _index.add(" ".join(tokens), request_text, {
+        "prompt": request_text,
+        "tokens": tokens,
+        "sql": sql,
+        "signature": intent_signature(request_text),
+        "schema_version": get_schema_version(),
+    })
+    _bump("stored")
+
+
+def get_similar_sql_stats() -> dict:
+    with _stats_lock:
+        stats = dict(SIMILAR_SQL_STATS)
+    lookups = stats["lookups"]
+    stats["hit_rate"] = round(stats["hits"] / lookups, 3) if lookups else None
+    stats["enabled"] = SIMILAR_SQL_CACHE_ENABLED
+    stats["threshold"] = SIMILAR_SQL_THRESHOLD
+    stats["index"] = _index.stats()
+    return stats
@@ -3,6 +3,7 @@
 import json
 import os
 import logging
+from functools import lru_cache
 
 # Set up logger
 logger = logging.getLogger(__name__)
@@ -25,6 +26,7 @@ def load_schema():
     with open(SCHEMA_FILE, "r") as f:
         return json.load(f)
 
+@lru_cache(maxsize=1)
 def build_sql_instruction():
     logger.info(f"🚀SQL Query Generator Instrcutions: building databricks connection")
     schema = load_schema()
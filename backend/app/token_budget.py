@@ -0,0 +1,219 @@
+# backend/app/token_budget.py
+import threading
+import logging
+from dataclasses import dataclass, field
+from typing import List, Optional
+from .config import (
+    MODEL_DEPLOYMENT_NAME,
+    MODEL_CONTEXT_TOKENS,
+    RESPONSE_TOKEN_RESERVE,
+    HISTORY_MAX_TOKENS
+)
+
+try:
+    import tiktoken
+except ImportError:
+    tiktoken = None
+
+# Set up logger
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+# Create console handler with higher level
+ch = logging.StreamHandler()
+ch.setLevel(logging.INFO)
+
+# Create formatter and add it to the handlers
+formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+ch.setFormatter(formatter)
+logger.addHandler(ch)
+
+# -----------------------------------------------------------------------------
+# Local token accounting. Requests are budgeted before they are sent: the
+# instructions, history, file content and reserved output must fit the model's
+# context, and history is trimmed deterministically when they don't.
+# -----------------------------------------------------------------------------
+
+CHARS_PER_TOKEN = 4
+# Per-message framing overhead of the chat format
+MESSAGE_OVERHEAD_TOKENS = 4
+# Longest excerpt of one message kept in a compacted summary
+SUMMARY_EXCERPT_CHARS = 240
+
+_encoding = None
+# Set once loading fails, so the heuristic is used from then on instead of
+# re-attempting the BPE download (set TIKTOKEN_CACHE_DIR for offline hosts)
+_encoding_failed = False
+_encoding_lock = threading.Lock()
+
+
+def _load_encoding():
+    try:
+        return tiktoken.encoding_for_model(MODEL_DEPLOYMENT_NAME or "")
+    except KeyError:
+        # Deployment names are free-form; current GPT-4o/4.1 models use o200k_base
+        return tiktoken.get_encoding("o200k_base")
+
+
+def _get_encoding():
+    global _encoding, _encoding_failed
+    if _encoding is None and not _encoding_failed and tiktoken is not None:
+        with _encoding_lock:
+            if _encoding is None and not _encoding_failed:
+                try:
+                    _encoding = _load_encoding()
+                except Exception as e:
+                    _encoding_failed = True
+                    logger.warning(f"🚀Token budget: tiktoken encoding unavailable, "
+                                   f"falling back to {CHARS_PER_TOKEN} chars per token: {e}")
+    return _encoding
+
+
+def load_encoding():
+    """Load the tokenizer ahead of the first request (called from warm-up)."""
+    _get_encoding()
+
+
+def count_tokens(text: Optional[str]) -> int:
+    if not text:
+        return 0
+    encoding = _get_encoding()
+    if encoding is None:
+        return len(text) // CHARS_PER_TOKEN + 1
+    return len(encoding.encode(text, disallowed_special=()))
+
+
+def count_message_tokens(messages: List[dict]) -> int:
+    return sum(count_tokens(m.get("content")) + MESSAGE_OVERHEAD_TOKENS for m in messages)
+
+
+def truncate_to_tokens(text: str, max_tokens: int) -> str:
+    if count_tokens(text) <= max_tokens:
+        return text
+    encoding = _get_encoding()
+    if encoding is None:
+        return text[:max_tokens * CHARS_PER_TOKEN]
+    return encoding.decode(encoding.encode(text, disallowed_special=())[:max_tokens])
+
+
+def summarize_messages(messages: List[dict], max_tokens: int) -> str:
+    """
+    Deterministic extractive summary: one clipped line per message, oldest lines
+    dropped first until it fits. The same input always yields the same summary.
+    """
+    if not messages:
+        return ""
+    lines = []
+    for message in messages:
+        content = " ".join((message.get("content") or "").split())
+        if len(content) > SUMMARY_EXCERPT_CHARS:
+            content = content[:SUMMARY_EXCERPT_CHARS].rstrip() + "…"
+        lines.append(f"- {message.get('role', 'user')}: {content}")
+
+    header = f"Summary of {len(messages)} earlier messages:"
+    while lines and count_tokens("\n".join([header] + lines)) > max_tokens:
+        lines.pop(0)
+    return "\n".join([header] + lines) if lines else ""
+
+
+@dataclass
+class BudgetPlan:
+    history: List[dict] = field(default_factory=list)
+    history_summary: str = ""
+    trimmed_messages: int = 0
+    instruction_tokens: int = 0
+    history_tokens: int = 0
+    prompt_tokens: int = 0
+    file_tokens: int = 0
+    predicted_input_tokens: int = 0
+    fits: bool = True
+
+
+def plan_request(
+    prompt: str,
+    instructions: str = "",
+    history: Optional[List[dict]] = None,
+    file_content: Optional[str] = None,
+    context_tokens: int = 0,
+    history_max_tokens: int = HISTORY_MAX_TOKENS
+) -> BudgetPlan:
+    """
+    Budget one request. `context_tokens` is what the thread already holds. History keeps
+    the newest messages that fit its share; everything older is compacted into a summary.
+    """
+    plan = BudgetPlan(
+        instruction_tokens=count_tokens(instructions),
+        prompt_tokens=count_tokens(prompt) + MESSAGE_OVERHEAD_TOKENS,
+        file_tokens=count_tokens(file_content)
+    )
+    available = MODEL_CONTEXT_TOKENS - RESPONSE_TOKEN_RESERVE - context_tokens \
+        - plan.instruction_tokens - plan.prompt_tokens - plan.file_tokens
+    history_budget = max(min(history_max_tokens, available), 0)
+
+    history = history or []
+    recent_budget = history_budget
+    if count_message_tokens(history) > history_budget:
+        # A quarter of the history budget is left for the compacted older turns
+        recent_budget = int(history_budget * 0.75)
+    kept: List[dict] = []
+    used = 0
+    for message in reversed(history):
+        tokens = count_tokens(message.get("content")) + MESSAGE_OVERHEAD_TOKENS
+        if used + tokens > recent_budget:
+            break
+        kept.insert(0, message)
+        used += tokens
+
+    older = history[:len(history) - len(kept)]
+    if older:
+        plan.history_summary = summarize_messages(older, history_budget - used)
+    plan.history = kept
+    plan.trimmed_messages = len(older)
+    plan.history_tokens = used + count_tokens(plan.history_summary)
+    plan.predicted_input_tokens = context_tokens + plan.instruction_tokens + plan.history_tokens \
+        + plan.prompt_tokens + plan.file_tokens
+    plan.fits = plan.predicted_input_tokens + RESPONSE_TOKEN_RESERVE <= MODEL_CONTEXT_TOKENS
+    if plan.trimmed_messages:
+        logger.info(f"🚀Token budget: compacted {plan.trimmed_messages} older history messages")
+    return plan
+
+
+# -----------------------------------------------------------------------------
+# Predicted vs actual accounting
+# -----------------------------------------------------------------------------
+
+TOKEN_BUDGET_STATS = {
+    "runs": 0,
+    "predicted_input_tokens": 0,
+    "actual_input_tokens": 0,
+    "absolute_error_tokens": 0,
+    "last_predicted": None,
+    "last_actual": None,
+}
+_stats_lock = threading.Lock()
+
+
+def record_usage(predicted: int, actual: Optional[int]):
+    if actual is None:
+        return
+    with _stats_lock:
+        TOKEN_BUDGET_STATS["runs"] += 1
+        TOKEN_BUDGET_STATS["predicted_input_tokens"] += predicted
+        TOKEN_BUDGET_STATS["actual_input_tokens"] += actual
+        TOKEN_BUDGET_STATS["absolute_error_tokens"] += abs(actual - predicted)
+        TOKEN_BUDGET_STATS["last_predicted"] = predicted
+        TOKEN_BUDGET_STATS["last_actual"] = actual
+    logger.info(f"🚀Input tokens predicted {predicted}, actual {actual}")
+
+
+def get_token_budget_stats() -> dict:
+    with _stats_lock:
+        stats = dict(TOKEN_BUDGET_STATS)
+    runs = stats["runs"]
+    stats["tokenizer"] = "tiktoken" if _get_encoding() is not None else "chars_per_token"
+    stats["mean_absolute_error_tokens"] = round(stats["absolute_error_tokens"] / runs, 1) if runs else None
+    stats["actual_to_predicted_ratio"] = (
+        round(stats["actual_input_tokens"] / stats["predicted_input_tokens"], 3)
+        if stats["predicted_input_tokens"] else None
+    )
+    return stats
@@ -0,0 +1,189 @@
+# backend/app/tool_dispatcher.py
+import json
+import time
+import threading
+import contextvars
+import logging
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from typing import Callable, Dict, List, Optional
+from azure.ai.agents.models import ToolOutput
+from .config import TOOL_DISPATCH_MAX_WORKERS, TOOL_TIMEOUT_SECONDS
+from .utility.metrics import span
+from .utility.cancellation import CancellationToken, OperationCancelled, cancellation_scope, current_token
+
+# Set up logger
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+# Create console handler with higher level
+ch = logging.StreamHandler()
+ch.setLevel(logging.INFO)
+
+# Create formatter and add it to the handlers
+formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+ch.setFormatter(formatter)
+logger.addHandler(ch)
+
+# -----------------------------------------------------------------------------
+# Executes the function calls of a requires_action run step. Independent calls
+# run concurrently on a bounded pool with a per-tool timeout, and all outputs are
+# returned together so they can be submitted in one submit_tool_outputs call.
+# Each call runs under its own cancellation token: a timeout cancels it (and the
+# warehouse statement it is waiting on) so the worker is freed, not just abandoned.
+# -----------------------------------------------------------------------------
+
+# Tool name -> seconds before the call is reported back to the model as timed out
+TOOL_TIMEOUTS = {
+    "execute_databricks_query": TOOL_TIMEOUT_SECONDS,
+    "generate_graph_from_prompt": TOOL_TIMEOUT_SECONDS * 1.5,
+    "get_insights_from_text": TOOL_TIMEOUT_SECONDS * 2,
+}
+
+_executor = ThreadPoolExecutor(max_workers=TOOL_DISPATCH_MAX_WORKERS, thread_name_prefix="tool")
+_worker_state = threading.local()
+
+TOOL_DISPATCH_STATS = {
+    "dispatched": 0,
+    "running": 0,
+    "timed_out": 0,
+    # Timed-out calls still holding a worker after their token was cancelled
+    "running_after_timeout": 0,
+    # Dispatches that found every worker busy and had to queue
+    "queued_on_saturation": 0,
+}
+_stats_lock = threading.Lock()
+
+
+def _count(key: str, amount: int = 1):
+    with _stats_lock:
+        TOOL_DISPATCH_STATS[key] += amount
+
+
+def get_tool_dispatch_stats() -> dict:
+    with _stats_lock:
+        return {**TOOL_DISPATCH_STATS, "max_workers": TOOL_DISPATCH_MAX_WORKERS}
+
+
+def _json_default(obj):
+    if hasattr(obj, "isoformat"):
+        return obj.isoformat()
+    return str(obj)
+
+
+@contextmanager
+def inline_tool_calls():
+    """Run tool calls dispatched from this thread inline, for workers of other bounded pools"""
+    previous = getattr(_worker_state, "in_tool", False)
+    _worker_state.in_tool = True
+    try:
+        yield
+    finally:
+        _worker_state.in_tool = previous
+
+
+class ToolDispatcher:
+    def __init__(self, functions: List[Callable], timeouts: Optional[Dict[str, float]] = None):
+        self.functions = {func.__name__: func for func in functions}
+        self.timeouts = timeouts or TOOL_TIMEOUTS
+
+    def _call(self, name: str, arguments: dict):
+        with inline_tool_calls(), span(f"tool.{name}"):
+            return self.functions[name](**arguments)
+
+    def _call_in_worker(self, name: str, arguments: dict, call_token: CancellationToken,
+                        parent: Optional[CancellationToken], state: dict):
+        _count("running")
+        try:
+            with cancellation_scope(call_token):
+                if parent is None:
+                    return self._call(name, arguments)
+                # The request going away cancels its tool calls too
+                with parent.on_cancel(lambda: call_token.cancel(parent.reason)):
+                    return self._call(name, arguments)
+        finally:
+            with _stats_lock:
+                state["done"] = True
+                TOOL_DISPATCH_STATS["running"] -= 1
+                if state["abandoned"]:
+                    TOOL_DISPATCH_STATS["running_after_timeout"] -= 1
+
+    def _error_output(self, name: str, message: str) -> dict:
+        logger.error(f"🚀Tool '{name}' failed: {message}")
+        return {"status": "error", "message": message, "is_error": True}
+
+    def execute(self, tool_calls) -> List[ToolOutput]:
+        """Run all function tool calls of one step and return their outputs in call order"""
+        started = time.perf_counter()
+        # A tool that itself drives an agent run (get_insights_from_text) must not wait on
+        # the pool it is occupying, so nested dispatches run inline
+        inline = getattr(_worker_state, "in_tool", False)
+        parent = current_token()
+
+        pending = []
+        for tool_call in tool_calls:
+            name = tool_call.function.name
+            try:
+                arguments = json.loads(tool_call.function.arguments or "{}")
+            except json.JSONDecodeError as e:
+                pending.append((tool_call, name, None, self._error_output(name, f"Invalid arguments: {e}")))
+                continue
+            if name not in self.functions:
+                pending.append((tool_call, name, None, self._error_output(name, "Unknown tool")))
+                continue
+            logger.info(f"🚀Dispatching tool '{name}'")
+            if inline:
+                try:
+                    pending.append((tool_call, name, None, self._call(name, arguments)))
+                except OperationCancelled:
+                    raise
+                except Exception as e:
+                    pending.append((tool_call, name, None, self._error_output(name, str(e))))
+            else:
+                with _stats_lock:
+                    TOOL_DISPATCH_STATS["dispatched"] += 1
+                    saturated = TOOL_DISPATCH_STATS["running"] >= TOOL_DISPATCH_MAX_WORKERS
+                    if saturated:
+                        TOOL_DISPATCH_STATS["queued_on_saturation"] += 1
+                if saturated:
+                    logger.warning(f"🚀Tool pool saturated ({TOOL_DISPATCH_MAX_WORKERS} workers busy), '{name}' will queue")
+                # Tools see the caller's context (e.g. the request the SQL they run belongs to)
+                context = contextvars.copy_context()
+                # Same deadline as the request; a timeout or the request ending cancels it
+                call_token = CancellationToken(parent.remaining() if parent is not None else None)
+                state = {"done": False, "abandoned": False}
+                future = _executor.submit(context.run, self._call_in_worker, name, arguments, call_token, parent, state)
+                pending.append((tool_call, name, (future, call_token, state), None))
+
+        outputs = []
+        for tool_call, name, submitted, result in pending:
+            if submitted is not None:
+                future, call_token, state = submitted
+                deadline = self.timeouts.get(name, TOOL_TIMEOUT_SECONDS)
+                # Calls run concurrently, so each waits at most its own budget from dispatch time
+                remaining = max(deadline - (time.perf_counter() - started), 0)
+                try:
+                    result = future.result(timeout=remaining)
+                except FutureTimeoutError:
+                    _count("timed_out")
+                    # A queued call is dropped; a running one is asked to stop through its token
+                    if not future.cancel():
+                        with _stats_lock:
+                            if not state["done"]:
+                                state["abandoned"] = True
+                                TOOL_DISPATCH_STATS["running_after_timeout"] += 1
+                        call_token.cancel(f"tool '{name}' timed out after {deadline:.0f}s")
+                    result = self._error_output(name, f"Timed out after {deadline:.0f}s")
+                except OperationCancelled as e:
+                    # The request itself is gone: stop the run rather than report a tool failure
+                    if parent is not None and parent.cancelled:
+                        raise
+                    result = self._error_output(name, f"Cancelled: {e}")
+                except Exception as e:
+                    result = self._error_output(name, str(e))
+            with span("tool.serialize"):
+                output = json.dumps(result, default=_json_default)
+            outputs.append(ToolOutput(tool_call_id=tool_call.id, output=output))
+
+        logger.info(f"🚀Executed {len(outputs)} tool calls in {time.perf_counter() - started:.2f}s")
+        return outputs
@@ -4,8 +4,12 @@ import re
 from datetime import datetime, date
 from typing import Dict, List
 import logging
+import threading
 import traceback
 from .graph_service import GraphService
+from .file_ingestion import analyze_text
+from .few_shot_store import note_request_sql
+from .utility.cancellation import OperationCancelled
 
 # Set up logger
 logger = logging.getLogger(__name__)
@@ -66,6 +70,8 @@ def generate_graph_from_prompt(prompt: str) -> Dict:
             "type": "graph"
         }
         
+    except OperationCancelled:
+        raise
     except Exception as e:
         logger.error(f"🚀🚀Error in generate_graph_from_prompt tool: {str(e)}")
         return {
@@ -76,6 +82,24 @@ def generate_graph_from_prompt(prompt: str) -> Dict:
         }
 
 
+_insights_factory = None
+_insights_factory_lock = threading.Lock()
+
+def _get_insights_factory():
+    """
+    Dedicated AgentFactory for text analysis, created once per process.
+    It must not be the orchestrator's instance: this tool runs while the orchestrator holds its thread lock.
+    """
+    global _insights_factory
+    if _insights_factory is None:
+        with _insights_factory_lock:
+            if _insights_factory is None:
+                # Import AgentFactory here to avoid circular imports
+                from .agentfactory import AgentFactory
+                _insights_factory = AgentFactory(registry_name="InsightsAgent")
+    return _insights_factory
+
+
 def get_insights_from_text(text_content: str) -> Dict:
     """
     Get meaningful insights from text content using the agent model.
@@ -91,55 +115,19 @@ def get_insights_from_text(text_content: str) -> Dict:
         }
 
     try:
-        # Import AgentFactory here to avoid circular imports
-        from .agentfactory import AgentFactory
-        
-        # Initialize agent factory
-        factory = AgentFactory()
-        
-        # Create a prompt that asks the agent to analyze the text
-        analysis_prompt = f"""
-        Analyze the following text and provide key insights, summaries, and important findings.
-        Focus on identifying:
-        - Main topics and themes
-        - Key statistics or numerical data
-        - Important names, dates, or entities
-        - Any notable trends or patterns
-        
-        Text to analyze:
-        {text_content}
-        
-        Provide your analysis in a structured JSON format with these sections:
-        - summary (brief overall summary)
-        - key_points (bulleted list of main points)
-        - notable_data (any important numbers or metrics)
-        - entities (important people, organizations, or locations mentioned)
-        """
+        # Large texts are chunked and analysed concurrently, then merged
+        result = analyze_text(text_content)
         
-        logger.debug(f"Sending analysis prompt to agent: {analysis_prompt[:200]}...")
-        
-        # Get response from agent
-        response = factory.process_request2(
-            prompt=analysis_prompt,
-            agent_mode="Detailed"  # Use detailed mode for comprehensive analysis
-        )
-        
-        if response.is_error:
-            logger.error(f"🚀Agent failed to analyze text: {response.response}")
+        if result.get("status") != "success":
+            logger.error(f"🚀Agent failed to analyze text: {result.get('message')}")
             return {
                 "status": "error",
                 "message": "Failed to analyze text",
-                "details": response.response
+                "details": result.get("message")
             }
         
         logger.info("Successfully generated insights from text")
-        return {
-            "status": "success",
-            "insights": {
-                "agent_response": response.response,
-                "structured_analysis": _extract_structured_insights(response.response)
-            }
-        }
+        return result
         
     except Exception as e:
         logger.error(f"🚀Error in get_insights_from_text: {str(e)}")
@@ -184,9 +172,13 @@ def execute_databricks_query(sql_query: str) -> Dict:
         result = GraphService.execute_sql_query(sql_query)
         if result.get("status") == "success":
             logger.info(f"🚀Query executed successfully. Returned {result.get('row_count', 0)} rows")
+            # Candidate example for the request; recorded once the run completes, if it was the last SQL
+            note_request_sql(sql_query, result.get("row_count", 0))
         else:
             logger.error(f"🚀Query execution failed: {result.get('message')}")
         return result
+    except OperationCancelled:
+        raise
     except Exception as e:
         logger.error(f"🚀Error in execute_databricks_query tool: {str(e)}")
         logger.error(traceback.format_exc())
@@ -0,0 +1,105 @@
+#app/utility/agent_bootstrap.py
+import json
+import hashlib
+import logging
+
+from .worker_coordination import hold_lease, get_shared_value, set_shared_value
+
+# Set up logger
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+# Create console handler with higher level
+ch = logging.StreamHandler()
+ch.setLevel(logging.INFO)
+
+# Create formatter and add it to the handlers
+formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+ch.setFormatter(formatter)
+logger.addHandler(ch)
+
+BOOTSTRAP_LEASE_TTL_SECONDS = 120
+
+
+def agent_config_hash(model: str, instructions: str, tool_definitions=None, **options) -> str:
+    """Stable hash of everything that defines an agent; a change means the remote agent needs an update."""
+    payload = {
+        "model": model,
+        "instructions": instructions,
+        "tools": [
+            d.as_dict() if hasattr(d, "as_dict") else d
+            for d in (tool_definitions or [])
+        ],
+        "options": options,
+    }
+    return hashlib.sha256(json.dumps(payload, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+
+def _state_key(agent_name: str) -> str:
+    return f"agent:{agent_name}"
+
+
+def _load_cached_entry(agent_name: str) -> dict:
+    raw = get_shared_value(_state_key(agent_name))
+    if not raw:
+        return {}
+    try:
+        return json.loads(raw)
+    except ValueError:
+        return {}
+
+
+def _publish(agent_name: str, agent_id: str, config_hash: str):
+    set_shared_value(_state_key(agent_name), json.dumps({"id": agent_id, "config_hash": config_hash}))
+
+
+def _load_cached_agent(agent_client, agent_name: str):
+    """Validate the cached id with a single get_agent call. Returns (agent, cached_hash)."""
+    entry = _load_cached_entry(agent_name)
+    agent_id = entry.get("id")
+    if not agent_id:
+        return None, None
+    try:
+        agent = agent_client.get_agent(agent_id)
+        logger.info(f"🚀agent bootstrap: reusing cached agent id for {agent_name} ({agent_id})")
+        return agent, entry.get("config_hash")
+    except Exception as e:
+        logger.warning(f"🚀agent bootstrap: cached agent id {agent_id} for {agent_name} is invalid: {e}")
+        return None, None
+
+
+def resolve_agent(agent_client, agent_name: str, config_hash: str, create_agent, update_agent):
+    """
+    Resolve the Azure agent called `agent_name`.
+
+    The id is cached in the local state db together with `config_hash`, so a cold start costs
+    one get_agent call. `update_agent(agent_id)` is only called when the hash changed, and
+    `create_agent()` only when no agent exists. The slow path runs under a lease so concurrent
+    workers cannot create duplicates.
+    """
+    agent, cached_hash = _load_cached_agent(agent_client, agent_name)
+    if agent is not None and cached_hash == config_hash:
+        return agent
+
+    with hold_lease(f"bootstrap:{agent_name}", ttl_seconds=BOOTSTRAP_LEASE_TTL_SECONDS):
+        # Another worker may have finished bootstrapping while we waited for the lease
+        agent, cached_hash = _load_cached_agent(agent_client, agent_name)
+        if agent is not None and cached_hash == config_hash:
+            return agent
+
+        if agent is None:
+            for existing in agent_client.list_agents():
+                if existing.name == agent_name:
+                    logger.info(f"🚀agent bootstrap: found existing agent {agent_name} ({existing.id})")
+                    agent = existing
+                    break
+
+        if agent is None:
+            logger.info(f"🚀agent bootstrap: creating new agent {agent_name}")
+            agent = create_agent()
+        else:
+            logger.info(f"🚀agent bootstrap: configuration of {agent_name} changed, updating {agent.id}")
+            agent = update_agent(agent.id)
+
+        _publish(agent_name, agent.id, config_hash)
+        return agent
@@ -0,0 +1,119 @@
+#app/utility/cancellation.py
+import time
+import threading
+import contextvars
+import logging
+from contextlib import contextmanager
+from typing import Callable, Optional
+
+# Set up logger
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+# Create console handler with higher level
+ch = logging.StreamHandler()
+ch.setLevel(logging.INFO)
+
+# Create formatter and add it to the handlers
+formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+ch.setFormatter(formatter)
+logger.addHandler(ch)
+
+# -----------------------------------------------------------------------------
+# Cooperative cancellation. A request owns a CancellationToken (client gone or
+# deadline passed); the token travels in a context variable, which asyncio.to_thread
+# and the tool dispatcher carry into worker threads, so an Azure run poll loop or
+# a warehouse cursor deep in the call stack can stop work nobody is waiting for.
+# -----------------------------------------------------------------------------
+
+
+class OperationCancelled(Exception):
+    """Raised where work stops because its request was cancelled"""
+
+
+class CancellationToken:
+    def __init__(self, deadline_seconds: Optional[float] = None):
+        self.deadline = time.monotonic() + deadline_seconds if deadline_seconds else None
+        self.reason: Optional[str] = None
+        self._event = threading.Event()
+        self._callbacks = []
+        self._lock = threading.Lock()
+
+    @property
+    def cancelled(self) -> bool:
+        if not self._event.is_set() and self.deadline is not None and time.monotonic() >= self.deadline:
+            self.cancel("deadline exceeded")
+        return self._event.is_set()
+
+    def cancel(self, reason: str = "cancelled"):
+        """Cancel once and run the registered cleanup callbacks (e.g. cursor.cancel)"""
+        with self._lock:
+            if self._event.is_set():
+                return
+            self.reason = reason
+            self._event.set()
+            callbacks, self._callbacks = self._callbacks, []
+        logger.info(f"🚀Request cancelled: {reason}")
+        for callback in callbacks:
+            try:
+                callback()
+            except Exception as e:
+                logger.warning(f"🚀Cancellation callback failed: {e}")
+
+    def raise_if_cancelled(self):
+        if self.cancelled:
+            raise OperationCancelled(self.reason)
+
+    def remaining(self) -> Optional[float]:
+        return None if self.deadline is None else max(self.deadline - time.monotonic(), 0.0)
+
+    def wait(self, seconds: float) -> bool:
+        """Sleep up to `seconds`, waking early on cancellation; True if cancelled"""
+        remaining = self.remaining()
+        if self._event.wait(seconds if remaining is None else min(seconds, remaining)):
+            return True
+        return self.cancelled
+
+    @contextmanager
+    def on_cancel(self, callback: Callable[[], None]):
+        """Run `callback` if the token is cancelled while the block is executing"""
+        with self._lock:
+            registered = not self._event.is_set()
+            if registered:
+                self._callbacks.append(callback)
+        if not registered:
+            callback()
+        try:
+            yield
+        finally:
+            with self._lock:
+                if callback in self._callbacks:
+                    self._callbacks.remove(callback)
+
+
+_current_token: contextvars.ContextVar = contextvars.ContextVar("cancellation_token", default=None)
+
+
+def current_token() -> Optional[CancellationToken]:
+    return _current_token.get()
+
+
+def check_cancelled():
+    token = _current_token.get()
+    if token is not None:
+        token.raise_if_cancelled()
+
+
+def is_cancelled() -> bool:
+    token = _current_token.get()
+    return token is not None and token.cancelled
+
+
+@contextmanager
+def cancellation_scope(token: CancellationToken):
+    """Make `token` the current token for this context (and threads started from it)"""
+    reset = _current_token.set(token)
+    try:
+        yield token
+    finally:
+        _current_token.reset(reset)
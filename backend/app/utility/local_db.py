@@ -0,0 +1,42 @@
+#app/utility/local_db.py
+import os
+import sqlite3
+import logging
+
+from ..config import LOCAL_STATE_DB
+
+# Set up logger
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+# Create console handler with higher level
+ch = logging.StreamHandler()
+ch.setLevel(logging.INFO)
+
+# Create formatter and add it to the handlers
+formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+ch.setFormatter(formatter)
+logger.addHandler(ch)
+
+BUSY_TIMEOUT_SECONDS = 10
+
+_initialized_schemas = set()
+
+
+def get_connection(schema_name: str = None, schema_sql: str = None) -> sqlite3.Connection:
+    """
+    Open a connection to the host-local state database.
+    Connections are cheap and not shared between threads; callers open one per operation.
+    The optional schema is created once per process.
+    """
+    os.makedirs(os.path.dirname(LOCAL_STATE_DB), exist_ok=True)
+    conn = sqlite3.connect(LOCAL_STATE_DB, timeout=BUSY_TIMEOUT_SECONDS, isolation_level=None)
+    conn.row_factory = sqlite3.Row
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+
+    if schema_name and schema_name not in _initialized_schemas:
+        logger.info(f"🚀local db: ensuring schema '{schema_name}' in {LOCAL_STATE_DB}")
+        conn.executescript(schema_sql)
+        _initialized_schemas.add(schema_name)
+    return conn
@@ -0,0 +1,223 @@
+#app/utility/metrics.py
+import re
+import time
+import bisect
+import threading
+import contextvars
+import logging
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Optional, Tuple
+
+# Set up logger
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+# Create console handler with higher level
+ch = logging.StreamHandler()
+ch.setLevel(logging.INFO)
+
+# Create formatter and add it to the handlers
+formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+ch.setFormatter(formatter)
+logger.addHandler(ch)
+
+# -----------------------------------------------------------------------------
+# In-process metrics in the Prometheus text format, without a client library.
+# Stage timings (`with span("agent.run"):`) go into one latency histogram keyed
+# by stage; counters cover cache lookups, retries and tokens. A span costs two
+# clock reads and a bucket increment, and nothing runs between scrapes. The
+# /stats/* dictionaries are registered as collectors and rendered on scrape too.
+# Stages of the current request are also collected per request, for its log
+# line and Server-Timing header.
+# -----------------------------------------------------------------------------
+
+PREFIX = "aiagents"
+# Seconds; agent runs take tens of seconds, cache hits well under a millisecond
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+
+_lock = threading.Lock()
+# stage -> [bucket counts..., +Inf count], sum
+_histograms: Dict[str, list] = {}
+_histogram_sums: Dict[str, float] = {}
+# (name, sorted label items) -> value
+_counters: Dict[Tuple[str, tuple], float] = {}
+_counter_help: Dict[str, str] = {}
+# name -> (collector, label for its top-level keys, labels for nested dicts by key)
+_collectors: Dict[str, tuple] = {}
+
+# (stage, seconds) of the request being served, shared with its worker threads
+_request_stages: contextvars.ContextVar = contextvars.ContextVar("request_stages", default=None)
+
+
+def observe(stage: str, seconds: float):
+    index = bisect.bisect_left(LATENCY_BUCKETS, seconds)
+    with _lock:
+        buckets = _histograms.get(stage)
+        if buckets is None:
+            buckets = _histograms[stage] = [0] * (len(LATENCY_BUCKETS) + 1)
+            _histogram_sums[stage] = 0.0
+        buckets[index] += 1
+        _histogram_sums[stage] += seconds
+    stages = _request_stages.get()
+    if stages is not None:
+        # list.append is atomic, so tool threads can record into their request's list
+        stages.append((stage, seconds))
+
+
+@contextmanager
+def span(stage: str):
+    """Time the block as `stage`; a block that raises also counts as a stage error"""
+    started = time.perf_counter()
+    try:
+        yield
+    except BaseException:
+        inc("stage_errors_total", stage=stage)
+        raise
+    finally:
+        observe(stage, time.perf_counter() - started)
+
+
+def inc(name: str, amount: float = 1, **labels):
+    key = (name, tuple(sorted(labels.items())))
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + amount
+
+
+def describe(name: str, help_text: str):
+    _counter_help[name] = help_text
+
+
+@contextmanager
+def request_stages():
+    """Collect the stages timed while serving one request; yields the (stage, seconds) list"""
+    stages: List[Tuple[str, float]] = []
+    reset = _request_stages.set(stages)
+    try:
+        yield stages
+    finally:
+        _request_stages.reset(reset)
+
+
+def summarize_stages(stages: List[Tuple[str, float]]) -> Dict[str, float]:
+    """Total milliseconds per stage, slowest first"""
+    totals: Dict[str, float] = {}
+    for stage, seconds in list(stages):
+        totals[stage] = totals.get(stage, 0.0) + seconds * 1000
+    return {stage: round(ms, 1) for stage, ms in sorted(totals.items(), key=lambda item: -item[1])}
+
+
+def server_timing(stages: List[Tuple[str, float]]) -> str:
+    """Server-Timing header value, so browser dev tools show the breakdown"""
+    return ", ".join(
+        f"{re.sub(r'[^A-Za-z0-9_-]', '-', stage)};dur={ms}" for stage, ms in summarize_stages(stages).items()
+    )
+
+
+def register_collector(
+    name: str,
+    collect: Callable[[], dict],
+    label: Optional[str] = None,
+    nested_labels: Optional[Dict[str, str]] = None
+):
+    """
+    Render the numeric leaves of collect() on scrape as aiagents_<name>_<path>. Top-level keys become
+    the `label` label when given (e.g. one entry per dependency); dicts named in nested_labels have
+    open-ended keys (users, sources) and become that label instead of part of the metric name.
+    """
+    _collectors[name] = (collect, label, nested_labels or {})
+
+
+# -----------------------------------------------------------------------------
+# Prometheus text exposition
+# -----------------------------------------------------------------------------
+
+def _metric_name(*parts: str) -> str:
+    return re.sub(r"[^a-zA-Z0-9_]", "_", "_".join(p for p in parts if p)).lower()
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", " ")
+
+
+def _label_text(labels) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{_escape(value)}"' for key, value in labels) + "}"
+
+
+def _number(value) -> Optional[float]:
+    if isinstance(value, bool):
+        return 1.0 if value else 0.0
+    if isinstance(value, (int, float)):
+        return float(value)
+    return None
+
+
+def _flatten(path: tuple, value, labels: tuple, nested_labels: dict, out: list):
+    if isinstance(value, dict):
+        label = nested_labels.get(path[-1]) if path else None
+        for key, child in value.items():
+            if label:
+                _flatten(path, child, labels + ((label, key),), {}, out)
+            else:
+                _flatten(path + (str(key),), child, labels, nested_labels, out)
+        return
+    number = _number(value)
+    if number is not None:
+        out.append((_metric_name(*path), labels, number))
+
+
+def _format(value: float) -> str:
+    value = float(value)
+    return str(int(value)) if value.is_integer() else repr(value)
+
+
+def render() -> str:
+    lines = []
+    with _lock:
+        histograms = {stage: list(buckets) for stage, buckets in _histograms.items()}
+        sums = dict(_histogram_sums)
+        counters = dict(_counters)
+
+    name = f"{PREFIX}_stage_duration_seconds"
+    lines += [f"# HELP {name} Latency of request processing stages", f"# TYPE {name} histogram"]
+    for stage in sorted(histograms):
+        cumulative = 0
+        for bound, count in zip(LATENCY_BUCKETS + ("+Inf",), histograms[stage]):
+            cumulative += count
+            lines.append(f'{name}_bucket{{stage="{stage}",le="{bound}"}} {cumulative}')
+        lines.append(f'{name}_sum{{stage="{stage}"}} {round(sums[stage], 6)}')
+        lines.append(f'{name}_count{{stage="{stage}"}} {cumulative}')
+
+    by_name: Dict[str, list] = {}
+    for (counter, labels), value in counters.items():
+        by_name.setdefault(counter, []).append((labels, value))
+    for counter in sorted(by_name):
+        full = f"{PREFIX}_{counter}"
+        if counter in _counter_help:
+            lines.append(f"# HELP {full} {_counter_help[counter]}")
+        lines.append(f"# TYPE {full} counter")
+        for labels, value in sorted(by_name[counter]):
+            lines.append(f"{full}{_label_text(labels)} {_format(value)}")
+
+    for collector_name, (collect, label, nested_labels) in sorted(_collectors.items()):
+        try:
+            stats = collect()
+        except Exception as e:
+            logger.warning(f"🚀metrics: collector '{collector_name}' failed: {e}")
+            continue
+        samples = []
+        if label:
+            for key, value in stats.items():
+                _flatten((PREFIX, collector_name), value, ((label, key),), nested_labels, samples)
+        else:
+            _flatten((PREFIX, collector_name), stats, (), nested_labels, samples)
+        # A metric family's samples must be contiguous
+        families: Dict[str, list] = {}
+        for metric, labels, value in samples:
+            families.setdefault(metric, []).append((labels, value))
+        for metric, family in families.items():
+            lines.append(f"# TYPE {metric} untyped")
+            lines += [f"{metric}{_label_text(labels)} {_format(value)}" for labels, value in family]
+
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,265 @@
+#app/utility/resilience.py
+import time
+import random
+import threading
+import logging
+from typing import Callable, Dict, Optional
+from azure.core.exceptions import HttpResponseError, ServiceRequestError, ServiceResponseError
+from databricks.sql import OperationalError, InterfaceError
+from ..config import (
+    RETRY_MAX_ATTEMPTS,
+    RETRY_BASE_DELAY_SECONDS,
+    RETRY_MAX_DELAY_SECONDS,
+    RETRY_BUDGET_RATIO,
+    RETRY_BUDGET_MAX_TOKENS,
+    BREAKER_FAILURE_THRESHOLD,
+    BREAKER_RECOVERY_SECONDS
+)
+from .cancellation import OperationCancelled, current_token
+from . import metrics
+
+# Set up logger
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+# Create console handler with higher level
+ch = logging.StreamHandler()
+ch.setLevel(logging.INFO)
+
+# Create formatter and add it to the handlers
+formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+ch.setFormatter(formatter)
+logger.addHandler(ch)
+
+# -----------------------------------------------------------------------------
+# Shared retry policy and circuit breakers for upstream dependencies (Azure
+# Agents, Databricks). Retries use full-jitter exponential backoff and draw from
+# a per-dependency budget, so a brownout costs a bounded number of extra calls
+# instead of every request's full retry allowance. After enough consecutive
+# failures a dependency's breaker opens and calls fail fast until a probe after
+# the recovery period succeeds.
+# -----------------------------------------------------------------------------
+
+# Error classes: REJECTED means the request was not processed (always safe to
+# retry), TRANSIENT means it may have been (retry only idempotent calls)
+REJECTED = "rejected"
+TRANSIENT = "transient"
+
+
+class CircuitOpenError(Exception):
+    def __init__(self, dependency: str, retry_after: float):
+        self.dependency = dependency
+        self.retry_after = max(1, int(retry_after + 0.999))
+        super().__init__(f"{dependency} is unavailable (circuit open), retry in {self.retry_after}s")
+
+
+def classify_azure_error(error: Exception) -> Optional[str]:
+    if isinstance(error, HttpResponseError) and getattr(error, "status_code", None) is not None:
+        if error.status_code in (429, 503):
+            return REJECTED
+        if error.status_code >= 500 or error.status_code == 408:
+            return TRANSIENT
+        # 4xx: a problem with this request, not with the service
+        return None
+    if isinstance(error, ServiceRequestError):
+        # Failed before the request was sent
+        return REJECTED
+    if isinstance(error, (ServiceResponseError, ConnectionError, TimeoutError)):
+        return TRANSIENT
+    return None
+
+
+def classify_databricks_error(error: Exception) -> Optional[str]:
+    # Query errors (bad SQL, missing column) are ServerOperationError and not retried
+    if isinstance(error, (OperationalError, InterfaceError, ConnectionError, TimeoutError)):
+        return TRANSIENT
+    return None
+
+
+class CircuitBreaker:
+    def __init__(self, name: str, failure_threshold: int, recovery_seconds: float):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.recovery_seconds = recovery_seconds
+        self.state = "closed"
+        self.consecutive_failures = 0
+        self.opened_at = 0.0
+        self.times_opened = 0
+        self._probe_in_flight = False
+        self._lock = threading.Lock()
+
+    def before_call(self):
+        """Raise CircuitOpenError unless a call may go out now"""
+        with self._lock:
+            if self.state == "closed":
+                return
+            waited = time.monotonic() - self.opened_at
+            if self.state == "open" and waited >= self.recovery_seconds:
+                self.state = "half_open"
+            if self.state == "half_open" and not self._probe_in_flight:
+                # One probe call decides whether the dependency is back
+                self._probe_in_flight = True
+                return
+            raise CircuitOpenError(self.name, max(self.recovery_seconds - waited, 1))
+
+    def record_success(self):
+        with self._lock:
+            if self.state != "closed":
+                logger.info(f"🚀Circuit '{self.name}' closed again")
+            self.state = "closed"
+            self.consecutive_failures = 0
+            self._probe_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self.consecutive_failures += 1
+            self._probe_in_flight = False
+            if self.state == "half_open" or (self.state == "closed" and self.consecutive_failures >= self.failure_threshold):
+                if self.state == "closed":
+                    self.times_opened += 1
+                    logger.error(f"🚀Circuit '{self.name}' opened after {self.consecutive_failures} consecutive failures")
+                self.state = "open"
+                self.opened_at = time.monotonic()
+
+    def release_probe(self):
+        """A probe that ended without telling us anything (e.g. a 4xx) frees the slot"""
+        with self._lock:
+            self._probe_in_flight = False
+
+    def is_open(self) -> bool:
+        with self._lock:
+            return self.state == "open" and time.monotonic() - self.opened_at < self.recovery_seconds
+
+    def retry_after(self) -> float:
+        with self._lock:
+            return max(self.recovery_seconds - (time.monotonic() - self.opened_at), 1)
+
+
+class RetryBudget:
+    """Each call earns `ratio` of a retry, up to `max_tokens`; each retry spends one"""
+
+    def __init__(self, ratio: float, max_tokens: float):
+        self.ratio = ratio
+        self.max_tokens = max_tokens
+        self._tokens = max_tokens
+        self._lock = threading.Lock()
+
+    def deposit(self):
+        with self._lock:
+            self._tokens = min(self.max_tokens, self._tokens + self.ratio)
+
+    def withdraw(self) -> bool:
+        with self._lock:
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return True
+            return False
+
+    @property
+    def tokens(self) -> float:
+        with self._lock:
+            return round(self._tokens, 2)
+
+
+class Dependency:
+    def __init__(self, name: str, classify: Callable[[Exception], Optional[str]]):
+        self.name = name
+        self.classify = classify
+        self.breaker = CircuitBreaker(name, BREAKER_FAILURE_THRESHOLD, BREAKER_RECOVERY_SECONDS)
+        self.budget = RetryBudget(RETRY_BUDGET_RATIO, RETRY_BUDGET_MAX_TOKENS)
+        self.stats = {"calls": 0, "failures": 0, "retries": 0, "retries_denied_by_budget": 0, "short_circuited": 0}
+        self._stats_lock = threading.Lock()
+
+    def _count(self, key: str):
+        with self._stats_lock:
+            self.stats[key] += 1
+
+    def backoff(self, attempt: int) -> float:
+        """Full jitter: uniform over [0, min(max, base * 2^attempt)]"""
+        return random.uniform(0, min(RETRY_MAX_DELAY_SECONDS, RETRY_BASE_DELAY_SECONDS * (2 ** attempt)))
+
+    def call(self, func: Callable, *args, idempotent: bool = True, max_attempts: int = RETRY_MAX_ATTEMPTS, **kwargs):
+        """Call func through the breaker, retrying transient failures within the budget"""
+        self.budget.deposit()
+        for attempt in range(max_attempts):
+            try:
+                self.breaker.before_call()
+            except CircuitOpenError:
+                self._count("short_circuited")
+                raise
+            self._count("calls")
+            try:
+                result = func(*args, **kwargs)
+            except Exception as e:
+                kind = self.classify(e)
+                if kind is None:
+                    # Not the dependency's fault; it answered
+                    self.breaker.release_probe()
+                    raise
+                self._count("failures")
+                self.breaker.record_failure()
+                retryable = kind == REJECTED or idempotent
+                if not retryable or attempt == max_attempts - 1:
+                    raise
+                if not self.budget.withdraw():
+                    self._count("retries_denied_by_budget")
+                    logger.warning(f"🚀{self.name}: retry budget exhausted, not retrying: {e}")
+                    raise
+                self._count("retries")
+                metrics.inc("retries_total", dependency=self.name, error=kind)
+                delay = self.backoff(attempt)
+                logger.info(f"🚀{self.name}: attempt {attempt + 1} failed ({e}), retrying in {delay:.2f}s")
+                sleep(delay)
+            else:
+                self.breaker.record_success()
+                return result
+
+    def snapshot(self) -> dict:
+        with self._stats_lock:
+            stats = dict(self.stats)
+        return {
+            **stats,
+            "state": self.breaker.state,
+            "circuit_open": self.breaker.state != "closed",
+            "consecutive_failures": self.breaker.consecutive_failures,
+            "times_opened": self.breaker.times_opened,
+            "retry_budget_tokens": self.budget.tokens,
+        }
+
+
+def sleep(seconds: float):
+    """Backoff sleep that ends early, raising, when the current request is cancelled"""
+    token = current_token()
+    if token is None:
+        time.sleep(seconds)
+    elif token.wait(seconds):
+        raise OperationCancelled(token.reason)
+
+
+_dependencies: Dict[str, Dependency] = {
+    "azure_agents": Dependency("azure_agents", classify_azure_error),
+    "databricks": Dependency("databricks", classify_databricks_error),
+}
+
+
+def get_dependency(name: str) -> Dependency:
+    return _dependencies[name]
+
+
+def azure_call(func: Callable, *args, idempotent: bool = True, **kwargs):
+    return _dependencies["azure_agents"].call(func, *args, idempotent=idempotent, **kwargs)
+
+
+def databricks_call(func: Callable, *args, **kwargs):
+    return _dependencies["databricks"].call(func, *args, **kwargs)
+
+
+def ensure_available(name: str):
+    """Fail fast, before queueing any work, while the dependency's circuit is open"""
+    breaker = _dependencies[name].breaker
+    if breaker.is_open():
+        raise CircuitOpenError(name, breaker.retry_after())
+
+
+def get_resilience_stats() -> dict:
+    return {name: dependency.snapshot() for name, dependency in _dependencies.items()}
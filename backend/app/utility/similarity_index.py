@@ -0,0 +1,122 @@
+#app/utility/similarity_index.py
+import math
+import zlib
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Hashable, Iterable, List, Tuple
+
+import numpy as np
+
+# -----------------------------------------------------------------------------
+# Bounded in-process vector index for short texts. Texts are embedded as hashed
+# word / word-bigram / character-trigram features weighted by TF-IDF over the
+# indexed texts, and searched by cosine similarity with NumPy. Nothing leaves the
+# process; memory is capacity x n_features float32, and the least recently used
+# entry is evicted when the index is full.
+# -----------------------------------------------------------------------------
+
+
+def default_tokenize(text: str) -> List[str]:
+    return text.lower().split()
+
+
+def _features(tokens: List[str]) -> Iterable[str]:
+    for token in tokens:
+        yield f"w:{token}"
+        padded = f"#{token}#"
+        for i in range(len(padded) - 2):
+            yield f"c:{padded[i:i + 3]}"
+    for first, second in zip(tokens, tokens[1:]):
+        yield f"b:{first} {second}"
+
+
+class SimilarityIndex:
+    def __init__(
+        self,
+        capacity: int = 512,
+        n_features: int = 2048,
+        tokenize: Callable[[str], List[str]] = default_tokenize
+    ):
+        self.capacity = capacity
+        self.n_features = n_features
+        self.tokenize = tokenize
+        # Sublinear term frequencies per row; IDF is applied at search time so it tracks the corpus
+        self._tf = np.zeros((capacity, n_features), dtype=np.float32)
+        self._df = np.zeros(n_features, dtype=np.int32)
+        self._rows: "OrderedDict[Hashable, int]" = OrderedDict()
+        self._values: dict = {}
+        self._free = list(range(capacity - 1, -1, -1))
+        self._lock = threading.Lock()
+        self.evictions = 0
+
+    def _vectorize(self, text: str) -> np.ndarray:
+        counts: dict = {}
+        for feature in _features(self.tokenize(text)):
+            slot = zlib.crc32(feature.encode("utf-8")) % self.n_features
+            counts[slot] = counts.get(slot, 0) + 1
+        vector = np.zeros(self.n_features, dtype=np.float32)
+        for slot, count in counts.items():
+            vector[slot] = 1.0 + math.log(count)
+        return vector
+
+    def add(self, key: Hashable, text: str, value: Any):
+        """Index `text` under `key`; re-adding a key replaces its entry"""
+        vector = self._vectorize(text)
+        with self._lock:
+            row = self._rows.pop(key, None)
+            if row is not None:
+                self._df -= (self._tf[row] > 0)
+            elif self._free:
+                row = self._free.pop()
+            else:
+                evicted, row = self._rows.popitem(last=False)
+                self._values.pop(evicted, None)
+                self._df -= (self._tf[row] > 0)
+                self.evictions += 1
+            self._tf[row] = vector
+            self._df += (vector > 0)
+            self._rows[key] = row
+            self._values[key] = value
+
+    def remove(self, key: Hashable):
+        with self._lock:
+            row = self._rows.pop(key, None)
+            if row is None:
+                return
+            self._df -= (self._tf[row] > 0)
+            self._tf[row] = 0
+            self._values.pop(key, None)
+            self._free.append(row)
+
+    def search(self, text: str, k: int = 1, min_score: float = 0.0) -> List[Tuple[float, Hashable, Any]]:
+        """Up to k (score, key, value) entries most similar to `text`, best first"""
+        query = self._vectorize(text)
+        with self._lock:
+            if not self._rows:
+                return []
+            keys = list(self._rows.keys())
+            rows = np.fromiter(self._rows.values(), dtype=np.intp, count=len(keys))
+            n = len(keys)
+            idf = np.log((1.0 + n) / (1.0 + self._df)) + 1.0
+            matrix = self._tf[rows] * idf
+            weighted_query = query * idf
+            norms = np.linalg.norm(matrix, axis=1) * np.linalg.norm(weighted_query)
+            scores = (matrix @ weighted_query) / np.where(norms == 0, 1.0, norms)
+            best = np.argsort(-scores)[:k]
+            results = [(float(scores[i]), keys[i], self._values[keys[i]]) for i in best if scores[i] >= min_score]
+            for _, key, _ in results:
+                self._rows.move_to_end(key)
+            return results
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "entries": len(self._rows),
+                "capacity": self.capacity,
+                "n_features": self.n_features,
+                "evictions": self.evictions,
+                "memory_bytes": int(self._tf.nbytes + self._df.nbytes)
+            }
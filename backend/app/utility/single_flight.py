@@ -0,0 +1,98 @@
+#app/utility/single_flight.py
+import threading
+import logging
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+from typing import Dict, Hashable
+from .cancellation import OperationCancelled, check_cancelled, is_cancelled
+
+# Set up logger
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+# Create console handler with higher level
+ch = logging.StreamHandler()
+ch.setLevel(logging.INFO)
+
+# Create formatter and add it to the handlers
+formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+ch.setFormatter(formatter)
+logger.addHandler(ch)
+
+# -----------------------------------------------------------------------------
+# In-flight request coalescing: concurrent calls with the same key share the
+# result of the one call that is already running instead of repeating the work.
+# -----------------------------------------------------------------------------
+
+# How often a waiting caller checks whether its own request was cancelled
+FOLLOWER_CHECK_SECONDS = 0.5
+
+_registry: Dict[str, "SingleFlight"] = {}
+_registry_lock = threading.Lock()
+
+
+class SingleFlight:
+    def __init__(self, name: str):
+        self.name = name
+        self._calls: Dict[Hashable, Future] = {}
+        self._lock = threading.Lock()
+        self.stats = {"calls": 0, "executions": 0, "coalesced": 0}
+
+    def do(self, key: Hashable, func, *args, **kwargs):
+        """Run func once per key at a time; callers arriving while it runs get the same result or exception."""
+        with self._lock:
+            self.stats["calls"] += 1
+            future = self._calls.get(key)
+            leader = future is None
+            if leader:
+                future = Future()
+                self._calls[key] = future
+                self.stats["executions"] += 1
+            else:
+                self.stats["coalesced"] += 1
+
+        if not leader:
+            logger.info(f"🚀single-flight '{self.name}': joined in-flight call")
+            try:
+                return self._wait(future)
+            except OperationCancelled:
+                if is_cancelled():
+                    raise
+                # Only the request that ran it was cancelled; this one still wants the result
+                return self.do(key, func, *args, **kwargs)
+
+        try:
+            result = func(*args, **kwargs)
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            # Later callers start a fresh call; results are not cached here
+            with self._lock:
+                self._calls.pop(key, None)
+
+    def _wait(self, future: Future):
+        while True:
+            try:
+                return future.result(timeout=FOLLOWER_CHECK_SECONDS)
+            except FutureTimeoutError:
+                check_cancelled()
+
+    def in_flight(self) -> int:
+        with self._lock:
+            return len(self._calls)
+
+
+def get_single_flight(name: str) -> SingleFlight:
+    with _registry_lock:
+        if name not in _registry:
+            _registry[name] = SingleFlight(name)
+        return _registry[name]
+
+
+def get_single_flight_stats() -> dict:
+    with _registry_lock:
+        flights = list(_registry.values())
+    return {flight.name: {**flight.stats, "in_flight": flight.in_flight()} for flight in flights}
@@ -2,9 +2,12 @@
 import time
 import logging
 from apscheduler.schedulers.background import BackgroundScheduler
-from azure.ai.agents.models import ListSortOrder
+from azure.core.exceptions import ResourceNotFoundError
 
+from ..config import THREAD_IDLE_TTL_MINUTES
 from .agent_registry import REGISTERED_AGENT_INSTANCES, register_agent_instance, get_agent_instance
+from .thread_registry import get_expired_threads, forget_thread, count_threads
+from .worker_coordination import run_if_leader
 
 # -----------------------------------------------------------------------------
 # Configuration
@@ -13,11 +16,16 @@ from .agent_registry import REGISTERED_AGENT_INSTANCES, register_agent_instance,
 AGENT_CLASSES = [
     {"name": "OrchestratorAgent", "class_name": "AgentFactory"},
     {"name": "SQLQueryGeneratorAgent", "class_name": "AGSQLQueryGenerator"},
+    {"name": "InsightsAgent", "class_name": "AgentFactory", "init_kwargs": {"registry_name": "InsightsAgent"}},
 ]
 
-KEEP_LAST_N_THREADS = 5
 CLEANUP_INTERVAL_MINUTES = 70
 
+# Only the worker holding this lease runs the cleanup jobs. The lease outlives one
+# interval so the leader keeps it across ticks, and fails over if the leader dies.
+CLEANUP_LEASE_NAME = "thread_cleanup"
+CLEANUP_LEASE_TTL_SECONDS = CLEANUP_INTERVAL_MINUTES * 60 * 1.5
+
 # -----------------------------------------------------------------------------
 # Logging setup
 # -----------------------------------------------------------------------------
@@ -43,36 +51,42 @@ def get_agent_class_by_name(class_name: str):
 # Cleanup Logic
 # -----------------------------------------------------------------------------
 
-def delete_threads_for_agent(agent_instance, agent_name: str, keep_last_n: int = KEEP_LAST_N_THREADS):
+def delete_threads_for_agent(agent_instance, agent_name: str, idle_ttl_minutes: int = THREAD_IDLE_TTL_MINUTES):
+    """Delete the expired threads this deployment created for `agent_name` (see thread_registry)."""
     try:
         agent_client = agent_instance.agent_client
-        all_threads = list(agent_client.threads.list(order=ListSortOrder.DESCENDING))
+        expired_ids = get_expired_threads(agent_name, idle_ttl_minutes * 60)
 
-        logger.info(f"[{agent_name}] Total threads: {len(all_threads)}")
+        logger.info(f"[{agent_name}] Owned threads: {count_threads(agent_name)}, expired: {len(expired_ids)}")
 
         active_ids = []
         if hasattr(agent_instance, "get_active_thread_ids"):
             try:
-                active_ids = agent_instance.get_active_thread_ids()
+                active_ids = list(agent_instance.get_active_thread_ids())
                 logger.info(f"[{agent_name}] Active thread IDs (will skip): {active_ids}")
             except Exception as e:
                 logger.warning(f"[{agent_name}] Failed to get active thread IDs: {e}")
 
-        threads_to_delete = [
-            t for t in all_threads[keep_last_n:]
-            if t.id not in active_ids
-        ]
+        current_thread = getattr(agent_instance, "current_thread", None)
+        if current_thread is not None:
+            active_ids.append(current_thread.id)
+
+        threads_to_delete = [tid for tid in expired_ids if tid not in active_ids]
 
         deleted_count = 0
-        for thread in threads_to_delete:
+        for thread_id in threads_to_delete:
             try:
-                agent_client.threads.delete(thread.id)
-                logger.info(f"[{agent_name}] Deleted thread: {thread.id}")
+                agent_client.threads.delete(thread_id)
+                logger.info(f"[{agent_name}] Deleted thread: {thread_id}")
                 deleted_count += 1
+            except ResourceNotFoundError:
+                logger.info(f"[{agent_name}] Thread {thread_id} already gone, dropping from registry")
             except Exception as e:
-                logger.warning(f"[{agent_name}] Failed to delete thread {thread.id}: {e}")
+                logger.warning(f"[{agent_name}] Failed to delete thread {thread_id}: {e}")
+                continue
+            forget_thread(thread_id)
 
-        logger.info(f"[{agent_name}] Deleted {deleted_count} threads. Kept {keep_last_n} + active ones.")
+        logger.info(f"[{agent_name}] Deleted {deleted_count} expired threads (idle > {idle_ttl_minutes} min).")
     except Exception as e:
         logger.error(f"[{agent_name}] Cleanup failed: {e}", exc_info=True)
 
@@ -91,7 +105,7 @@ def run_thread_cleanup_all_agents():
 
             agent_instance = get_agent_instance(agent_name)
             if agent_instance is None:
-                agent_instance = agent_class()
+                agent_instance = agent_class(**agent_cfg.get("init_kwargs", {}))
                 register_agent_instance(agent_name, agent_instance)
 
             delete_threads_for_agent(agent_instance, agent_name)
@@ -107,6 +121,9 @@ def run_thread_cleanup_all_agents():
             logger.error(f"[{agent_name}] Agent init or cleanup error: {e}", exc_info=True)
     logger.info("Thread cleanup cycle complete.\n")
 
+def run_thread_cleanup_as_leader():
+    run_if_leader(CLEANUP_LEASE_NAME, CLEANUP_LEASE_TTL_SECONDS, run_thread_cleanup_all_agents)
+
 # -----------------------------------------------------------------------------
 # Scheduler Startup (if run standalone)
 # -----------------------------------------------------------------------------
@@ -131,6 +148,13 @@ def start_thread_cleanup_scheduler():
     global scheduler_instance
     if scheduler_instance is None:
         scheduler_instance = BackgroundScheduler()
-        scheduler_instance.add_job(run_thread_cleanup_all_agents, 'interval', minutes=CLEANUP_INTERVAL_MINUTES)
+        scheduler_instance.add_job(run_thread_cleanup_as_leader, 'interval', minutes=CLEANUP_INTERVAL_MINUTES)
         scheduler_instance.start()
         logger.info(f"Thread cleanup scheduler started (every {CLEANUP_INTERVAL_MINUTES} min)")
+
+
+def schedule_interval_job(func, minutes: float, job_id: str):
+    """Register another periodic background job on the shared scheduler"""
+    start_thread_cleanup_scheduler()
+    scheduler_instance.add_job(func, 'interval', minutes=minutes, id=job_id, replace_existing=True)
+    logger.info(f"Scheduled job '{job_id}' (every {minutes} min)")
@@ -0,0 +1,96 @@
+#app/utility/thread_registry.py
+import time
+import logging
+from contextlib import closing
+from typing import List
+
+from .local_db import get_connection
+
+# Set up logger
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+# Create console handler with higher level
+ch = logging.StreamHandler()
+ch.setLevel(logging.INFO)
+
+# Create formatter and add it to the handlers
+formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+ch.setFormatter(formatter)
+logger.addHandler(ch)
+
+# -----------------------------------------------------------------------------
+# Persistent record of the Azure threads this deployment created, so cleanup
+# only ever touches our own threads instead of listing the whole project.
+# -----------------------------------------------------------------------------
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS owned_threads (
+    thread_id     TEXT PRIMARY KEY,
+    owner         TEXT NOT NULL,
+    created_at    REAL NOT NULL,
+    last_activity REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_owned_threads_owner_activity
+    ON owned_threads (owner, last_activity);
+"""
+
+
+def _connect():
+    return get_connection("thread_registry", _SCHEMA)
+
+
+def record_thread(thread_id: str, owner: str):
+    """Register a thread created by `owner` (e.g. OrchestratorAgent)."""
+    now = time.time()
+    try:
+        with closing(_connect()) as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO owned_threads (thread_id, owner, created_at, last_activity) "
+                "VALUES (?, ?, ?, ?)",
+                (thread_id, owner, now, now)
+            )
+        logger.info(f"🚀thread registry: recorded {thread_id} for {owner}")
+    except Exception as e:
+        # Registry problems must never break a user request
+        logger.warning(f"🚀thread registry: failed to record {thread_id}: {e}")
+
+
+def touch_thread(thread_id: str):
+    """Bump last activity so an in-use thread is not considered expired."""
+    try:
+        with closing(_connect()) as conn:
+            conn.execute(
+                "UPDATE owned_threads SET last_activity = ? WHERE thread_id = ?",
+                (time.time(), thread_id)
+            )
+    except Exception as e:
+        logger.warning(f"🚀thread registry: failed to touch {thread_id}: {e}")
+
+
+def forget_thread(thread_id: str):
+    try:
+        with closing(_connect()) as conn:
+            conn.execute("DELETE FROM owned_threads WHERE thread_id = ?", (thread_id,))
+    except Exception as e:
+        logger.warning(f"🚀thread registry: failed to forget {thread_id}: {e}")
+
+
+def get_expired_threads(owner: str, idle_ttl_seconds: float) -> List[str]:
+    """Thread ids owned by `owner` whose last activity is older than the TTL, oldest first."""
+    cutoff = time.time() - idle_ttl_seconds
+    with closing(_connect()) as conn:
+        rows = conn.execute(
+            "SELECT thread_id FROM owned_threads WHERE owner = ? AND last_activity < ? "
+            "ORDER BY last_activity",
+            (owner, cutoff)
+        ).fetchall()
+    return [row["thread_id"] for row in rows]
+
+
+def count_threads(owner: str) -> int:
+    with closing(_connect()) as conn:
+        row = conn.execute(
+            "SELECT COUNT(*) AS n FROM owned_threads WHERE owner = ?", (owner,)
+        ).fetchone()
+    return row["n"]
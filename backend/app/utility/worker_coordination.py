@@ -0,0 +1,115 @@
+#app/utility/worker_coordination.py
+import os
+import time
+import socket
+import logging
+from contextlib import closing, contextmanager
+from typing import Optional
+
+from .local_db import get_connection
+
+# Set up logger
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+# Create console handler with higher level
+ch = logging.StreamHandler()
+ch.setLevel(logging.INFO)
+
+# Create formatter and add it to the handlers
+formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+ch.setFormatter(formatter)
+logger.addHandler(ch)
+
+# -----------------------------------------------------------------------------
+# SQLite leases shared by all uvicorn workers on this host. A lease is held by
+# one worker until it expires or is released; holders renew by re-acquiring.
+# -----------------------------------------------------------------------------
+
+WORKER_ID = f"{socket.gethostname()}:{os.getpid()}"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS leases (
+    name       TEXT PRIMARY KEY,
+    holder     TEXT NOT NULL,
+    expires_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS shared_state (
+    key        TEXT PRIMARY KEY,
+    value      TEXT NOT NULL,
+    updated_at REAL NOT NULL
+);
+"""
+
+
+def _connect():
+    return get_connection("worker_coordination", _SCHEMA)
+
+
+def try_acquire_lease(name: str, ttl_seconds: float) -> bool:
+    """Acquire or renew the named lease for this worker. Returns False if another worker holds it."""
+    now = time.time()
+    with closing(_connect()) as conn:
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute("SELECT holder, expires_at FROM leases WHERE name = ?", (name,)).fetchone()
+            if row and row["holder"] != WORKER_ID and row["expires_at"] > now:
+                conn.execute("ROLLBACK")
+                return False
+            conn.execute(
+                "INSERT OR REPLACE INTO leases (name, holder, expires_at) VALUES (?, ?, ?)",
+                (name, WORKER_ID, now + ttl_seconds)
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+    if not row or row["holder"] != WORKER_ID:
+        logger.info(f"🚀worker coordination: {WORKER_ID} acquired lease '{name}'")
+    return True
+
+
+def release_lease(name: str):
+    with closing(_connect()) as conn:
+        conn.execute("DELETE FROM leases WHERE name = ? AND holder = ?", (name, WORKER_ID))
+
+
+@contextmanager
+def hold_lease(name: str, ttl_seconds: float = 60, wait_seconds: float = 120, poll_interval: float = 0.25):
+    """Block until the lease is ours (or wait_seconds elapse), then release it on exit."""
+    deadline = time.time() + wait_seconds
+    while not try_acquire_lease(name, ttl_seconds):
+        if time.time() > deadline:
+            raise TimeoutError(f"Timed out waiting for lease '{name}'")
+        time.sleep(poll_interval)
+    try:
+        yield
+    finally:
+        release_lease(name)
+
+
+def run_if_leader(lease_name: str, ttl_seconds: float, func, *args, **kwargs):
+    """Run func only on the worker currently holding the lease; other workers skip."""
+    try:
+        is_leader = try_acquire_lease(lease_name, ttl_seconds)
+    except Exception as e:
+        logger.warning(f"🚀worker coordination: lease check '{lease_name}' failed: {e}")
+        return None
+    if not is_leader:
+        logger.info(f"🚀worker coordination: {WORKER_ID} is not leader for '{lease_name}', skipping")
+        return None
+    return func(*args, **kwargs)
+
+
+def get_shared_value(key: str) -> Optional[str]:
+    with closing(_connect()) as conn:
+        row = conn.execute("SELECT value FROM shared_state WHERE key = ?", (key,)).fetchone()
+    return row["value"] if row else None
+
+
+def set_shared_value(key: str, value: str):
+    with closing(_connect()) as conn:
+        conn.execute(
+            "INSERT OR REPLACE INTO shared_state (key, value, updated_at) VALUES (?, ?, ?)",
+            (key, value, time.time())
+        )
@@ -0,0 +1,104 @@
+# backend/app/warmup.py
+import time
+import asyncio
+import logging
+from typing import Callable, Dict
+from .config import WARMUP_PRECREATED_THREADS
+from .azure_client_provider import prefetch_token
+from .schema_utils import load_schema
+from .sql_query_generator_instruction import build_sql_instruction
+from .databricks_pool import get_pool
+from .token_budget import load_encoding
+from .entity_matcher import refresh_entity_matcher
+from .agsqlquerygenerator import get_sql_query_generator
+
+# Set up logger
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+# Create console handler with higher level
+ch = logging.StreamHandler()
+ch.setLevel(logging.INFO)
+
+# Create formatter and add it to the handlers
+formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+ch.setFormatter(formatter)
+logger.addHandler(ch)
+
+# Per-step status of the startup warm-up, served by the /ready endpoint
+WARMUP_STATE = {
+    "ready": False,
+    "started_at": None,
+    "finished_at": None,
+    "steps": {}
+}
+
+
+def _prefetch_token(agent_factory):
+    prefetch_token()
+
+
+def _resolve_orchestrator_agent(agent_factory):
+    agent_factory.get_or_create_agent()
+    agent_factory.precreate_threads(WARMUP_PRECREATED_THREADS)
+
+
+def _resolve_sql_agent(agent_factory):
+    generator = get_sql_query_generator()
+    generator.get_or_create_sql_agent()
+    generator.precreate_threads(WARMUP_PRECREATED_THREADS)
+
+
+def _load_schema_registry(agent_factory):
+    load_schema()
+    build_sql_instruction()
+
+
+def _open_databricks_pool(agent_factory):
+    get_pool().fill_to_min()
+
+
+def _load_entity_names(agent_factory):
+    # Trader/counterparty names the fast path resolves filters against
+    refresh_entity_matcher()
+
+
+def _load_tokenizer(agent_factory):
+    load_encoding()
+
+
+WARMUP_STEPS: Dict[str, Callable] = {
+    "aad_token": _prefetch_token,
+    "orchestrator_agent": _resolve_orchestrator_agent,
+    "sql_agent": _resolve_sql_agent,
+    "schema_registry": _load_schema_registry,
+    "databricks_pool": _open_databricks_pool,
+    "tokenizer": _load_tokenizer,
+    "entity_names": _load_entity_names,
+}
+
+
+async def _run_step(name: str, step: Callable, agent_factory):
+    started = time.perf_counter()
+    try:
+        await asyncio.to_thread(step, agent_factory)
+        WARMUP_STATE["steps"][name] = {"status": "ok", "seconds": round(time.perf_counter() - started, 3)}
+        logger.info(f"🚀Warm-up step '{name}' completed")
+    except Exception as e:
+        WARMUP_STATE["steps"][name] = {"status": "error", "error": str(e), "seconds": round(time.perf_counter() - started, 3)}
+        logger.error(f"🚀Warm-up step '{name}' failed: {e}")
+
+
+async def run_warmup(agent_factory):
+    """
+    Run all warm-up steps concurrently. A failed step is recorded but does not block readiness;
+    the request path will retry that work lazily, just as it did before warm-up existed.
+    """
+    logger.info("🚀Starting warm-up")
+    WARMUP_STATE["started_at"] = time.time()
+    await asyncio.gather(*(
+        _run_step(name, step, agent_factory) for name, step in WARMUP_STEPS.items()
+    ))
+    WARMUP_STATE["finished_at"] = time.time()
+    WARMUP_STATE["ready"] = True
+    logger.info(f"🚀Warm-up finished in {WARMUP_STATE['finished_at'] - WARMUP_STATE['started_at']:.2f}s")
@@ -0,0 +1,34 @@
+# backend/tests/test_conversation_store.py
+import pytest
+from app import conversation_store
+from app.utility import local_db
+
+
+@pytest.fixture(autouse=True)
+def state_db(tmp_path, monkeypatch):
+    monkeypatch.setattr(local_db, "LOCAL_STATE_DB", str(tmp_path / "state.db"))
+    monkeypatch.setattr(local_db, "_initialized_schemas", set())
+    conversation_store._cache.clear()
+
+
+def _turn(text):
+    return [{"role": "user", "content": text}, {"role": "assistant", "content": f"re: {text}"}]
+
+
+def test_concurrent_turns_are_merged():
+    saved = conversation_store.append_messages(conversation_store.create_conversation("alice"), _turn("one"))
+    # Two requests read the same version before either saves
+    first = conversation_store.get_conversation(saved.conversation_id, "alice")
+    second = conversation_store.get_conversation(saved.conversation_id, "alice")
+    conversation_store.append_messages(first, _turn("two"))
+    merged = conversation_store.append_messages(second, _turn("three"))
+
+    stored = conversation_store.get_conversation(saved.conversation_id, "alice")
+    assert [m["content"] for m in stored.messages if m["role"] == "user"] == ["one", "two", "three"]
+    assert stored.version == merged.version == 3
+
+
+def test_conversation_is_scoped_to_its_owner():
+    saved = conversation_store.append_messages(conversation_store.create_conversation("alice"), _turn("one"))
+    assert conversation_store.get_conversation(saved.conversation_id, "mallory") is None
+    assert conversation_store.get_conversation(saved.conversation_id, "alice") is not None
@@ -0,0 +1,80 @@
+# backend/tests/test_fast_path_router.py
+import pytest
+from datetime import date
+from app.fast_path_router import plan
+from app.entity_matcher import get_entity_matcher
+
+
+@pytest.mark.parametrize("prompt", [
+    "plot top 5 deals by ltd realized value",
+    "ltd realized value per trader as a pie chart",
+])
+def test_templated_prompts_are_planned(prompt):
+    assert plan(prompt) is not None
+
+
+@pytest.mark.parametrize("prompt", [
+    # Entity filters the templates cannot apply must go to the agent, not be dropped
+    "plot top 5 deals for portfolio 42",
+    "plot top 5 deals for deal 12345",
+    "top 10 deals by ltd realized value for trader Smith",
+    "plot top 5 deals top 7",
+])
+def test_unapplied_filters_fall_back(prompt):
+    assert plan(prompt) is None
+
+
+@pytest.mark.parametrize("prompt", [
+    # Time words the single WHERE window cannot express must not run unfiltered or half-filtered
+    "top 10 deals by ltd realized value in may",
+    "top 10 deals by ltd realized value in 2023 and 2024",
+    "top 10 deals by ltd realized value in March 2025 and April 2025",
+    "top 10 deals by ltd realized value last year",
+])
+def test_unparsed_time_terms_fall_back(prompt):
+    assert plan(prompt) is None
+
+
+@pytest.mark.parametrize("prompt, start, end", [
+    ("top 10 deals by ltd realized value in May 2025", date(2025, 5, 1), date(2025, 5, 31)),
+    ("top 10 deals by ltd realized value in q2 2024", date(2024, 4, 1), date(2024, 6, 30)),
+    ("top 10 deals by ltd realized value in 2023", date(2023, 1, 1), date(2023, 12, 31)),
+])
+def test_time_window_is_pushed_down(prompt, start, end):
+    fast_plan = plan(prompt)
+    assert fast_plan.parameters == {"window_start": start, "window_end": end}
+
+
+def test_header_join_uses_latest_version():
+    fast_plan = plan("ltd realized value per trader as a pie chart")
+    assert "ORDER BY version_id DESC) = 1" in fast_plan.sql
+
+
+@pytest.fixture
+def known_entities():
+    matcher = get_entity_matcher()
+    previous = matcher._automaton, matcher._names
+    matcher.load({"trader": ["John Smith"], "counterparty": ["BP", "Total"]})
+    yield
+    matcher._automaton, matcher._names = previous
+
+
+def test_known_entity_is_filtered_in_sql(known_entities):
+    fast_plan = plan("top 10 deals by ltd realized value for trader John Smith")
+    assert "h.trader = :trader" in fast_plan.sql
+    assert fast_plan.parameters == {"trader": "John Smith"}
+
+
+def test_counterparty_after_for_is_filtered(known_entities):
+    fast_plan = plan("top 10 deals by ltd realized value for bp in May 2025")
+    assert "h.counterparty = :counterparty" in fast_plan.sql
+    assert fast_plan.parameters["counterparty"] == "BP"
+
+
+@pytest.mark.parametrize("prompt", [
+    # An unknown trader, or a known name used as an ordinary word, must not become a filter
+    "top 10 deals by ltd realized value for trader Smyth",
+    "total ltd realized value per trader",
+])
+def test_unresolved_entities_fall_back(known_entities, prompt):
+    assert plan(prompt) is None
@@ -0,0 +1,30 @@
+# backend/tests/test_similar_sql_cache.py
+import pytest
+from app import similar_sql_cache
+from app.utility.similarity_index import SimilarityIndex
+
+SQL = "SELECT 1"
+
+
+@pytest.fixture(autouse=True)
+def fresh_index(monkeypatch):
+    monkeypatch.setattr(similar_sql_cache, "SIMILAR_SQL_CACHE_ENABLED", True)
+    monkeypatch.setattr(similar_sql_cache, "_index", SimilarityIndex(
+        capacity=100, n_features=similar_sql_cache.SIMILARITY_INDEX_FEATURES,
+        tokenize=similar_sql_cache.tokenize_request
+    ))
+
+
+def test_vocabulary_respelling_reuses_sql():
+    similar_sql_cache.remember_sql("visualize top 10 deals by ltd realized value for trader smith", SQL)
+    assert similar_sql_cache.lookup_similar_sql("visualise top 10 deals by ltd realized value for trader smith") == SQL
+
+
+@pytest.mark.parametrize("prompt", [
+    "top 10 deals by ltd realized value for trader smyth",
+    "top 10 deals by ltd realized value for trader smith portfolio gas_uk",
+])
+def test_names_must_match_exactly(prompt):
+    similar_sql_cache.remember_sql("top 10 deals by ltd realized value for trader smith portfolio gas_ul", SQL)
+    similar_sql_cache.remember_sql("top 10 deals by ltd realized value for trader smith", SQL)
+    assert similar_sql_cache.lookup_similar_sql(prompt) is None
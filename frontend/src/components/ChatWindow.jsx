@@ -181,6 +181,7 @@ const ChatWindow = () => {
     const [prompt, setPrompt] = useState("");
     const [loading, setLoading] = useState(false);
     const [currentThreadId, setCurrentThreadId] = useState("");
+    const [conversationId, setConversationId] = useState("");
     const [agentBehavior, setAgentBehavior] = useState("Balanced");
     const [messageLayout, setMessageLayout] = useState("alternating");
     const [uploadedFile, setUploadedFile] = useState(null);
@@ -449,10 +450,8 @@ const ChatWindow = () => {
                 agentMode: agentBehavior,
                 prompt: prompt.trim(),
                 file_content: uploadedFile ? uploadedFile.content : undefined,
-                chat_history: messages.map((msg) => ({
-                    role: msg.sender === "user" ? "user" : "agent",
-                    content: msg.text,
-                })),
+                // The backend keeps the history; only the new message is sent
+                conversation_id: conversationId || undefined,
                 thread_id: currentThreadId || undefined,
             };
 
@@ -515,6 +514,9 @@ const ChatWindow = () => {
 
                 setMessages((prev) => [...prev, agentResponse]);
                 setCurrentThreadId(res.data.thread_id);
+                if (res.data.conversation_id) {
+                    setConversationId(res.data.conversation_id);
+                }
                 setInputTokens(res.data.input_tokens);
                 setOutputTokens(res.data.output_tokens);
             } catch (error) {
@@ -534,7 +536,7 @@ const ChatWindow = () => {
                 if (fileInputRef.current) fileInputRef.current.value = "";
             }
         },
-        [prompt, messages, uploadedFile, currentThreadId, agentBehavior]
+        [prompt, uploadedFile, currentThreadId, conversationId, agentBehavior]
     );
 
     const handleFileUpload = (event) => {